@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+"""The analytics module."""
+from . import views  # noqa
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Trends across the parties of a fraternity or a school."""
+from sqlalchemy import distinct, func
+
+from ifc.database import db
+from ifc.party.models import Fraternity, Party, PartyReport, PartyHostReport
+from ifc.user.models import User
+
+
+def _rate(part, whole):
+    """part / whole, or 0.0 if there is no whole."""
+    return float(part) / whole if whole else 0.0
+
+
+class PartyTrends(object):
+    """Figures across many parties, added up in the database from the reports
+    stored when the parties ended (see `ifc.party.report.summarize`), so
+    parties that haven't ended aren't counted.
+
+    example usage:
+        >>> from ifc.analytics.trends import PartyTrends
+        >>> trends = PartyTrends(fraternity_id=1, start=date(2017, 1, 1))
+        >>> trends.totals()
+        {'parties': 12, 'attendance': 0.64, ...}
+    """
+
+    def __init__(self, fraternity_id=None, school_id=None, start=None,
+                 end=None):
+        """
+        :param fraternity_id: int -- only count this fraternity's parties
+        :param school_id: int -- only count the parties of the fraternities of
+            this school
+        :param start: date (default: None) -- only count parties on or after
+            this day
+        :param end: date (default: None) -- only count parties on or before
+            this day
+        """
+        self.fraternity_id = fraternity_id
+        self.school_id = school_id
+        self.start = start
+        self.end = end
+
+    def _filter(self, query):
+        """Narrow a query that joins parties down to the parties counted."""
+        if self.fraternity_id is not None:
+            query = query.filter(Party.fraternity_id == self.fraternity_id)
+        if self.school_id is not None:
+            query = query.join(Fraternity,
+                               Party.fraternity_id == Fraternity.id)\
+                .filter(Fraternity.school_id == self.school_id)
+        if self.start is not None:
+            query = query.filter(Party.date >= self.start)
+        if self.end is not None:
+            query = query.filter(Party.date <= self.end)
+        return query
+
+    def totals(self):
+        """Add up every party counted, in one query.
+
+        :return dict: the number of parties, guests and guests who showed, the
+            attendance across all of them, and the average and highest peak
+            population
+        """
+        showed = PartyReport.guys_who_showed + PartyReport.girls_who_showed
+        row = self._filter(
+            db.session.query(func.count(PartyReport.id).label('parties'),
+                             func.sum(PartyReport.total_guests)
+                             .label('total_guests'),
+                             func.sum(showed).label('showed'),
+                             func.avg(PartyReport.peak_population)
+                             .label('average_peak'),
+                             func.max(PartyReport.peak_population)
+                             .label('max_peak'))
+            .join(Party, PartyReport.party_id == Party.id)).one()
+        return {'parties': row.parties,
+                'total_guests': row.total_guests or 0,
+                'guests_who_showed': row.showed or 0,
+                'attendance': _rate(row.showed, row.total_guests),
+                'average_peak_population': float(row.average_peak or 0),
+                'max_peak_population': row.max_peak or 0}
+
+    def parties(self):
+        """Query each party counted, oldest first.
+
+        :return Query: rows with the party's id, name, date, fraternity_id,
+            total_guests, showed and peak_population
+        """
+        return self._filter(
+            db.session.query(Party.id, Party.name, Party.date,
+                             Party.fraternity_id, PartyReport.total_guests,
+                             (PartyReport.guys_who_showed +
+                              PartyReport.girls_who_showed).label('showed'),
+                             PartyReport.peak_population)
+            .join(PartyReport, PartyReport.party_id == Party.id))\
+            .order_by(Party.date, Party.id)
+
+    def hosts(self):
+        """Query how many guests each brother put on the lists of the parties
+        counted, and how many of them showed. The brothers whose guests showed
+        the most come first.
+
+        :return Query: rows with the host's id, first_name, last_name, the
+            number of parties, listed and showed
+        """
+        showed = func.sum(PartyHostReport.showed)
+        return self._filter(
+            db.session.query(User.id, User.first_name, User.last_name,
+                             func.count(distinct(PartyHostReport.party_id))
+                             .label('parties'),
+                             func.sum(PartyHostReport.listed).label('listed'),
+                             showed.label('showed'))
+            .select_from(PartyHostReport)
+            .join(User, PartyHostReport.host_id == User.id)
+            .join(Party, PartyHostReport.party_id == Party.id))\
+            .group_by(User.id, User.first_name, User.last_name)\
+            .order_by(showed.desc(), User.id)
+
+    @staticmethod
+    def party_json(row):
+        """Serialize a row of `parties`."""
+        return {'id': row.id, 'name': row.name,
+                'date': row.date.isoformat(),
+                'fraternity_id': row.fraternity_id,
+                'total_guests': row.total_guests,
+                'guests_who_showed': row.showed,
+                'attendance': _rate(row.showed, row.total_guests),
+                'peak_population': row.peak_population}
+
+    @staticmethod
+    def host_json(row):
+        """Serialize a row of `hosts`."""
+        return {'id': row.id,
+                'name': '{0} {1}'.format(row.first_name, row.last_name),
+                'parties': row.parties,
+                'guests_listed': row.listed,
+                'guests_who_showed': row.showed,
+                'turnout': _rate(row.showed, row.listed)}
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Analytics views."""
+from datetime import datetime as dt
+from functools import partial
+
+from flask import Blueprint, current_app, jsonify, request
+
+from ifc import locales
+from ifc.utils import InvalidAPIUsage, permission_required
+from .trends import PartyTrends
+
+blueprint = Blueprint('analytics', __name__, url_prefix='/analytics',
+                      static_folder='../static')
+
+fraternity_permission = permission_required(
+    'can_view_fraternity_analytics_by_id', apply_req_args=True,
+    fail_exc=partial(InvalidAPIUsage, status_code=403,
+                     payload={'error': locales.Error.CANT_SEE_ANALYTICS}))
+school_permission = permission_required(
+    'can_view_school_analytics_by_id', apply_req_args=True,
+    fail_exc=partial(InvalidAPIUsage, status_code=403,
+                     payload={'error': locales.Error.CANT_SEE_ANALYTICS}))
+
+
+def date_arg(name):
+    """A YYYY-MM-DD date from the query string, or None if it wasn't given."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return dt.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise InvalidAPIUsage(payload={'error': locales.Error.INVALID_DATE})
+
+
+def trends_from_args(**scope):
+    """The trends of the fraternity or school, between the `start` and `end`
+    dates in the query string."""
+    return PartyTrends(start=date_arg('start'), end=date_arg('end'), **scope)
+
+
+def paginated(query, serialize):
+    """A page of a query's rows, as picked by the `page` and `per_page`
+    query string arguments.
+
+    :param query: Query -- the rows, in order
+    :param serialize: callable -- turns a row in to a JSON serializable dict
+    :return dict: the page of `items`, and where it is in the rows
+    """
+    max_per_page = current_app.config['ANALYTICS_MAX_PER_PAGE']
+    per_page = min(max(request.args.get('per_page', 20, int), 1),
+                   max_per_page)
+    page = max(request.args.get('page', 1, int), 1)
+    total = query.order_by(None).count()
+    rows = query.limit(per_page).offset((page - 1) * per_page).all()
+    return {'items': [serialize(row) for row in rows],
+            'page': page, 'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page, 'total': total}
+
+
+def parties_response(trends):
+    """Respond with the totals across the parties, and a page of them."""
+    return jsonify(totals=trends.totals(),
+                   parties=paginated(trends.parties(), trends.party_json))
+
+
+def hosts_response(trends):
+    """Respond with a page of the brothers' turnout across the parties."""
+    return jsonify(hosts=paginated(trends.hosts(), trends.host_json))
+
+
+@blueprint.route('/fraternities/<int:fraternity_id>/parties')
+@fraternity_permission
+def fraternity_parties(fraternity_id):
+    """Attendance and peak population across the fraternity's parties."""
+    return parties_response(trends_from_args(fraternity_id=fraternity_id))
+
+
+@blueprint.route('/fraternities/<int:fraternity_id>/hosts')
+@fraternity_permission
+def fraternity_hosts(fraternity_id):
+    """How the guests of each brother of the fraternity turned out."""
+    return hosts_response(trends_from_args(fraternity_id=fraternity_id))
+
+
+@blueprint.route('/schools/<int:school_id>/parties')
+@school_permission
+def school_parties(school_id):
+    """Attendance and peak population across the parties of the school."""
+    return parties_response(trends_from_args(school_id=school_id))
+
+
+@blueprint.route('/schools/<int:school_id>/hosts')
+@school_permission
+def school_hosts(school_id):
+    """How the guests of each brother at the school turned out."""
+    return hosts_response(trends_from_args(school_id=school_id))
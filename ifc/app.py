@@ -7,7 +7,7 @@ from flask_admin import Admin
 from flask_sslify import SSLify
 
 import ifc.models as models
-from ifc import public, user, party, ingest, manage
+from ifc import public, user, party, ingest, manage, analytics, jobs
 from ifc.assets import assets
 from ifc.extensions import bcrypt, cache, csrf_protect, db, debug_toolbar, \
     login_manager, migrate
@@ -57,6 +57,8 @@ def register_blueprints(app):
     app.register_blueprint(party.views.blueprint)
     app.register_blueprint(ingest.views.blueprint)
     app.register_blueprint(manage.views.blueprint)
+    app.register_blueprint(analytics.views.blueprint)
+    app.register_blueprint(jobs.views.blueprint)
     return None
 
 
@@ -31,9 +31,15 @@ guest_list_js = Bundle(
     'js/party/guest.js',
     'js/party/guest_view.js',
     'js/party/guest_collection.js',
+    'js/party/guest_watcher.js',
     output='public/js/compiled/guest_list.js'
 )
 
+job_status_js = Bundle(
+    'js/job_status.js',
+    output='public/js/compiled/job_status.js'
+)
+
 guest_list_css = Bundle(
     'css/party.css',
     output='public/css/compiled/party.css'
@@ -58,5 +64,6 @@ assets.register('js_all', js)
 assets.register('guest_list_js', guest_list_js)
 assets.register('css_all', css)
 assets.register('guest_list_css', guest_list_css)
+assets.register('job_status_js', job_status_js)
 assets.register('report_coffee', report_coffee)
 assets.register('report_css', report_css)
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 """The data ingestion module."""
-from . import views  # noqa
+# roster registers the handler of the jobs the views queue
+from . import roster, views  # noqa
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""Roster ingestion: replacing a school's pre-registered users with a CSV."""
+import csv
+import itertools
+from StringIO import StringIO
+
+from flask import current_app
+from sqlalchemy import bindparam
+
+from ifc.admin.models import Preuser
+from ifc.database import db
+from ifc.jobs.models import Job
+from ifc.jobs.worker import job_handler
+from ifc.party.models import Fraternity, Guest, Party, PartyHostReport
+from ifc.school.models import School
+from ifc.user.models import User
+
+#: The columns a roster has to have
+ROSTER_COLUMNS = ('fraternity_name', 'first_name', 'last_name', 'email')
+#: The columns of a preuser that a roster can change, besides its email
+PREUSER_FIELDS = ('fraternity_name', 'first_name', 'last_name',
+                  'chapter_admin', 'ifc_admin')
+
+#: What can be wrong with a row of a roster. Rows without a WPI email are
+#: left out, the rest are ingested anyway but are worth a look.
+NOT_WPI_EMAIL = 'not_wpi_email'
+FIRST_NAME_TRUNCATED = 'first_name_truncated'
+LAST_NAME_TRUNCATED = 'last_name_truncated'
+DUPLICATE_EMAIL = 'duplicate_email'
+UNKNOWN_FRATERNITY = 'unknown_fraternity'
+
+
+def _true(value):
+    """Whether a True/False (or empty) roster cell says True."""
+    return (value or '').strip().lower() == 'true'
+
+
+def check_roster(infile, school_title):
+    """Read every row of a roster CSV one at a time, along with what's wrong
+    with it.
+
+    Only rows with a WPI email make a brother, and the names are cut down to
+    fit their columns.
+
+    :param infile: file -- the CSV, with a header row
+    :param school_title: str -- the title of the school the roster is for
+    :return generator(tuple(int, dict, dict, list(str))): the line number of
+        each row, its cells, the columns of its brother's `Preuser` (or None
+        if it's left out) and its problems
+
+    Raises:
+        ValueError -- if the CSV is missing one of ROSTER_COLUMNS
+    """
+    reader = csv.DictReader(infile)
+    missing = [column for column in ROSTER_COLUMNS
+               if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError('The roster is missing the columns: {}'
+                         .format(', '.join(missing)))
+    for row in reader:
+        email = (row['email'] or '').strip()
+        # we only want WPI emails
+        if '@wpi.edu' not in email:
+            yield reader.line_num, row, None, [NOT_WPI_EMAIL]
+            continue
+        problems = []
+        # lol somebody's name was too long so I'm doing this
+        first_name = ((row['first_name'] or '').split() or [''])[0]
+        last_name = (row['last_name'] or '').strip()
+        if len(first_name) > 30:
+            problems.append(FIRST_NAME_TRUNCATED)
+        if len(last_name) > 30:
+            problems.append(LAST_NAME_TRUNCATED)
+        brother = {'email': email[:100],
+                   'first_name': first_name[:30],
+                   'last_name': last_name[:30],
+                   'fraternity_name':
+                       (row['fraternity_name'] or '').strip()[:80],
+                   'chapter_admin': _true(row.get('chapter_admin')),
+                   'ifc_admin': _true(row.get('ifc_admin')),
+                   'school_title': school_title}
+        yield reader.line_num, row, brother, problems
+
+
+def parse_roster(infile, school_title):
+    """Read the brothers of a roster CSV one row at a time (see
+    `check_roster`).
+
+    :return generator(dict): the columns of a `Preuser` for each brother
+
+    Raises:
+        ValueError -- if the CSV is missing one of ROSTER_COLUMNS
+    """
+    for _, _, brother, _ in check_roster(infile, school_title):
+        if brother is not None:
+            yield brother
+
+
+def chunked(iterable, size):
+    """Split an iterable in to lists of (at most) `size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def relic_users(school):
+    """Query the users of a school who aren't one of its pre-registered users
+    (any more), with a single anti-join."""
+    return User.query\
+        .join(Fraternity, User.fraternity_id == Fraternity.id)\
+        .outerjoin(Preuser, db.and_(Preuser.email == User.email,
+                                    Preuser.school_title == school.title))\
+        .filter(Fraternity.school_id == school.id, Preuser.id.is_(None))
+
+
+def hosts_elsewhere(user_ids):
+    """Find which of the users hosted guests at parties they didn't create,
+    with a single query.
+
+    Deleting a user only deletes the parties they created (and the guests and
+    host reports that go with them), so these users can't be deleted without
+    taking other fraternities' guest lists and reports with them.
+
+    :param user_ids: list(int) -- the IDs of the users
+    :return set(int): the IDs of the ones who hosted elsewhere
+    """
+    if not user_ids:
+        return set()
+    guests = db.session.query(Guest.host_id)\
+        .join(Party, Guest.party_id == Party.id)\
+        .filter(Guest.host_id.in_(user_ids),
+                Party.creator_id != Guest.host_id)
+    reports = db.session.query(PartyHostReport.host_id)\
+        .join(Party, PartyHostReport.party_id == Party.id)\
+        .filter(PartyHostReport.host_id.in_(user_ids),
+                Party.creator_id != PartyHostReport.host_id)
+    return set(host_id for host_id, in guests.union(reports))
+
+
+def _current_preusers(school):
+    """Load the school's preusers (just the columns a roster can change) in
+    a single query.
+
+    :return tuple(dict, list(int)): the preusers keyed by email, and the IDs
+        of any more preusers with an email that's already in the dict
+    """
+    table = Preuser.__table__
+    current = {}
+    duplicates = []
+    for preuser in db.session.query(table.c.id, table.c.email,
+                                    *[table.c[field]
+                                      for field in PREUSER_FIELDS])\
+            .filter(table.c.school_title == school.title)\
+            .order_by(table.c.id):
+        if preuser.email in current:
+            duplicates.append(preuser.id)
+        else:
+            current[preuser.email] = preuser
+    return current, duplicates
+
+
+def _changed_fields(preuser, brother):
+    """The fields of a preuser that a brother would change."""
+    return [field for field in PREUSER_FIELDS
+            if getattr(preuser, field) != brother[field]]
+
+
+def _replace_preusers(brothers, school, chunk_size, progress, heartbeat):
+    """Delete every preuser of the school and insert the brothers instead."""
+    changes = {'added': 0, 'updated': 0, 'unchanged': 0}
+    changes['deleted'] = Preuser.query\
+        .filter(Preuser.school_title == school.title)\
+        .delete(synchronize_session=False)
+    if heartbeat is not None:
+        heartbeat()
+    for chunk in chunked(brothers, chunk_size):
+        db.session.execute(Preuser.__table__.insert().values(chunk))
+        changes['added'] += len(chunk)
+        if progress is not None:
+            progress(changes['added'])
+    return changes
+
+
+def _diff_preusers(brothers, school, chunk_size, progress, heartbeat):
+    """Insert, update and delete only the preusers of the school that differ
+    from the brothers.
+
+    The school's preusers are loaded in to a dict keyed by email, and the
+    brothers are compared against it a chunk at a time. If an email is on
+    the roster (or in the table) more than once, only the first one counts.
+    """
+    table = Preuser.__table__
+    current, duplicates = _current_preusers(school)
+    if heartbeat is not None:
+        heartbeat()
+    changes = {'added': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    seen = set()
+    compared = 0
+    for chunk in chunked(brothers, chunk_size):
+        inserts = []
+        updates = []
+        for brother in chunk:
+            email = brother['email']
+            if email in seen:
+                continue
+            seen.add(email)
+            preuser = current.get(email)
+            if preuser is None:
+                inserts.append(brother)
+            elif _changed_fields(preuser, brother):
+                update = dict((field, brother[field])
+                              for field in PREUSER_FIELDS)
+                update['preuser_id'] = preuser.id
+                updates.append(update)
+            else:
+                changes['unchanged'] += 1
+        if inserts:
+            db.session.execute(table.insert().values(inserts))
+            changes['added'] += len(inserts)
+        if updates:
+            db.session.execute(table.update()
+                               .where(table.c.id == bindparam('preuser_id')),
+                               updates)
+            changes['updated'] += len(updates)
+        compared += len(chunk)
+        if progress is not None:
+            progress(compared)
+
+    gone = duplicates + [kept.id for kept_email, kept in current.items()
+                         if kept_email not in seen]
+    for chunk in chunked(gone, chunk_size):
+        changes['deleted'] += Preuser.query.filter(Preuser.id.in_(chunk))\
+            .delete(synchronize_session=False)
+        if heartbeat is not None:
+            heartbeat()
+    return changes
+
+
+def ingest_roster(infile, school, progress=None, replace=False,
+                  heartbeat=None):
+    """Make the pre-registered users of a school match the brothers of a
+    roster, and delete the users who aren't on it, in a single transaction.
+
+    Users who aren't on the roster but hosted guests at someone else's party
+    (see `hosts_elsewhere`) are deactivated instead, so that party's guest
+    list and reports stay whole.
+
+    By default only the preusers that changed are written (see
+    `_diff_preusers`), so uploading the same roster twice doesn't touch a
+    single row. With `replace`, every preuser of the school is deleted and
+    inserted again instead.
+
+    The roster is read INGEST_CHUNK_SIZE rows at a time, with a multi-row
+    INSERT per chunk, so it's never all in memory at once. If anything goes
+    wrong, the transaction is rolled back and the school is left the way it
+    was.
+
+    :param infile: file -- the roster CSV (see `parse_roster`)
+    :param school: School -- the school the roster is for
+    :param progress: callable (default: None) -- called with the number of
+        brothers read so far, after each chunk
+    :param replace: bool (default: False) -- delete and recreate every
+        preuser of the school, rather than only changing what's different
+    :param heartbeat: callable (default: None) -- called with no arguments
+        during the steps that don't read the roster, like loading the
+        school's preusers and deleting its users, at least once a chunk
+    :return dict: how many preusers were added, updated, unchanged and
+        deleted, and how many users were deleted and deactivated
+    """
+    chunk_size = current_app.config['INGEST_CHUNK_SIZE']
+    apply_roster = _replace_preusers if replace else _diff_preusers
+    try:
+        changes = apply_roster(parse_roster(infile, school.title), school,
+                               chunk_size, progress, heartbeat)
+
+        relics = relic_users(school).all()
+        hosts = hosts_elsewhere([user.id for user in relics])
+        changes['deleted_users'] = changes['deactivated_users'] = 0
+        for chunk in chunked(relics, chunk_size):
+            for user in chunk:
+                if user.id in hosts:
+                    if user.active:
+                        user.active = False
+                        changes['deactivated_users'] += 1
+                else:
+                    # through the ORM, so their parties go with them
+                    db.session.delete(user)
+                    changes['deleted_users'] += 1
+            # flushed a chunk at a time, so there's a heartbeat between them
+            db.session.flush()
+            if heartbeat is not None:
+                heartbeat()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return changes
+
+
+class RosterPreview(object):
+    """What ingesting a roster would do to a school (see `preview_roster`)."""
+
+    #: The lists of rows a preview has, in the order they're summarized
+    SECTIONS = ('problems', 'added', 'updated', 'deleted', 'deleted_users',
+                'deactivated_users')
+
+    def __init__(self):
+        """Start with an empty preview."""
+        self.rows = 0
+        self.unchanged = 0
+        #: The rows with something wrong with them, and what
+        self.problems = []
+        #: The brothers who would become preusers
+        self.added = []
+        #: The preusers who would change, and how
+        self.updated = []
+        #: The preusers who would be deleted
+        self.deleted = []
+        #: The users who would be deleted, since they're not on the roster
+        self.deleted_users = []
+        #: The users who would be deactivated instead, since they hosted
+        #: guests at someone else's party
+        self.deactivated_users = []
+
+    @property
+    def summary(self):
+        """How many rows there are, and how many of each change."""
+        summary = dict((section, len(getattr(self, section)))
+                       for section in self.SECTIONS)
+        summary.update(rows=self.rows, unchanged=self.unchanged)
+        return summary
+
+    @property
+    def json_dict(self):
+        """Returns the preview as a JSON serializable python dict."""
+        data = dict((section, getattr(self, section))
+                    for section in self.SECTIONS)
+        data['summary'] = self.summary
+        return data
+
+
+def _person(row):
+    """Who a preuser or user is, to show in a preview."""
+    return {'email': row.email, 'first_name': row.first_name,
+            'last_name': row.last_name}
+
+
+def preview_roster(infile, school, replace=False):
+    """Work out everything that ingesting a roster would change (see
+    `ingest_roster`), without writing anything.
+
+    The roster is streamed a row at a time and compared against the school's
+    preusers, fraternities and users, which are each loaded with a single
+    query, so the preview takes the same few queries however long the roster
+    is.
+
+    :param infile: file -- the roster CSV (see `check_roster`)
+    :param school: School -- the school the roster is for
+    :param replace: bool (default: False) -- preview deleting and recreating
+        every preuser of the school
+    :return RosterPreview: the problems with the roster, and the changes
+
+    Raises:
+        ValueError -- if the CSV is missing one of ROSTER_COLUMNS
+    """
+    current, duplicates = _current_preusers(school)
+    fraternities = set(title for title, in
+                       db.session.query(Fraternity.title)
+                       .filter(Fraternity.school_id == school.id))
+    preview = RosterPreview()
+    seen = set()
+    for line, row, brother, problems in check_roster(infile, school.title):
+        preview.rows += 1
+        if brother is not None:
+            if brother['email'] in seen:
+                problems.append(DUPLICATE_EMAIL)
+            if brother['fraternity_name'] not in fraternities:
+                problems.append(UNKNOWN_FRATERNITY)
+        if problems:
+            problem = dict((column, (row[column] or '').strip())
+                           for column in ROSTER_COLUMNS)
+            problem.update(line=line, problems=problems)
+            preview.problems.append(problem)
+        if brother is None or brother['email'] in seen:
+            continue
+        seen.add(brother['email'])
+        preuser = current.get(brother['email'])
+        changed = preuser is not None and _changed_fields(preuser, brother)
+        if preuser is None or replace:
+            preview.added.append(
+                dict((field, brother[field])
+                     for field in ('email',) + PREUSER_FIELDS))
+        elif changed:
+            preview.updated.append({
+                'email': brother['email'],
+                'changes': dict((field, [getattr(preuser, field),
+                                         brother[field]])
+                                for field in changed)})
+        else:
+            preview.unchanged += 1
+
+    preview.deleted = [_person(kept) for kept_email, kept
+                       in sorted(current.items())
+                       if replace or kept_email not in seen]
+    if duplicates:
+        preview.deleted += [_person(duplicate) for duplicate in Preuser.query
+                            .filter(Preuser.id.in_(duplicates))
+                            .order_by(Preuser.id)]
+    # only the emails on the roster will have a preuser afterwards
+    relics = [user for user in
+              db.session.query(User.id, User.email, User.first_name,
+                               User.last_name, User.active)
+              .join(Fraternity, User.fraternity_id == Fraternity.id)
+              .filter(Fraternity.school_id == school.id)
+              .order_by(User.email)
+              if user.email not in seen]
+    hosts = hosts_elsewhere([user.id for user in relics])
+    for user in relics:
+        if user.id not in hosts:
+            preview.deleted_users.append(_person(user))
+        elif user.active:
+            preview.deactivated_users.append(_person(user))
+    return preview
+
+
+@job_handler('ingest_roster')
+def run_ingest_job(job):
+    """Ingest a roster that was uploaded (see `ingest_roster`) in the
+    background.
+
+    The roster is the job's payload, and its args are the `school_id` of the
+    school it's for and, optionally, whether to `replace` every preuser. Its
+    total is the number of brothers on the roster, which are counted a chunk
+    at a time, with a heartbeat after each.
+    """
+    school = School.query.get(job.args['school_id'])
+    job_id = job.id
+    infile = StringIO(job.payload)
+    total = 0
+    for chunk in chunked(parse_roster(infile, school.title),
+                         current_app.config['INGEST_CHUNK_SIZE']):
+        total += len(chunk)
+        Job.heartbeat(job_id)
+    Job.report_progress(job_id, 0, total)
+    infile.seek(0)
+    return ingest_roster(
+        infile, school,
+        progress=lambda read: Job.report_progress(job_id, read),
+        replace=job.args.get('replace', False),
+        heartbeat=lambda: Job.heartbeat(job_id))
@@ -1,105 +1,190 @@
 # -*- coding: utf-8 -*-
 """Ingets views."""
-import csv
 import os
+import re
+import time
+import uuid
+from functools import wraps
 
 from flask import Blueprint, render_template, request, redirect, url_for,\
-    flash, current_app
+    flash, current_app, jsonify
 from flask_login import login_required, current_user
-from werkzeug import secure_filename
-from werkzeug.exceptions import Forbidden
+from werkzeug.exceptions import Forbidden, NotFound
 
-from ifc import locales, models as m
+from ifc import locales
+from ifc.extensions import cache
+from ifc.ingest.roster import RosterPreview, preview_roster
+from ifc.jobs.models import Job
+from ifc.utils import InvalidAPIUsage
 
 blueprint = Blueprint('ingest', __name__, url_prefix='/ingest',
                       static_folder='../static')
 
+#: What the name of a previewed upload looks like
+UPLOAD_TOKEN = re.compile(r'^[0-9a-f]{32}$')
+PREVIEW_FILE = re.compile(r'^[0-9a-f]{32}\.csv$')
+
 
 def allowed_file(filename):
     return '.' in filename and \
         filename.rsplit('.', 1)[1] in ['csv']
 
 
+def site_admin_required(view):
+    """Only let site admins see a view, anyone else is Forbidden."""
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        if not getattr(current_user, 'is_site_admin', False):
+            raise Forbidden()
+        return view(*args, **kwargs)
+    return decorated
+
+
+def upload_path(token):
+    """Where a previewed upload is kept, or NotFound if there's no such
+    upload."""
+    if not UPLOAD_TOKEN.match(token or ''):
+        raise NotFound()
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'],
+                        '{}.csv'.format(token))
+    if not os.path.isfile(path):
+        raise NotFound()
+    return path
+
+
+def remove_stale_previews():
+    """Delete the previewed uploads that are older than
+    INGEST_PREVIEW_TIMEOUT, since they were never ingested."""
+    folder = current_app.config['UPLOAD_FOLDER']
+    oldest = time.time() - current_app.config['INGEST_PREVIEW_TIMEOUT']
+    for name in os.listdir(folder):
+        if not PREVIEW_FILE.match(name):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            if os.path.getmtime(path) < oldest:
+                os.remove(path)
+        except OSError:
+            # another request got to it first
+            pass
+
+
+def replace_requested():
+    """Whether the form or query string asks to replace every preuser."""
+    return request.values.get('replace', '').lower() in ('on', 'true')
+
+
 @blueprint.route('/', methods=['GET', 'POST'])
 @login_required
+@site_admin_required
 def upload_file():
-    if hasattr(current_user, 'is_site_admin') and current_user.is_site_admin:
-        if request.method == 'POST':
-            file = request.files.get('file')
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                fpath = os.path.join(current_app.config['UPLOAD_FOLDER'],
-                                     filename)
-                file.save(fpath)
-                ingest_file(fpath)
-                flash(locales.Successes.DATA_INGESTED, 'success')
-                return redirect(url_for('public.home'))
-        return render_template('ingest/index.html')
-    else:
-        raise Forbidden()
-
-
-def delete_school_preusers():
-    """This function should ONLY be called where current_user is accessible.
-
-    It will delete all preusers from the DB where their school title matches up
-    with the current_user's school title.
-
-    :return bool: False if some error was raised, else True
+    if request.method == 'POST':
+        file = request.files.get('file')
+        # the roster goes in to the job, since the worker that ingests it
+        # can't see this process's disk
+        payload = None
+        if 'upload' in request.form:
+            # a roster that was already uploaded to be previewed
+            preview_path = upload_path(request.form['upload'])
+            with open(preview_path, 'rb') as infile:
+                payload = infile.read()
+            os.remove(preview_path)
+        elif file and allowed_file(file.filename):
+            payload = file.read()
+        if payload is not None:
+            school_id = current_user.fraternity.school_id
+            job = Job.enqueue('ingest_roster',
+                              {'school_id': school_id,
+                               'replace': replace_requested()},
+                              school_id=school_id, payload=payload)
+            flash(locales.Success.ROSTER_QUEUED, 'info')
+            return redirect(url_for('ingest.upload_file', job=job.id))
+    return render_template('ingest/index.html',
+                           job_id=request.args.get('job', None, int),
+                           done_message=locales.Success.DATA_INGESTED,
+                           failed_message=locales.Error.ROSTER_NOT_INGESTED)
+
+
+def paginated(rows):
+    """A page of a preview's rows, as picked by the `page` and `per_page`
+    query string arguments.
+
+    :param rows: list -- the rows, in order
+    :return dict: the page of `items`, and where it is in the rows
     """
-    try:
-        m.Preuser.query.filter_by(
-            m.Preuser.school_title == current_user.fraternity.school.title)\
-            .delete()
-    except Exception:
-        return False
-    return True
-
-
-def delete_relic_users():
-    """This function should ONLY be called where current_user is accessible.
+    max_per_page = current_app.config['INGEST_PREVIEW_MAX_PER_PAGE']
+    per_page = min(max(request.args.get('per_page', 50, int), 1),
+                   max_per_page)
+    page = max(request.args.get('page', 1, int), 1)
+    total = len(rows)
+    return {'items': rows[(page - 1) * per_page:page * per_page],
+            'page': page, 'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page, 'total': total}
+
+
+def stored_preview(token):
+    """Get the preview of an upload (see `preview_roster`), from `cache` if
+    it's there.
+
+    A preview is worked out once and kept for INGEST_PREVIEW_TIMEOUT seconds,
+    as long as its upload is, so fetching its pages doesn't read the roster
+    again. It shows what the roster would change when it was first previewed.
+    """
+    path = upload_path(token)
+    school = current_user.fraternity.school
+    replace = replace_requested()
+    key = 'roster-preview/{}/{}/{}'.format(token, school.id, int(replace))
+    preview = cache.get(key)
+    if preview is None:
+        with open(path, 'r') as infile:
+            try:
+                preview = preview_roster(infile, school,
+                                         replace=replace).json_dict
+            except ValueError as ex:
+                raise InvalidAPIUsage(payload={'error': ex.message})
+        cache.set(key, preview,
+                  timeout=current_app.config['INGEST_PREVIEW_TIMEOUT'])
+    return preview
+
+
+def preview_response(token):
+    """Respond with what ingesting an upload would change, and a page of one
+    section of the changes (the problems, by default)."""
+    section = request.args.get('section', 'problems')
+    if section not in RosterPreview.SECTIONS:
+        raise InvalidAPIUsage(
+            payload={'error': locales.Error.UNKNOWN_PREVIEW_SECTION})
+    preview = stored_preview(token)
+    return jsonify({'upload': token, 'summary': preview['summary'],
+                    'section': section,
+                    section: paginated(preview[section])})
+
+
+@blueprint.route('/preview', methods=['POST'])
+@login_required
+@site_admin_required
+def preview_upload():
+    """Upload a roster and preview what ingesting it would change, without
+    changing anything.
+
+    The upload is kept for INGEST_PREVIEW_TIMEOUT seconds, so more pages of
+    the preview can be fetched (see `preview_page`), and it can be ingested by
+    posting its `upload` token to `upload_file`. The uploads of older
+    previews are deleted now.
+    """
+    file = request.files.get('file')
+    if not file or not allowed_file(file.filename):
+        raise InvalidAPIUsage(payload={'error': locales.Error.NO_ROSTER})
+    remove_stale_previews()
+    token = uuid.uuid4().hex
+    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'],
+                           '{}.csv'.format(token)))
+    return preview_response(token)
 
-    It will delete all users from the DB where their school title matches up
-    with the current_user's school title and they do not have a corresponding
-    preuser
 
-    :return bool: False if some error was raised, else True
-    """
-    try:
-        school_users = m.User.query.join(m.User.fraternity)\
-            .join(m.Fraternity.school).filter_by(
-                id=current_user.fraternity.school_id).all()
-        for user in school_users:
-            preuser = m.Preuser.query.filter(
-                m.Preuser.email == user.email,
-                m.Preuser.school_title == current_user.fraternity.school.title)\
-                    .first()
-            if preuser is None:
-                user.delete()
-    except Exception:
-        return False
-    return True
-
-
-def ingest_file(file_name):
-    with open(file_name, 'r') as infile:
-        # delete all pre-registration user models for the current_user's school
-        delete_school_preusers()
-
-        # create all pre-registration user models
-        inread = csv.DictReader(infile)
-        for brother in inread:
-            # we only want WPI emails
-            if '@wpi.edu' not in brother['email']:
-                continue
-            brother['email'] = brother.pop('email')
-            # lol somebody's name was too long so I'm doing this
-            brother['first_name'] = brother['first_name'].split()[0][:30]
-            brother['chapter_admin'] = brother.get('chapter_admin',
-                                                   None).lower() == 'true'
-            brother['ifc_admin'] = brother.get('ifc_admin',
-                                               None).lower() == 'true'
-            m.Preuser.create(**brother)
-
-        # delete users with no pre-registration user model
-        delete_relic_users()
+@blueprint.route('/preview/<token>', methods=['GET'])
+@login_required
+@site_admin_required
+def preview_page(token):
+    """Another page of the preview of an upload."""
+    return preview_response(token)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+"""The background jobs module."""
+from . import views  # noqa
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Job models."""
+from datetime import datetime as dt, timedelta as td
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.orm import deferred
+
+from ifc.database import Column, Model, SurrogatePK, db, reference_col
+
+
+class Job(SurrogatePK, Model):
+    """A piece of work for a background worker (see `ifc.jobs.worker`), such
+    as ingesting an uploaded roster."""
+
+    __tablename__ = 'jobs'
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    #: Which handler runs the job (see `ifc.jobs.worker.job_handler`)
+    kind = Column(db.String(40), nullable=False)
+    status = Column(db.String(10), nullable=False, default=QUEUED,
+                    server_default=QUEUED)
+    #: What the handler needs to run the job
+    args = Column(JSON(), nullable=False)
+    #: A file the handler needs, like an uploaded roster, which is kept here
+    #: since a worker can't see the disk of the process that queued the job.
+    #: It's only loaded when it's used, and dropped once the job's finished.
+    payload = deferred(Column(db.LargeBinary()))
+    #: What the handler returned, once the job is done
+    result = Column(JSON())
+    #: Why the job failed, if it did
+    error = Column(db.Text())
+    #: How many of the job's `total` steps are done
+    progress = Column(db.Integer(), nullable=False, default=0,
+                      server_default='0')
+    total = Column(db.Integer())
+    #: The school the job is for, whose site admins can follow it
+    school_id = reference_col('schools', nullable=True)
+    created_at = Column(db.DateTime, nullable=False, default=dt.utcnow)
+    started_at = Column(db.DateTime)
+    finished_at = Column(db.DateTime)
+    #: When the worker running the job last said it was still at it
+    heartbeat_at = Column(db.DateTime)
+    #: How many times a worker has taken the job
+    attempts = Column(db.Integer(), nullable=False, default=0,
+                      server_default='0')
+    __table_args__ = (db.Index('ix_jobs_status_id', 'status', 'id'),)
+
+    #: Which of the job's attempts this process is running, once it's claimed
+    #: the job (see `claim_next`)
+    claimed_attempt = None
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<Job({id}, {kind}, {status})>'.format(
+            id=self.id, kind=self.kind, status=self.status)
+
+    @classmethod
+    def enqueue(cls, kind, args, school_id=None, payload=None):
+        """Queue up a job for a worker and commit.
+
+        :param kind: str -- which handler runs the job
+        :param args: dict -- JSON serializable arguments for the handler
+        :param school_id: int (default: None) -- the school the job is for
+        :param payload: str (default: None) -- the contents of a file the
+            handler needs
+        :return Job: the queued job
+        """
+        return cls.create(kind=kind, args=args, school_id=school_id,
+                          payload=payload)
+
+    @classmethod
+    def reclaim_stale(cls):
+        """Put the running jobs whose worker stopped (its dyno restarted, say)
+        back in the queue, without committing.
+
+        A job's worker is taken to have stopped once it hasn't reported any
+        progress for JOB_TIMEOUT seconds. Jobs that have already been taken
+        JOB_MAX_ATTEMPTS times fail instead, in case they're what stopped the
+        worker. Both are conditional UPDATEs, so they're safe to run from many
+        workers at once.
+        """
+        stale = cls.query.filter(
+            cls.status == cls.RUNNING,
+            cls.heartbeat_at < dt.utcnow() -
+            td(seconds=current_app.config['JOB_TIMEOUT']))
+        max_attempts = current_app.config['JOB_MAX_ATTEMPTS']
+        stale.filter(cls.attempts >= max_attempts)\
+            .update({cls.status: cls.FAILED,
+                     cls.error: 'The worker running the job stopped {} times'
+                                .format(max_attempts),
+                     cls.finished_at: dt.utcnow()},
+                    synchronize_session=False)
+        stale.filter(cls.attempts < max_attempts)\
+            .update({cls.status: cls.QUEUED}, synchronize_session=False)
+
+    @classmethod
+    def claim_next(cls):
+        """Take the oldest queued job and mark it as running, committing right
+        away.
+
+        A job is only marked as running if it's still queued, in a single
+        conditional UPDATE, so two workers can't both take the same job. A
+        worker that loses the race for a job moves on to the next one. Jobs
+        whose worker stopped are queued again first (see `reclaim_stale`).
+
+        The job's `claimed_attempt` is set, so that a worker can tell whether
+        it's still the one running the job when it finishes (see `finish`).
+
+        :return Job: the job, or None if nothing is queued
+        """
+        cls.reclaim_stale()
+        while True:
+            job_id = db.session.query(cls.id)\
+                .filter(cls.status == cls.QUEUED)\
+                .order_by(cls.id).limit(1).scalar()
+            if job_id is None:
+                db.session.commit()
+                return None
+            claimed = cls.query.filter(cls.id == job_id,
+                                       cls.status == cls.QUEUED)\
+                .update({cls.status: cls.RUNNING,
+                         cls.started_at: dt.utcnow(),
+                         cls.heartbeat_at: dt.utcnow(),
+                         cls.attempts: cls.attempts + 1},
+                        synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                job = cls.query.get(job_id)
+                job.claimed_attempt = job.attempts
+                return job
+
+    @classmethod
+    def report_progress(cls, job_id, progress, total=None):
+        """Record how far along a job is, which also tells `reclaim_stale`
+        that its worker is still at it.
+
+        This goes straight through the engine rather than the session, so it's
+        committed right away on its own, and the progress can be seen while
+        the job's own transaction is still open. Handlers that take longer
+        than JOB_TIMEOUT seconds should report their progress at least that
+        often.
+
+        :param job_id: int -- the ID of the job
+        :param progress: int -- how many steps are done
+        :param total: int (default: None) -- how many steps there are, if it's
+            known by now
+        """
+        values = {'progress': progress, 'heartbeat_at': dt.utcnow()}
+        if total is not None:
+            values['total'] = total
+        db.engine.execute(cls.__table__.update()
+                          .where(cls.__table__.c.id == job_id)
+                          .values(**values))
+
+    @classmethod
+    def heartbeat(cls, job_id):
+        """Tell `reclaim_stale` that a job's worker is still at it, during
+        the parts of the job that don't make any progress (see
+        `report_progress`).
+
+        :param job_id: int -- the ID of the job
+        """
+        db.engine.execute(cls.__table__.update()
+                          .where(cls.__table__.c.id == job_id)
+                          .values(heartbeat_at=dt.utcnow()))
+
+    def finish(self, result=None):
+        """Mark the job as done, with what its handler returned, and
+        commit (see `_settle`).
+
+        :return bool: whether the job was marked as done
+        """
+        return self._settle(status=self.DONE, result=result)
+
+    def fail(self, error):
+        """Mark the job as failed, with why, and commit (see `_settle`).
+
+        :return bool: whether the job was marked as failed
+        """
+        return self._settle(status=self.FAILED, error=error)
+
+    def _settle(self, **values):
+        """Record how the job ended, and drop its payload, in a conditional
+        UPDATE that only matches if the job is still on the attempt this
+        process claimed.
+
+        If this worker was taken to have stopped and the job was claimed again
+        (see `reclaim_stale`), the newer attempt decides how the job ends, and
+        this one changes nothing.
+        """
+        values.update(finished_at=dt.utcnow(), payload=None)
+        settled = Job.query.filter(Job.id == self.id,
+                                   Job.status == self.RUNNING,
+                                   Job.attempts == self.claimed_attempt)\
+            .update(values, synchronize_session=False)
+        db.session.commit()
+        return bool(settled)
+
+    @property
+    def finished(self):
+        """Whether the job is done or failed."""
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def json_dict(self):
+        """Returns the job as a JSON serializable python dict."""
+        return {'id': self.id, 'kind': self.kind, 'status': self.status,
+                'progress': self.progress, 'total': self.total,
+                'result': self.result, 'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'attempts': self.attempts}
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""Job views."""
+from functools import partial
+
+from flask import Blueprint, g, jsonify
+
+from ifc import locales
+from ifc.utils import InvalidAPIUsage, permission_required
+
+blueprint = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@blueprint.route('/<int:job_id>', methods=['GET'])
+@permission_required('can_view_job_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_SEE_JOB}))
+def job_status(job_id):
+    """The status and progress of a background job, for pages to poll."""
+    return jsonify(job=g.job.json_dict)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""A background worker that runs queued jobs, with the jobs table as its
+queue (run it with `python manage.py worker`)."""
+import time
+
+from flask import current_app
+
+from .models import Job
+from ifc.database import db
+
+#: The function that runs each kind of job
+handlers = {}
+
+
+def job_handler(kind):
+    """Register a function as the way to run jobs of a kind.
+
+    The function is called with the job, and what it returns is stored as the
+    job's result. If it raises, the job fails and anything it didn't commit
+    is rolled back. Handlers that take longer than JOB_TIMEOUT seconds should
+    report their progress, or at least a heartbeat, that often (see
+    `Job.report_progress` and `Job.heartbeat`).
+
+    example usage:
+        >>> @job_handler('ingest_roster')
+        ... def run_ingest_job(job):
+        ...     return ingest_roster(...)
+    """
+    def decorator(handler):
+        handlers[kind] = handler
+        return handler
+    return decorator
+
+
+def run_next_job():
+    """Claim the oldest queued job and run it.
+
+    :return Job: the job that was run, or None if nothing was queued
+    """
+    job = Job.claim_next()
+    if job is None:
+        return None
+    handler = handlers.get(job.kind)
+    if handler is None:
+        job.fail('There is no handler for {} jobs'.format(job.kind))
+        return job
+    try:
+        result = handler(job)
+    except Exception as ex:
+        db.session.rollback()
+        current_app.logger.exception('Job %s failed', job.id)
+        settled = job.fail(u'{}'.format(ex) or ex.__class__.__name__)
+    else:
+        settled = job.finish(result)
+    if not settled:
+        current_app.logger.warning('Job %s was taken over by another worker',
+                                   job.id)
+    return job
+
+
+def work(poll_interval, once=False):
+    """Run jobs as they're queued, until the process is stopped.
+
+    :param poll_interval: float -- seconds to wait for a job when nothing is
+        queued
+    :param once: bool (default: False) -- stop as soon as nothing is queued,
+        instead of waiting for more jobs
+    """
+    while True:
+        if run_next_job() is None:
+            if once:
+                return
+            time.sleep(poll_interval)
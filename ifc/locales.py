@@ -12,6 +12,7 @@ class Error(object):
     PARTY_END_BEFORE_START = 'A party cannot end before it begins.'
     GUEST_NAME_SHORT = 'That guest needs a real name.'
     CANT_SEE_GUESTS = "You can't see the guests of this party"
+    TOO_MANY_STREAMS = 'Too many guest lists are open, poll for the changes.'
     NOT_GUESTS_HOST = "You can't edit guests you didn't add"
     CANT_EDIT_GUESTS = "You can't edit the guests of this party"
     GUEST_REQUIRED_FIELDS = "name and is_male are required fields."
@@ -22,16 +23,33 @@ class Error(object):
     BAD_PW_VERIFICATION = 'Passwords must match'
     EMAIL_TAKEN = 'Email already registered'
     INVALID_ROLE = 'Invalid role title'
+    GUEST_OPERATIONS_REQUIRED = \
+        'operations must be a list of guest_id and action pairs.'
+    UNKNOWN_GUEST_ACTION = 'action must be one of check_in, check_out, toggle'
+    GUEST_NOT_ON_LIST = 'That guest is not on this party list'
+    SEARCH_QUERY_REQUIRED = 'q is a required parameter.'
+    CANT_SEE_ANALYTICS = "You can't see the trends of these parties"
+    INVALID_DATE = 'Dates must look like 2017-01-31.'
+    INVALID_INTERVAL = \
+        'interval must be one of 1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30, 60'
     PARTY_ENDED = "You can't do that, because the party ended"
     PARTY_ENDED_TEMPLATE = "You can't {}, because the party ended"
     PARTY_ENDED_DELETE_GUEST = PARTY_ENDED_TEMPLATE.format('delete any guests')
     PARTY_ENDED_ADD_GUEST = PARTY_ENDED_TEMPLATE.format('add any guests')
     PARTY_ENDED_CHECKIN_GUEST = PARTY_ENDED_TEMPLATE\
         .format('check any guests in or out')
+    PARTY_FULL = "You can't check anyone else in, the party is at capacity"
+    ROSTER_NOT_INGESTED = "The roster couldn't be saved, so nothing changed"
+    CANT_SEE_JOB = "You can't see this job"
+    NO_ROSTER = 'Upload a roster CSV to preview.'
+    UNKNOWN_PREVIEW_SECTION = \
+        'section must be one of problems, added, updated, deleted, ' \
+        'deleted_users, deactivated_users'
 
 
 class Success(object):
     DATA_INGESTED = 'All data successfully ingested!'
+    ROSTER_QUEUED = 'The roster was uploaded, and is being ingested.'
     GUEST_DELETED = 'Successfully deleted guest'
     GUEST_CHECKED_IN = 'Successfully checked in guest'
     GUEST_CHECKED_OUT = 'Successfully checked out guest'
@@ -7,8 +7,11 @@ from werkzeug.exceptions import NotFound
 from ifc.school.models import School  # noqa
 from ifc.admin.models import Preuser  # noqa
 from ifc.user.models import Role, User  # noqa
-from ifc.party.models import Fraternity, Party, Guest  # noqa
+from ifc.party.models import Fraternity, Party, Guest, DeletedGuest  # noqa
+from ifc.party.models import PartyReport, PartyHostReport  # noqa
 from ifc.manage.models import Capacity  # noqa
+from ifc.jobs.models import Job  # noqa
+from ifc.user.cache import lookup_cache
 
 
 class AdminModelView(ModelView):
@@ -48,6 +51,17 @@ class AdminModelView(ModelView):
             return super(AdminModelView, self).get_query()
 
 
+class ClearsLookupCacheMixin(object):
+    """For the views of models that `lookup_cache` keeps, so they're
+    forgotten as soon as they change."""
+
+    def after_model_change(self, form, model, is_created):
+        lookup_cache.clear()
+
+    def after_model_delete(self, model):
+        lookup_cache.clear()
+
+
 class SiteAdminModelView(AdminModelView):
     @staticmethod
     def _is_accessible():
@@ -69,15 +83,15 @@ class UserModelView(AdminModelView):
                 .filter_by(id=current_user.fraternity.school_id)
 
 
-class RoleModelView(SiteAdminModelView):
+class RoleModelView(ClearsLookupCacheMixin, SiteAdminModelView):
     pass
 
 
-class SchoolModelView(SiteAdminModelView):
+class SchoolModelView(ClearsLookupCacheMixin, SiteAdminModelView):
     pass
 
 
-class FraternityModelView(AdminModelView):
+class FraternityModelView(ClearsLookupCacheMixin, AdminModelView):
     form_excluded_columns = ['school']
     column_exclude_list = ['school']
     can_delete = False
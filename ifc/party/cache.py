@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""An in-memory cache of the guest lists of parties in progress."""
+import collections
+import threading
+
+from flask import current_app
+from titlecase import titlecase
+
+from .events import guest_events
+from .models import Guest
+from .search import TrigramIndex
+
+
+class GuestRecord(collections.namedtuple('GuestRecord', [
+        'id', 'name', 'host', 'is_male', 'is_at_party', 'entered_at',
+        'left_at'])):
+    """What the guest list needs to know about a guest, without the ORM.
+
+    `name` is already title cased and `host` is the host's full name, so that
+    `json_dict` matches `Guest.json_dict` without any more work.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_guest(cls, guest):
+        """Make a record of a guest, whose host should already be loaded."""
+        return cls(guest.id, titlecase(guest.name), guest.host.full_name,
+                   guest.is_male, guest.is_at_party, guest.entered_party_at,
+                   guest.left_party_at)
+
+    @property
+    def json_dict(self):
+        """Returns the guest as a JSON serializable python dict."""
+        return {'name': self.name, 'host': self.host,
+                'is_male': self.is_male, 'is_at_party': self.is_at_party,
+                'id': self.id, 'left_at': self.left_at,
+                'entered_at': self.entered_at}
+
+
+class PartyGuests(object):
+    """The guests of a party at one version of its guest list."""
+
+    __slots__ = ('version', 'guests', '_by_id', '_name_index')
+
+    def __init__(self, version, guests):
+        """
+        :param version: int -- the party's guests_version
+        :param guests: list(GuestRecord) -- the guests, ordered by ID
+        """
+        self.version = version
+        self.guests = tuple(guests)
+        self._by_id = None
+        self._name_index = None
+
+    def filter(self, is_male=None):
+        """Get the guests, or only the male (True) or female (False) ones."""
+        if is_male is None:
+            return self.guests
+        return tuple(guest for guest in self.guests
+                     if guest.is_male == is_male)
+
+    def get(self, guest_id):
+        """Get a guest by ID, or None if they aren't on the list."""
+        if self._by_id is None:
+            self._by_id = {guest.id: guest for guest in self.guests}
+        return self._by_id.get(guest_id)
+
+    @property
+    def name_index(self):
+        """A trigram index of the guests' names, built the first time it's
+        needed."""
+        if self._name_index is None:
+            self._name_index = TrigramIndex((guest.id, guest.name,
+                                             guest.is_male)
+                                            for guest in self.guests)
+        return self._name_index
+
+
+class GuestCache(object):
+    """Keeps the guest lists of parties in progress in memory, since nearly
+    every request during a party is for its guests.
+
+    A cached list is labelled with the party's guests_version when it was
+    loaded, and is only used while the version still matches, so changes made
+    by other processes are picked up too. Lists are also dropped as soon as
+    this process changes them (through `guest_events`), and the least
+    recently used list is dropped once there are more than GUEST_CACHE_SIZE.
+
+    Parties that haven't started, or have ended, are loaded but not kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parties = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def keeps(party):
+        """Whether a party's guest list is kept in the cache, which it only
+        is while the party is going on."""
+        return party.started and not party.ended
+
+    def get(self, party):
+        """Get the guests of a party at its current version.
+
+        :param party: Party -- the party, with a current guests_version
+        :return PartyGuests:
+        """
+        version = party.guests_version
+        with self._lock:
+            cached = self._parties.pop(party.id, None)
+            if cached is not None and cached.version == version:
+                # move it to the most recently used end
+                self._parties[party.id] = cached
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        # the version is read before the guests, so the cached list never
+        # says it's more up to date than it is
+        cached = PartyGuests(version, [GuestRecord.from_guest(guest) for guest
+                                       in Guest.for_party(party.id)])
+        if self.keeps(party):
+            max_parties = current_app.config['GUEST_CACHE_SIZE']
+            with self._lock:
+                self._parties.pop(party.id, None)
+                self._parties[party.id] = cached
+                while len(self._parties) > max_parties:
+                    self._parties.popitem(last=False)
+                    self.evictions += 1
+        return cached
+
+    def invalidate(self, party_id):
+        """Drop a party's guest list, because it changed."""
+        with self._lock:
+            if self._parties.pop(party_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every guest list and reset the metrics."""
+        with self._lock:
+            self._parties.clear()
+            self.hits = self.misses = 0
+            self.invalidations = self.evictions = 0
+
+    def stats(self):
+        """How well the cache is doing, in this process.
+
+        :return dict: how many parties are cached, and the hits, misses,
+            invalidations and evictions since the process started
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'parties': len(self._parties),
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+                    'invalidations': self.invalidations,
+                    'evictions': self.evictions}
+
+
+guest_cache = GuestCache()
+guest_events.add_listener(guest_cache.invalidate)
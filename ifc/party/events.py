@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Guest list change notifications."""
+import collections
+import threading
+
+
+class Subscription(object):
+    """A subscription to the changes of one party's guest list."""
+
+    def __init__(self, events, party_id):
+        self.events = events
+        self.party_id = party_id
+        self._changed = threading.Event()
+
+    def notify(self):
+        """Wake up whoever is waiting on the subscription."""
+        self._changed.set()
+
+    def wait(self, timeout):
+        """Wait until the guest list changes, or until the timeout runs out.
+
+        :param timeout: float -- the most seconds to wait for
+        :return bool: True if the guest list changed, False on a timeout
+        """
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+    def close(self):
+        """Stop listening for changes."""
+        self.events.unsubscribe(self)
+
+
+class LocalGuestEvents(object):
+    """Tells the guest list streams served by this process when a party's
+    guest list changes.
+
+    The notifications only say *that* a list changed; the streams look up what
+    changed with a cursor, so a missed notification only delays a change. That
+    means streams in other processes still find every change when their
+    keepalive timeout runs out, and that this can be swapped for something
+    that crosses processes (postgres' LISTEN/NOTIFY, say) without touching the
+    streams.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = collections.defaultdict(set)
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call a function with the party's ID whenever a party's guest list
+        changes, for things that keep a copy of guest lists around.
+
+        :param listener: callable(int)
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def subscribe(self, party_id):
+        """Start listening for changes to the guest list of a party.
+
+        :return Subscription: remember to `close` it
+        """
+        subscription = Subscription(self, party_id)
+        with self._lock:
+            self._subscriptions[party_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Stop notifying the subscription."""
+        with self._lock:
+            subscriptions = self._subscriptions[subscription.party_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.party_id]
+
+    def publish(self, party_id):
+        """Notify everyone listening that the party's guest list changed."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(party_id, ()))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(party_id)
+        for subscription in subscriptions:
+            subscription.notify()
+
+
+class StreamSlots(object):
+    """Counts the guest list streams open in this process.
+
+    Each stream holds a worker thread for as long as it's open, so only so
+    many are let in at once, and the rest of the requests still get a thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        """Take a slot for a stream, if fewer than `limit` are open.
+
+        :return bool: whether the stream got a slot (`release` it when the
+            stream closes)
+        """
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        """Give back a stream's slot."""
+        with self._lock:
+            self.open -= 1
+
+
+guest_events = LocalGuestEvents()
+guest_streams = StreamSlots()
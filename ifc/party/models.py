@@ -2,7 +2,9 @@
 """Party models."""
 from datetime import datetime as dt
 
-from sqlalchemy.orm import validates
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.orm import column_property, joinedload, validates
 from titlecase import titlecase
 
 from ifc import locales
@@ -11,6 +13,8 @@ from ifc.database import Column, Model, SurrogatePK, db, reference_col, \
     relationship
 from ifc.utils import InvalidAPIUsage
 
+from . import events
+
 
 class Fraternity(SurrogatePK, Model):
     """A fraternity."""
@@ -51,11 +55,104 @@ class Party(SurrogatePK, Model):
     fraternity_id = reference_col('fraternities', nullable=False)
     fraternity = relationship('Fraternity')
     guests = relationship('Guest', cascade='delete', single_parent=True)
+    deleted_guests = relationship('DeletedGuest', cascade='delete',
+                                  single_parent=True)
+    report = relationship('PartyReport', uselist=False, cascade='delete',
+                          single_parent=True)
+    host_reports = relationship('PartyHostReport', cascade='delete',
+                                single_parent=True)
+    #: Incremented whenever a guest of the party changes
+    guests_version = Column(db.Integer(), nullable=False, default=0,
+                            server_default='0')
+    #: How many male and female guests are checked in right now, kept up to
+    #: date along with guests_version
+    males_at_party = Column(db.Integer(), nullable=False, default=0,
+                            server_default='0')
+    females_at_party = Column(db.Integer(), nullable=False, default=0,
+                              server_default='0')
 
     def __repr__(self):
         """Represent instance as a unique string."""
         return '<Party({name})>'.format(name=self.name)
 
+    @classmethod
+    def bump_guests_version(cls, party_id, males_entered=0, females_entered=0):
+        """Mark the guest list of the party as changed, as part of the current
+        transaction (nothing is committed).
+
+        This is a single UPDATE rather than a read and a write, so concurrent
+        changes to the same guest list can't lose an increment. The UPDATE
+        also locks the party's row until the transaction ends, so versions
+        are committed in the order they are handed out.
+
+        When more guests enter than leave, the UPDATE only goes through if the
+        party stays within its fraternity's capacity. The condition is checked
+        against the row as it is once the lock is held, so guests checked in
+        at the same time by other workers can't take the party over capacity.
+
+        :param males_entered: int (default: 0) -- how many more male guests
+            are at the party (negative if more left than entered)
+        :param females_entered: int (default: 0) -- how many more female
+            guests are at the party
+        :return int: the new version of the guest list
+
+        Raises:
+            InvalidAPIUsage -- (409) if the guests who entered would take the
+                party over capacity. Nothing is changed.
+        """
+        values = {cls.guests_version: cls.guests_version + 1}
+        if males_entered:
+            values[cls.males_at_party] = cls.males_at_party + males_entered
+        if females_entered:
+            values[cls.females_at_party] = \
+                cls.females_at_party + females_entered
+        query = cls.query.filter(cls.id == party_id)
+        entered = males_entered + females_entered
+        if entered > 0:
+            capacity = db.session.query(Fraternity.capacity)\
+                .filter(Fraternity.id == cls.fraternity_id).as_scalar()
+            query = query.filter(cls.males_at_party + cls.females_at_party +
+                                 entered <= capacity)
+            if not query.update(values, synchronize_session=False):
+                raise InvalidAPIUsage(status_code=409,
+                                      payload={'error':
+                                               locales.Error.PARTY_FULL})
+        else:
+            query.update(values)
+        return db.session.query(cls.guests_version)\
+            .filter(cls.id == party_id).scalar()
+
+    @classmethod
+    def lock_spots_left(cls, party_id):
+        """Lock the party's row until the transaction ends, and get how many
+        more guests fit in it.
+
+        While the lock is held no other guest can check in or out of the
+        party (see `bump_guests_version`), so the spots can be handed out
+        without any being taken in the meantime.
+
+        :param party_id: int -- the ID of the party
+        :return int: how many more guests can check in (less than 1 if the
+            party is full)
+        """
+        at_party, capacity = db.session.query(
+            cls.males_at_party + cls.females_at_party, Fraternity.capacity)\
+            .join(Fraternity, cls.fraternity_id == Fraternity.id)\
+            .filter(cls.id == party_id).with_for_update(of=cls).one()
+        return capacity - at_party
+
+    @property
+    def occupancy(self):
+        """How many guests are at the party right now, read from its counters
+        rather than its guests.
+
+        :return dict: the number of male, female and all guests at the party,
+            and the fraternity's capacity
+        """
+        return {'male': self.males_at_party, 'female': self.females_at_party,
+                'total': self.males_at_party + self.females_at_party,
+                'capacity': self.fraternity.capacity}
+
     @validates('fraternity', 'creator')
     def validate_fraternity(self, key, field):
         """Ensures that the creator is part of the fraternity"""
@@ -72,19 +169,25 @@ class Party(SurrogatePK, Model):
         return field
 
     def is_on_guest_list(self, guest_name):
-        """Validates whether or not the guest is on the party list."""
-        return guest_name.lower() in [guest.name.lower()
-                                      for guest in self.guests]
+        """Validates whether or not the guest is on the party list.
+
+        Guest names are stored lowercase (see `Guest.validate_name`), so this
+        is an exact lookup on the `_name_party_uc` index.
+        """
+        return db.session.query(
+            Guest.query.filter(Guest.party_id == self.id,
+                               Guest.name == guest_name.lower()).exists()
+        ).scalar()
 
     @property
     def male_guests(self):
         """Get the male guests"""
-        return [guest for guest in self.guests if guest.is_male]
+        return Guest.for_party(self.id, is_male=True).all()
 
     @property
     def female_guests(self):
         """Get the female guests"""
-        return [guest for guest in self.guests if not guest.is_male]
+        return Guest.for_party(self.id, is_male=False).all()
 
     def start(self):
         """Let's get it started"""
@@ -92,9 +195,16 @@ class Party(SurrogatePK, Model):
         self.save()
 
     def end(self):
-        """Ok, that's enough PARTY'S OVER."""
+        """Ok, that's enough PARTY'S OVER.
+
+        The guests can't change any more, so the party's report is worked out
+        now and stored (see `PartyReport`), in the same commit.
+        """
+        # the report module imports this one
+        from .report import summarize
         assert self.started, locales.Error.PARTY_END_BEFORE_START
         self.ended = True
+        summarize(self)
         self.save()
 
 
@@ -108,12 +218,29 @@ class Guest(SurrogatePK, Model):
     host = relationship('User')
     party_id = reference_col('parties', nullable=False)
     party = relationship('Party')
-    is_at_party = Column(db.Boolean(), default=False, nullable=False)
+    # the value before a change is always loaded, so the party's occupancy
+    # counters can tell whether the guest came or went (see
+    # `_entered_or_left`)
+    is_at_party = column_property(Column(db.Boolean(), default=False,
+                                         nullable=False),
+                                  active_history=True)
     is_male = Column(db.Boolean(), nullable=False)
     entered_party_at = Column(db.DateTime)
     left_party_at = Column(db.DateTime)
+    #: The party's guests_version when this guest last changed
+    version = Column(db.Integer(), nullable=False, default=0,
+                     server_default='0')
     __table_args__ = (db.UniqueConstraint('name', 'party_id',
-                                          name='_name_party_uc'),)
+                                          name='_name_party_uc'),
+                      db.Index('ix_guests_party_id_is_male',
+                               'party_id', 'is_male'),
+                      db.Index('ix_guests_party_id_version',
+                               'party_id', 'version'),
+                      # pattern ops, so LIKE 'prefix%' can use the index
+                      # whatever the database's collation is
+                      db.Index('ix_guests_party_id_name_pattern',
+                               'party_id', 'name',
+                               postgresql_ops={'name': 'varchar_pattern_ops'}))
 
     def __repr__(self):
         """Represent instance as a unique string."""
@@ -129,6 +256,48 @@ class Guest(SurrogatePK, Model):
                                   status_code=422)
         return field.lower()
 
+    @classmethod
+    def for_party(cls, party_id, is_male=None):
+        """Query the guests of a party, along with their hosts.
+
+        The hosts are joined in to the same SELECT, since serializing a guest
+        (see `json_dict`) needs the host's name and lazily loading them would
+        cost another query per host.
+
+        :param party_id: int -- the ID of the party
+        :param is_male: bool (default: None) -- only get the male (True) or
+            female (False) guests. By default, all guests are returned.
+        """
+        query = cls.query.options(joinedload(cls.host))\
+            .filter(cls.party_id == party_id)
+        if is_male is not None:
+            query = query.filter(cls.is_male == is_male)
+        return query.order_by(cls.id)
+
+    @classmethod
+    def search(cls, party_id, prefix, is_male=None):
+        """Query the guests of a party whose name starts with a prefix,
+        ignoring case, ordered by name.
+
+        :param party_id: int -- the ID of the party
+        :param prefix: str -- the start of the guest's name
+        :param is_male: bool (default: None) -- only search the male (True) or
+            female (False) guests
+        """
+        pattern = prefix.lower().replace('\\', '\\\\')\
+            .replace('%', '\\%').replace('_', '\\_')
+        return cls.for_party(party_id, is_male)\
+            .filter(cls.name.like(pattern + '%', escape='\\'))\
+            .order_by(None).order_by(cls.name)
+
+    @classmethod
+    def changed_between(cls, party_id, since, until, is_male=None):
+        """Query the guests of a party that were added or changed after the
+        guest list was at version `since`, up to and including version
+        `until`."""
+        return cls.for_party(party_id, is_male)\
+            .filter(cls.version > since, cls.version <= until)
+
     @property
     def json_dict(self):
         """Returns the guest as a JSON serializable python dict."""
@@ -137,16 +306,232 @@ class Guest(SurrogatePK, Model):
                 'id': self.id, 'left_at': self.left_party_at,
                 'entered_at': self.entered_party_at}
 
-    def leave_party(self):
-        """The logic for a guest leaving the party."""
+    def _was_at_party(self):
+        """Whether the guest was at the party when they were last saved."""
+        history = inspect(self).attrs.is_at_party.load_history()
+        if history.deleted:
+            return bool(history.deleted[0])
+        if history.unchanged:
+            return bool(history.unchanged[0])
+        # a new guest
+        return False
+
+    def _entered_or_left(self):
+        """1 if saving the guest checks them in, -1 if it checks them out and
+        0 if it does neither."""
+        return int(bool(self.is_at_party)) - int(self._was_at_party())
+
+    @staticmethod
+    def _occupancy_changes(changes):
+        """Split (is_male, change) pairs in to the keyword arguments of
+        `Party.bump_guests_version`."""
+        males = females = 0
+        for is_male, change in changes:
+            if is_male:
+                males += change
+            else:
+                females += change
+        return {'males_entered': males, 'females_entered': females}
+
+    def save(self, commit=True):
+        """Save the guest, and mark the party's guest list (and how many
+        guests are at the party) as changed."""
+        party_id = self._party_id
+        if party_id is not None:
+            self.version = Party.bump_guests_version(
+                party_id, **self._occupancy_changes(
+                    [(self.is_male, self._entered_or_left())]))
+        super(Guest, self).save(commit=commit)
+        if commit and party_id is not None:
+            events.guest_events.publish(party_id)
+        return self
+
+    def delete(self, commit=True):
+        """Remove the guest, mark the party's guest list as changed and leave
+        a tombstone behind for clients that sync the list."""
+        party_id = self._party_id
+        if party_id is not None:
+            db.session.add(DeletedGuest(
+                guest_id=self.id, party_id=party_id,
+                version=Party.bump_guests_version(
+                    party_id, **self._occupancy_changes(
+                        [(self.is_male, -int(self._was_at_party()))]))))
+        result = super(Guest, self).delete(commit=commit)
+        if commit and party_id is not None:
+            events.guest_events.publish(party_id)
+        return result
+
+    @property
+    def _party_id(self):
+        """The ID of the guest's party, even before the guest is flushed."""
+        if self.party_id is None and self.party is not None:
+            return self.party.id
+        return self.party_id
+
+    @classmethod
+    def count_by_gender(cls, party_id, host_id):
+        """Count the guests a host added to a party, in one grouped query.
+
+        :return dict: the number of male (True) and female (False) guests
+        """
+        counts = {True: 0, False: 0}
+        counts.update(db.session.query(cls.is_male, db.func.count(cls.id))
+                      .filter(cls.party_id == party_id,
+                              cls.host_id == host_id)
+                      .group_by(cls.is_male))
+        return counts
+
+    @classmethod
+    def names_on_list(cls, party_id, names):
+        """Get which of the (lowercase) names are already on a party's list.
+
+        :return set: the names that are taken
+        """
+        if not names:
+            return set()
+        return {row.name for row in
+                db.session.query(cls.name)
+                .filter(cls.party_id == party_id, cls.name.in_(names))}
+
+    @classmethod
+    def insert_many(cls, party_id, host_id, guests):
+        """Add guests to a party with a single multi-row INSERT and commit.
+
+        This skips the ORM, so the guests' names must already be validated
+        and lowercased (see `validate_name`).
+
+        :param party_id: int -- the ID of the party
+        :param host_id: int -- the ID of the user adding the guests
+        :param guests: list(tuple(str, bool)) -- the name and is_male of each
+            guest
+        :return list(int): the IDs of the new guests, in order
+        """
+        if not guests:
+            return []
+        version = Party.bump_guests_version(party_id)
+        rows = [{'name': name, 'is_male': is_male, 'host_id': host_id,
+                 'party_id': party_id, 'is_at_party': False,
+                 'version': version}
+                for name, is_male in guests]
+        result = db.session.execute(cls.__table__.insert().values(rows)
+                                    .returning(cls.__table__.c.id))
+        ids = [row.id for row in result]
+        db.session.commit()
+        events.guest_events.publish(party_id)
+        return ids
+
+    @classmethod
+    def save_all(cls, party_id, guests):
+        """Save guests of one party in a single commit, marking the party's
+        guest list as changed just once for all of them.
+
+        :param party_id: int -- the ID of the guests' party
+        :param guests: list(Guest) -- the guests to save
+        """
+        if not guests:
+            return
+        version = Party.bump_guests_version(
+            party_id, **cls._occupancy_changes(
+                (guest.is_male, guest._entered_or_left()) for guest in guests))
+        for guest in guests:
+            guest.version = version
+        db.session.add_all(guests)
+        db.session.commit()
+        events.guest_events.publish(party_id)
+
+    def leave_party(self, save=True):
+        """The logic for a guest leaving the party.
+
+        :param save: bool (default: True) -- save the guest right away. Pass
+            False to save it later along with other guests (see `save_all`).
+        """
         self.is_at_party = False
         if self.left_party_at is None:
             self.left_party_at = dt.utcnow()
-        self.save()
+        if save:
+            self.save()
 
-    def enter_party(self):
-        """The logic for a guest entering a party."""
+    def enter_party(self, save=True):
+        """The logic for a guest entering a party.
+
+        :param save: bool (default: True) -- save the guest right away. Pass
+            False to save it later along with other guests (see `save_all`).
+        """
         self.is_at_party = True
         if self.entered_party_at is None:
             self.entered_party_at = dt.utcnow()
-        self.save()
+        if save:
+            self.save()
+
+
+class DeletedGuest(SurrogatePK, Model):
+    """A tombstone for a guest who was deleted from a party's list, so that
+    clients syncing the list know to drop them."""
+
+    __tablename__ = 'deleted_guests'
+
+    guest_id = Column(db.Integer(), nullable=False)
+    party_id = reference_col('parties', nullable=False)
+    #: The party's guests_version when the guest was deleted
+    version = Column(db.Integer(), nullable=False)
+    __table_args__ = (db.Index('ix_deleted_guests_party_id_version',
+                               'party_id', 'version'),)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<DeletedGuest({guest_id})>'.format(guest_id=self.guest_id)
+
+    @classmethod
+    def ids_between(cls, party_id, since, until):
+        """Get the IDs of the guests of a party that were deleted after the
+        guest list was at version `since`, up to and including version
+        `until`."""
+        return [row.guest_id for row in
+                db.session.query(cls.guest_id)
+                .filter(cls.party_id == party_id,
+                        cls.version > since, cls.version <= until)]
+
+
+class PartyReport(SurrogatePK, Model):
+    """The report of a party that ended, stored so it doesn't have to be
+    worked out from the guests again (see `ifc.party.report.summarize`)."""
+
+    __tablename__ = 'party_reports'
+
+    party_id = reference_col('parties', nullable=False)
+    total_guests = Column(db.Integer(), nullable=False)
+    guys_who_showed = Column(db.Integer(), nullable=False)
+    girls_who_showed = Column(db.Integer(), nullable=False)
+    guys_who_didnt_show = Column(db.Integer(), nullable=False)
+    girls_who_didnt_show = Column(db.Integer(), nullable=False)
+    #: The most guests at the party at once (in any population bucket)
+    peak_population = Column(db.Integer(), nullable=False)
+    #: Every figure of the report, as in `Report.data`
+    data = Column(JSON(), nullable=False)
+    created_at = Column(db.DateTime, nullable=False, default=dt.utcnow)
+    __table_args__ = (db.UniqueConstraint('party_id',
+                                          name='_party_report_party_uc'),)
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<PartyReport({party_id})>'.format(party_id=self.party_id)
+
+
+class PartyHostReport(SurrogatePK, Model):
+    """How many guests a host put on the list of a party that ended, and how
+    many of them showed up."""
+
+    __tablename__ = 'party_host_reports'
+
+    party_id = reference_col('parties', nullable=False)
+    host_id = reference_col('users', nullable=False)
+    listed = Column(db.Integer(), nullable=False)
+    showed = Column(db.Integer(), nullable=False)
+    __table_args__ = (db.UniqueConstraint('party_id', 'host_id',
+                                          name='_party_host_report_uc'),
+                      db.Index('ix_party_host_reports_host_id', 'host_id'))
+
+    def __repr__(self):
+        """Represent instance as a unique string."""
+        return '<PartyHostReport({party_id}, {host_id})>'.format(
+            party_id=self.party_id, host_id=self.host_id)
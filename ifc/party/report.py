@@ -2,20 +2,277 @@
 """Report logic class."""
 import collections
 import datetime
+import functools
 
 from cached_property import cached_property
-
-from .models import Party
+from flask import current_app, json
+from sqlalchemy import func, literal_column
+
+from .models import Party, Guest, PartyReport, PartyHostReport
+from ifc.database import db
+from ifc.extensions import cache
+
+MINUTE_BUCKET_INTERVAL = 10
+#: The bucket widths a report can be asked for, in minutes. Buckets start on
+#: the hour, so the width has to divide an hour evenly.
+MINUTE_BUCKET_INTERVALS = (1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30, 60)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def round_down_to_interval(dt, minute_bucket_interval):
+    """Given some datetime object, round it down (in minutes) to the nearest
+    multiple of minute_bucket_interval."""
+    return dt - datetime.timedelta(
+        minutes=dt.minute % minute_bucket_interval,
+        seconds=dt.second,
+        microseconds=dt.microsecond)
+
+
+def _micros(delta):
+    """Convert a timedelta to an integer number of microseconds."""
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def sweep_populations(spans, first_bucket, last_bucket,
+                      minute_bucket_interval):
+    """Count how many guests were at the party during each time bucket.
+
+    A guest is counted in a bucket if they entered some time before the end
+    of the bucket and left some time after its start (or never left). Rather
+    than checking every guest against every bucket, each guest marks the
+    first bucket they show up in and the first bucket they're gone for in a
+    difference array, and a running sum over it gives the populations.
+
+    :param spans: Counter -- maps (entered_at, left_at) tuples to the number
+        of guests who were there for that span; left_at may be None
+    :param first_bucket: datetime -- the start of the first bucket
+    :param last_bucket: datetime -- the start of the last bucket
+    :param minute_bucket_interval: int -- the width of a bucket in minutes
+    :return [int]: the population of each bucket, in order
+    """
+    width = minute_bucket_interval * 60 * 10**6
+    num_buckets = _micros(last_bucket - first_bucket) // width + 1
+    if num_buckets <= 0:
+        return []
+
+    deltas = [0] * (num_buckets + 1)
+    for (entered_at, left_at), count in spans.items():
+        # first bucket whose end is at or after the time they entered
+        start = max(-(-_micros(entered_at - first_bucket) // width) - 1, 0)
+        if left_at is None:
+            end = num_buckets
+        else:
+            # first bucket whose start is at or after the time they left
+            end = min(-(-_micros(left_at - first_bucket) // width),
+                      num_buckets)
+        if start < end:
+            deltas[start] += count
+            deltas[end] -= count
+
+    populations = []
+    running = 0
+    for delta in deltas[:num_buckets]:
+        running += delta
+        populations.append(running)
+    return populations
+
+
+def _sql_bucket_start(column, minute_bucket_interval):
+    """Round a timestamp column down to the start of its bucket in SQL, the
+    same way `round_down_to_interval` does in python.
+
+    Everything is rendered as a literal rather than a bound parameter so that
+    the expression can be selected and grouped by at the same time.
+    """
+    interval = int(minute_bucket_interval)
+    return (func.date_trunc(literal_column("'hour'"), column) +
+            func.floor(func.date_part(literal_column("'minute'"), column) /
+                       literal_column(str(interval))) *
+            literal_column("interval '{} minutes'".format(interval)))
+
+
+class GuestStats(object):
+    """Everything the report needs to know about a party's guests, collected
+    in a single pass over them (or aggregated by the database, see
+    `GuestStats.from_database`).
+
+    Counts that depend on gender are kept in dicts keyed by `is_male`.
+    """
+
+    def __init__(self, guests=()):
+        self.total = 0
+        self.showed = {True: 0, False: 0}
+        self.didnt_show = {True: 0, False: 0}
+        self.spans = {True: collections.Counter(),
+                      False: collections.Counter()}
+        self.first_entered = {True: None, False: None}
+        self.last_left = {True: None, False: None}
+        self.host_names = {}
+        self.host_listed = collections.Counter()
+        self.host_showed = collections.Counter()
+        for guest in guests:
+            self.add(guest)
+
+    @classmethod
+    def from_database(cls, party_id,
+                      minute_bucket_interval=MINUTE_BUCKET_INTERVAL):
+        """Collect the stats for a party with GROUP BY queries, instead of
+        loading every guest (and their host) in to the session.
+
+        Entry and exit times are bucketed in the database, so the spans are
+        only accurate to the bucket (which is all the population series needs
+        them for). Each span is stored as the first microsecond of the bucket
+        that the time a microsecond earlier falls in, which lands it in the
+        same buckets that the exact time would: a guest who arrives right on a
+        bucket's boundary is counted in the bucket before it, too.
+        """
+        # ifc.user.models imports the party package, so this can't go at the
+        # top of the module
+        from ifc.user.models import User
+
+        stats = cls()
+        showed = Guest.entered_party_at.isnot(None)
+
+        counts = db.session.query(
+            Guest.is_male, Guest.host_id, showed, func.count(Guest.id))\
+            .filter(Guest.party_id == party_id)\
+            .group_by(Guest.is_male, Guest.host_id, showed)\
+            .all()
+        host_ids = set(row[1] for row in counts)
+        if host_ids:
+            stats.host_names = dict(
+                (host.id, host.full_name)
+                for host in User.query.filter(User.id.in_(host_ids)))
+        for is_male, host_id, did_show, count in counts:
+            stats.count_guests(is_male, host_id, did_show, count)
+
+        microsecond = literal_column("interval '1 microsecond'")
+        entered_bucket = _sql_bucket_start(
+            Guest.entered_party_at - microsecond, minute_bucket_interval)
+        left_bucket = _sql_bucket_start(
+            Guest.left_party_at - microsecond, minute_bucket_interval)
+        spans = db.session.query(
+            Guest.is_male, entered_bucket, left_bucket, func.count(Guest.id),
+            func.min(Guest.entered_party_at), func.max(Guest.left_party_at))\
+            .filter(Guest.party_id == party_id)\
+            .filter(Guest.entered_party_at.isnot(None) |
+                    Guest.left_party_at.isnot(None))\
+            .group_by(Guest.is_male, entered_bucket, left_bucket)\
+            .all()
+        for is_male, entered, left, count, first_entered, last_left in spans:
+            stats.add_span(is_male,
+                           entered and entered + ONE_MICROSECOND,
+                           left and left + ONE_MICROSECOND,
+                           count)
+            stats.note_times(is_male, first_entered, last_left)
+        return stats
+
+    def add(self, guest):
+        """Fold a single guest in to the stats."""
+        if guest.host_id not in self.host_names:
+            self.host_names[guest.host_id] = guest.host.full_name
+        self.count_guests(guest.is_male, guest.host_id,
+                          guest.entered_party_at is not None)
+        self.add_span(guest.is_male, guest.entered_party_at,
+                      guest.left_party_at)
+        self.note_times(guest.is_male, guest.entered_party_at,
+                        guest.left_party_at)
+
+    def count_guests(self, is_male, host_id, showed, count=1):
+        """Count guests of the same gender and host who either all showed up
+        or all didn't."""
+        is_male = bool(is_male)
+        self.total += count
+        self.host_listed[host_id] += count
+        if showed:
+            self.showed[is_male] += count
+            self.host_showed[host_id] += count
+        else:
+            self.didnt_show[is_male] += count
+
+    def add_span(self, is_male, entered_at, left_at, count=1):
+        """Record that guests were at the party from entered_at until left_at.
+        Guests who never entered aren't part of the population."""
+        if entered_at is not None:
+            self.spans[bool(is_male)][(entered_at, left_at)] += count
+
+    def note_times(self, is_male, entered_at, left_at):
+        """Keep track of the first time a guest entered and the last time a
+        guest left, which is where the population series starts and ends."""
+        is_male = bool(is_male)
+        first = self.first_entered[is_male]
+        if entered_at is not None and (first is None or entered_at < first):
+            self.first_entered[is_male] = entered_at
+        last = self.last_left[is_male]
+        if left_at is not None and (last is None or left_at > last):
+            self.last_left[is_male] = left_at
+
+    @property
+    def total_showed(self):
+        """The number of guests who checked in at some point."""
+        return self.showed[True] + self.showed[False]
+
+    @property
+    def hosts_who_had_guests_show(self):
+        """The IDs of every host with a guest who checked in, sorted by the
+        host's name (and then by ID, for brothers who share a name)."""
+        return sorted(self.host_showed,
+                      key=lambda host_id: (self.host_names[host_id], host_id))
+
+
+def _earliest(*times):
+    """The earliest of the given times, ignoring any that are None."""
+    times = [t for t in times if t is not None]
+    return min(times) if times else None
+
+
+def _latest(*times):
+    """The latest of the given times, ignoring any that are None."""
+    times = [t for t in times if t is not None]
+    return max(times) if times else None
+
+
+def _summarized(key, bucketed=False):
+    """Make a figure of a `Report` come from the party's stored summary (its
+    `PartyReport`) when it has one, and work it out otherwise.
+
+    :param key: str -- the figure's key in `Report.data`
+    :param bucketed: bool (default: False) -- whether the figure is a
+        population series, which is only stored in MINUTE_BUCKET_INTERVAL
+        buckets
+    """
+    def decorator(compute):
+        @functools.wraps(compute)
+        def figure(self):
+            if self.summary is not None and \
+                    not (bucketed and self.custom_interval):
+                return self.summary.data[key]
+            return compute(self)
+        return cached_property(figure)
+    return decorator
 
 
 class Report(object):
-    def __init__(self, party):
+    def __init__(self, party, in_database=None, use_summary=True,
+                 minute_bucket_interval=MINUTE_BUCKET_INTERVAL):
         """Create a new report from the given party.
         The report will have standard statistics that are pre-computed
         as well as more advanced figures from on-the-fly calculations.
 
+        All of the figures are derived from a single pass over the guests of
+        the party (see `GuestStats`), no matter how many of them are asked for.
+
         :param Party: party -- The party model from which a report should be
             derived
+        :param in_database: bool (default: None) -- whether the guests should
+            be aggregated by the database rather than loaded and counted in
+            python. By default this is done whenever the database is postgres,
+            since the bucketing relies on its date functions.
+        :param use_summary: bool (default: True) -- read the figures of a party
+            that ended from its stored summary (see `summarize`), if it has one
+        :param minute_bucket_interval: int (default: MINUTE_BUCKET_INTERVAL)
+            -- the width of the population buckets in minutes, one of
+            MINUTE_BUCKET_INTERVALS
 
         example usage:
             >>> from ifc.party.report import Report
@@ -27,17 +284,48 @@ class Report(object):
 
         Raises:
             TypeError -- if the supplied parameter is not of type `Party`
+            ValueError -- if minute_bucket_interval isn't one of
+                MINUTE_BUCKET_INTERVALS
         """
         if not isinstance(party, Party):
             raise TypeError("The 'party' parameter must be of type Party")
+        if minute_bucket_interval not in MINUTE_BUCKET_INTERVALS:
+            raise ValueError('minute_bucket_interval must be one of {}'
+                             .format(MINUTE_BUCKET_INTERVALS))
         self.party = party
+        if in_database is None:
+            in_database = db.engine.dialect.name == 'postgresql'
+        self.in_database = in_database
+        self.use_summary = use_summary
+        self.minute_bucket_interval = minute_bucket_interval
+
+    @property
+    def custom_interval(self):
+        """Whether the population is bucketed differently than in the stored
+        summaries."""
+        return self.minute_bucket_interval != MINUTE_BUCKET_INTERVAL
+
+    @cached_property
+    def summary(self):
+        """The party's stored summary, or None if it hasn't got one (yet)."""
+        if not self.use_summary or not self.party.ended:
+            return None
+        return PartyReport.query.filter_by(party_id=self.party.id).first()
 
     @cached_property
+    def stats(self):
+        """The aggregated guest stats that every other figure is read from."""
+        if self.in_database:
+            return GuestStats.from_database(self.party.id,
+                                            self.minute_bucket_interval)
+        return GuestStats(self.party.guests)
+
+    @_summarized('total_guests')
     def total_guests(self):
         """Return a simple count of the guests."""
-        return len(self.party.guests)
+        return self.stats.total
 
-    @cached_property
+    @_summarized('attendance')
     def attendance(self):
         """Return the attendance of the party as a percentage of the number of
         guests who showed up to the party.
@@ -60,111 +348,63 @@ class Report(object):
 
             (guests who were checked in) / (total guests)
         """
-        guests = self.party.guests
-
-        if not guests:
+        if not self.stats.total:
             return 0.0
 
-        rate = (float(len([g
-                           for g in guests
-                           if g.entered_party_at is not None])) /
-                float(len(guests)))
-        return rate
+        return float(self.stats.total_showed) / float(self.stats.total)
 
-    @cached_property
-    def gendered_population_buckets(self):
-        minute_bucket_interval = 10
-        guests = self.party.guests
+    def _population_series(self, spans, first_entered, last_left):
+        """Bucket the population of the given (entered_at, left_at) spans,
+        starting at the bucket of the first entry and ending at the bucket of
+        the last exit."""
+        minute_bucket_interval = self.minute_bucket_interval
 
-        # if there are no guests, just return
-        if not guests:
+        if first_entered is None or last_left is None:
             return []
 
-        def round_down_from_interval(dt):
-            """Given some datetime object, round it down (in minutes) to the
-            nearest interval given the variable (in the scope)
-            minute_bucket_interval."""
-            return dt - datetime.timedelta(
-                minutes=dt.minute % minute_bucket_interval,
-                seconds=dt.second,
-                microseconds=dt.microsecond)
-
-        def get_population_for_bucket(dt, is_male):
-            """Given some time bucket, find the number of guests who were
-            checked in to the party at that time."""
-            in_attendance = 0
-
-            entered_before = dt + datetime.timedelta(minutes=10)
-            left_after = dt
-
-            # for each guest
-            for guest in guests:
-                # if the guest entered some point before the end of this bucket
-                if guest.entered_party_at is not None and \
-                        guest.entered_party_at <= entered_before:
-                    # if the guest left sometime after the start of this bucket
-                    # (or never left)
-                    if guest.left_party_at is None or \
-                            guest.left_party_at > left_after:
-                        # they were at the party
-                        if (is_male and guest.is_male) or \
-                                (not is_male and not guest.is_male):
-                            in_attendance += 1
-            return in_attendance
-
-        male_enter_times = sorted([g.entered_party_at
-                                   for g in guests
-                                   if g.entered_party_at is not None and
-                                   g.is_male])
-        male_left_times = sorted([g.left_party_at
-                                  for g in guests
-                                  if g.left_party_at is not None and
-                                  g.is_male])
-        female_enter_times = sorted([g.entered_party_at
-                                     for g in guests
-                                     if g.entered_party_at is not None and
-                                     not g.is_male])
-        female_left_times = sorted([g.left_party_at
-                                    for g in guests
-                                    if g.left_party_at is not None and
-                                    not g.is_male])
-
-        if (not male_enter_times or not male_left_times) and \
-                (not female_enter_times or not female_left_times):
-            return []
+        first_bucket = round_down_to_interval(first_entered,
+                                              minute_bucket_interval)
+        last_bucket = round_down_to_interval(last_left,
+                                             minute_bucket_interval)
+        populations = sweep_populations(spans, first_bucket, last_bucket,
+                                        minute_bucket_interval)
 
-        male_first_bucket = round_down_from_interval(male_enter_times[0])
-        male_last_bucket = round_down_from_interval(male_left_times[-1])
-        female_first_bucket = round_down_from_interval(female_enter_times[0])
-        female_last_bucket = round_down_from_interval(female_left_times[-1])
+        bucket_delta = datetime.timedelta(minutes=minute_bucket_interval)
+        return [{'time': (first_bucket + bucket_delta * i).isoformat() + 'Z',
+                 'population': population}
+                for i, population in enumerate(populations)]
 
-        gender_buckets = {
-            'male': [],
-            'female': [],
-        }
+    @_summarized('gender_population', bucketed=True)
+    def gendered_population_buckets(self):
+        """Returns the same data structure as `population_buckets`, split in
+        to a 'male' series and a 'female' series:
+            {
+                'male': [{'time': ..., 'population': ...}, ...],
+                'female': [{'time': ..., 'population': ...}, ...],
+            }
+
+        A gender with nobody who checked in and checked out gets an empty
+        series.
+        """
+        stats = self.stats
+        if not any(stats.first_entered[is_male] is not None and
+                   stats.last_left[is_male] is not None
+                   for is_male in (True, False)):
+            return []
 
-        bucket_delta = datetime.timedelta(minutes=minute_bucket_interval)
-        # initialize all the buckets from start to end
-        while male_first_bucket <= male_last_bucket:
-            gender_buckets['male'].append(
-                {'time': male_first_bucket.isoformat() + 'Z',
-                 'population': get_population_for_bucket(male_first_bucket, True)}
-            )
-            male_first_bucket += bucket_delta
-
-        while female_first_bucket <= female_last_bucket:
-            gender_buckets['female'].append(
-                {'time': female_first_bucket.isoformat() + 'Z',
-                 'population': get_population_for_bucket(female_first_bucket, False)}
-            )
-            female_first_bucket += bucket_delta
-
-        return gender_buckets
+        return {
+            'male': self._population_series(stats.spans[True],
+                                            stats.first_entered[True],
+                                            stats.last_left[True]),
+            'female': self._population_series(stats.spans[False],
+                                              stats.first_entered[False],
+                                              stats.last_left[False]),
+        }
 
-    @cached_property
+    @_summarized('population', bucketed=True)
     def population_buckets(self):
         """Returns a data structure of bucketed population on the granularity
-        of 10 minutes.
+        of `minute_bucket_interval` (by default 10) minutes.
 
         The data structure is an array of dicts with 2 keys: 'time' and
         'population'. The array is sorted (ascending) by the 'time' key.
@@ -179,87 +419,22 @@ class Report(object):
                 {'time': '2016-12-21T01:30:00.0000Z', 'population': 1},
             ]
         """
-        minute_bucket_interval = 10
-        guests = self.party.guests
+        stats = self.stats
+        return self._population_series(
+            stats.spans[True] + stats.spans[False],
+            _earliest(stats.first_entered[True], stats.first_entered[False]),
+            _latest(stats.last_left[True], stats.last_left[False]))
 
-        # if there are no guests, just return
-        if not guests:
-            return []
-
-        def round_down_from_interval(dt):
-            """Given some datetime object, round it down (in minutes) to the
-            nearest interval given the variable (in the scope)
-            minute_bucket_interval."""
-            return dt - datetime.timedelta(
-                minutes=dt.minute % minute_bucket_interval,
-                seconds=dt.second,
-                microseconds=dt.microsecond)
-
-        def get_population_for_bucket(dt):
-            """Given some time bucket, find the number of guests who were
-            checked in to the party at that time."""
-            in_attendance = 0
-
-            entered_before = dt + datetime.timedelta(minutes=10)
-            left_after = dt
-
-            # for each guest
-            for guest in guests:
-                # if the guest entered some point before the end of this bucket
-                if guest.entered_party_at is not None and \
-                        guest.entered_party_at <= entered_before:
-                    # if the guest left sometime after the start of this bucket
-                    # (or never left)
-                    if guest.left_party_at is None or \
-                            guest.left_party_at > left_after:
-                        # they were at the party
-                        in_attendance += 1
-            return in_attendance
-
-        enter_times = sorted([g.entered_party_at
-                              for g in guests
-                              if g.entered_party_at is not None])
-        left_times = sorted([g.left_party_at
-                             for g in guests
-                             if g.left_party_at is not None])
-
-        if not enter_times or not left_times:
-            return []
-
-        first_bucket = round_down_from_interval(enter_times[0])
-        last_bucket = round_down_from_interval(left_times[-1])
-
-        buckets = []
-
-        bucket_delta = datetime.timedelta(minutes=minute_bucket_interval)
-        # initialize all the buckets from start to end
-        while first_bucket <= last_bucket:
-            buckets.append(
-                {'time': first_bucket.isoformat() + 'Z',
-                 'population': get_population_for_bucket(first_bucket)}
-            )
-            first_bucket += bucket_delta
-
-        return buckets
-
-    @cached_property
+    @_summarized('attendance_raw')
     def attendance_raw(self):
         return {
-            'girls_who_showed': len([g for g in self.party.guests
-                                     if g.entered_party_at is not None
-                                     and not g.is_male]),
-            'guys_who_showed': len([g for g in self.party.guests
-                                    if g.entered_party_at is not None
-                                    and g.is_male]),
-            'girls_who_didnt_show': len([g for g in self.party.guests
-                                         if g.entered_party_at is None
-                                         and not g.is_male]),
-            'guys_who_didnt_show': len([g for g in self.party.guests
-                                        if g.entered_party_at is None
-                                        and g.is_male]),
+            'girls_who_showed': self.stats.showed[False],
+            'guys_who_showed': self.stats.showed[True],
+            'girls_who_didnt_show': self.stats.didnt_show[False],
+            'guys_who_didnt_show': self.stats.didnt_show[True],
         }
 
-    @cached_property
+    @_summarized('attendance_ratio')
     def attendance_ratio(self):
         """Calculate the ratio of girls who showed up to guys who showed up.
 
@@ -268,41 +443,136 @@ class Report(object):
              'men': 1.0}
             representing the ratio of men to women in attendance of the party.
         """
-        female_attended = len([g for g in self.party.female_guests
-                               if g.entered_party_at is not None])
-        male_attended = len([g for g in self.party.male_guests
-                             if g.entered_party_at is not None])
+        female_attended = self.stats.showed[False]
+        male_attended = self.stats.showed[True]
         if not male_attended:
             return {'men': 1.0, 'women': 1.0}
 
         return {'men': 1.0,
                 'women': float(female_attended)/float(male_attended)}
 
-    @cached_property
+    @_summarized('host_attendance_raw')
     def host_attendance_raw(self):
         """Calculate who got the most people to show up. Does not take in to
         account the number of people they put on the list, just the number of
         guests under their name who showed up.
 
-        :return [tuple]: a list of tuples that each have two elements: a full
-            name of a brother and the number of guests that checked in to the
-            party that were under their name. E.g. [('Ryan Baker', 201), ...]
+        :return [tuple]: a list of tuples that each have three elements: a
+            full name of a brother, the number of guests that checked in to the
+            party that were under their name and the brother's ID.
+            E.g. [('Ryan Baker', 201, 1), ...]. The list is sorted by name.
         """
-        return collections.Counter([g.host.full_name
-                                    for g in self.party.guests
-                                    if g.entered_party_at is not None]).items()
+        stats = self.stats
+        return [(stats.host_names[host_id], stats.host_showed[host_id],
+                 host_id)
+                for host_id in stats.hosts_who_had_guests_show]
 
-    @cached_property
+    @_summarized('host_attendance_normalized')
     def host_attendance_normalized(self):
         """Calculate the ratio of <guests added>:<guests attended> per host.
 
-        :return [tuple]: a list of tuples that each have two elements: a full
-            name of a brother and the ratio of guests they added to the list
-            versus guests that were checked in to the party.
+        :return [tuple]: a list of tuples that each have three elements: a
+            full name of a brother, the ratio of guests they added to the list
+            versus guests that were checked in to the party and the brother's
+            ID. The list is sorted by name.
         """
-        return [
-            (t[0],
-             float(t[1]) /
-             len(filter(lambda g: g.host.full_name == t[0], self.party.guests)))
-            for t in self.host_attendance_raw
-        ]
+        stats = self.stats
+        return [(stats.host_names[host_id],
+                 float(stats.host_showed[host_id]) /
+                 stats.host_listed[host_id],
+                 host_id)
+                for host_id in stats.hosts_who_had_guests_show]
+
+    @cached_property
+    def data(self):
+        """All of the figures, the way the report page's charts ask for
+        them."""
+        if self.summary is not None and not self.custom_interval:
+            return self.summary.data
+        return {'attendance': self.attendance,
+                'total_guests': self.total_guests,
+                'population': self.population_buckets,
+                'attendance_ratio': self.attendance_ratio,
+                'host_attendance_raw': self.host_attendance_raw,
+                'host_attendance_normalized': self.host_attendance_normalized,
+                'attendance_raw': self.attendance_raw,
+                'gender_population': self.gendered_population_buckets}
+
+
+def summarize(party):
+    """Work out the report of a party and store it, replacing any report it
+    already had, as part of the current transaction (nothing is committed).
+
+    Along with every figure, the counts that reports across parties need are
+    stored in their own columns (and a row per host), so they can be added
+    up in the database.
+
+    :param party: Party -- the party, which should have ended
+    :return PartyReport: the new summary
+    """
+    report = Report(party, use_summary=False)
+    stats = report.stats
+    PartyReport.query.filter_by(party_id=party.id).delete()
+    PartyHostReport.query.filter_by(party_id=party.id).delete()
+    summary = PartyReport(
+        party_id=party.id,
+        total_guests=stats.total,
+        guys_who_showed=stats.showed[True],
+        girls_who_showed=stats.showed[False],
+        guys_who_didnt_show=stats.didnt_show[True],
+        girls_who_didnt_show=stats.didnt_show[False],
+        peak_population=max([bucket['population']
+                             for bucket in report.population_buckets] or [0]),
+        data=report.data)
+    db.session.add(summary)
+    db.session.add_all(PartyHostReport(party_id=party.id, host_id=host_id,
+                                       listed=listed,
+                                       showed=stats.host_showed[host_id])
+                       for host_id, listed in stats.host_listed.items())
+    return summary
+
+
+def backfill_summaries(rebuild=False):
+    """Store the reports of the parties that ended without one, committing
+    after each party.
+
+    :param rebuild: bool (default: False) -- store the reports of every party
+        that ended again, even if they already have one
+    :return generator(Party): the parties, as each one is committed
+    """
+    query = Party.query.filter(Party.ended)
+    if not rebuild:
+        query = query.outerjoin(PartyReport,
+                                PartyReport.party_id == Party.id)\
+            .filter(PartyReport.id.is_(None))
+    for party in query.order_by(Party.id).all():
+        summarize(party)
+        db.session.commit()
+        yield party
+
+
+def report_json(party, minute_bucket_interval=MINUTE_BUCKET_INTERVAL):
+    """Get the report data of a party as JSON, from `cache` if it's there.
+
+    The report only depends on the guests (and the width of its buckets), so
+    it's cached under the party's guests_version, and a change to the guest
+    list moves on to a new key. Once a party ends its guests can't change, so
+    its report is kept for good; until then it expires after
+    REPORT_CACHE_TIMEOUT seconds, which clears out the reports of older
+    versions.
+
+    :param party: Party -- the party, with a current guests_version
+    :param minute_bucket_interval: int (default: MINUTE_BUCKET_INTERVAL) --
+        the width of the population buckets in minutes
+    :return str: the JSON of `Report.data`
+    """
+    key = 'party-report/{}/{}/{}'.format(party.id, party.guests_version,
+                                         minute_bucket_interval)
+    data = cache.get(key)
+    if data is None:
+        data = json.dumps(Report(
+            party, minute_bucket_interval=minute_bucket_interval).data)
+        timeout = 0 if party.ended \
+            else current_app.config['REPORT_CACHE_TIMEOUT']
+        cache.set(key, data, timeout=timeout)
+    return data
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Fuzzy guest name search."""
+import collections
+import heapq
+import re
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+#: How similar a name must be to the query to be a match, like pg_trgm's
+#: default similarity threshold
+SIMILARITY_THRESHOLD = 0.3
+
+
+def trigrams(text):
+    """Split text in to the set of its trigrams, the same way as pg_trgm.
+
+    Each word is lowercased and padded with two spaces in front and one
+    behind, so that the start of a word counts for more than its end.
+
+    >>> sorted(trigrams('Jon'))
+    [u'  j', u' jo', u'jon', u'on ']
+    """
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        word = u'  {} '.format(word)
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+class TrigramIndex(object):
+    """An in-memory trigram index of the guests of one party.
+
+    Each trigram maps to the guests whose names have it, so a search only
+    looks at the guests that share at least one trigram with the query.
+    Guests are scored by the trigrams their name shares with the query out of
+    all of the trigrams in either (pg_trgm's `similarity`).
+    """
+
+    def __init__(self, guests):
+        """Index guests.
+
+        :param guests: iterable(tuple(int, str, bool)) -- the ID, name and
+            is_male of each guest
+        """
+        self.ids = []
+        self.is_male = []
+        self.sizes = []
+        self.postings = collections.defaultdict(list)
+        for position, (guest_id, name, is_male) in enumerate(guests):
+            grams = trigrams(name)
+            self.ids.append(guest_id)
+            self.is_male.append(is_male)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, limit=10, is_male=None,
+               threshold=SIMILARITY_THRESHOLD):
+        """Find the guests whose names are most similar to the query.
+
+        :param query: str -- the name to look for
+        :param limit: int (default: 10) -- the most guests to return
+        :param is_male: bool (default: None) -- only look for male (True) or
+            female (False) guests
+        :param threshold: float -- the lowest score to return
+        :return list(tuple(int, float)): the guest IDs and their scores, best
+            match first
+        """
+        grams = trigrams(query)
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scores = []
+        for position, count in shared.items():
+            if is_male is not None and self.is_male[position] != is_male:
+                continue
+            score = float(count) / (len(grams) + self.sizes[position] - count)
+            if score >= threshold:
+                scores.append((score, -self.ids[position]))
+        return [(-neg_id, best) for best, neg_id in
+                heapq.nlargest(limit, scores)]
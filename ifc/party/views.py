@@ -1,16 +1,22 @@
 # -*- coding: utf-8 -*-
 """Party views."""
+import time
 from functools import partial
 
 from flask import Blueprint, render_template, request, flash, redirect, \
-    url_for, jsonify, g
+    url_for, jsonify, g, current_app, json, Response, stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
 
 from . import forms
-from .models import Party, Guest
-from .report import Report
+from .cache import guest_cache
+from .events import guest_events, guest_streams
+from .models import Party, Guest, DeletedGuest
+from .report import report_json, MINUTE_BUCKET_INTERVAL, \
+    MINUTE_BUCKET_INTERVALS
 from ifc import locales
+from ifc.compat import basestring
+from ifc.database import db
 from ifc.utils import flash_errors, InvalidAPIUsage, permission_required
 
 blueprint = Blueprint('parties', __name__, url_prefix='/parties',
@@ -68,15 +74,25 @@ def show_report(party_id):
 @blueprint.route('/<int:party_id>/report/data', methods=['GET'])
 @permission_required('can_view_party_by_id', apply_req_args=True)
 def report_data(party_id):
-    report = Report(g.party)
-    return jsonify(attendance=report.attendance,
-                   total_guests=report.total_guests,
-                   population=report.population_buckets,
-                   attendance_ratio=report.attendance_ratio,
-                   host_attendance_raw=report.host_attendance_raw,
-                   host_attendance_normalized=report.host_attendance_normalized,
-                   attendance_raw=report.attendance_raw,
-                   gender_population=report.gendered_population_buckets)
+    interval = request.args.get('interval', str(MINUTE_BUCKET_INTERVAL))
+    # not `type=int`, which would quietly fall back to the default
+    interval = int(interval) if interval.lstrip('-').isdigit() else None
+    if interval not in MINUTE_BUCKET_INTERVALS:
+        raise InvalidAPIUsage(payload={'error':
+                                       locales.Error.INVALID_INTERVAL})
+    return current_app.response_class(report_json(g.party, interval),
+                                      mimetype='application/json')
+
+
+@blueprint.route('/<int:party_id>/occupancy', methods=['GET'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_SEE_GUESTS}))
+def occupancy(party_id):
+    """How many guests are at the party right now, without loading any of
+    them, for door tablets to poll."""
+    return jsonify(g.party.occupancy)
 
 
 @blueprint.route('/<int:party_id>/start', methods=['POST'])
@@ -103,21 +119,207 @@ def delete_party(party_id):
     return redirect(url_for('parties.parties'))
 
 
+def is_male_arg():
+    """The `is_male` query string argument, or None if it wasn't given."""
+    if 'is_male' in request.args:
+        return request.args.get('is_male', 'true').lower() == 'true'
+    return None
+
+
+def guest_list_changes(party_id, since, cursor, is_male=None):
+    """The changes to a party's guest list after version `since`, up to and
+    including version `cursor`. If `since` is None, every guest is included.
+
+    :return dict: the changed guests, the IDs of deleted guests and the
+        cursor that the next changes should be asked for with
+    """
+    if since is None:
+        guests = Guest.for_party(party_id, is_male)
+        deleted = []
+    else:
+        guests = Guest.changed_between(party_id, since, cursor, is_male)
+        deleted = DeletedGuest.ids_between(party_id, since, cursor)
+    return {'cursor': cursor, 'guests': [gu.json_dict for gu in guests],
+            'deleted': deleted}
+
+
+def guest_list_response(party, is_male=None):
+    """Respond with the guests of the party, or with 304 Not Modified if the
+    client already has the current version of the list.
+
+    The ETag is derived from the party's guests_version, so the guests only
+    need to be looked up when the list actually changed, and then they come
+    from `guest_cache` while the party is going on. Otherwise only the guests
+    asked for are loaded, since the cache wouldn't keep the whole list.
+
+    :param party: Party -- the party whose guests should be listed
+    :param is_male: bool (default: None) -- see `Guest.for_party`
+    """
+    etag = '{}-{}-{}'.format(party.id, party.guests_version,
+                             {None: 'all', True: 'males',
+                              False: 'females'}[is_male])
+    if request.if_none_match.contains(etag):
+        res = current_app.response_class(status=304)
+    else:
+        if guest_cache.keeps(party):
+            guests = guest_cache.get(party).filter(is_male)
+        else:
+            guests = Guest.for_party(party.id, is_male)
+        res = jsonify(guests=[gu.json_dict for gu in guests])
+    res.set_etag(etag)
+    res.cache_control.no_cache = True
+    return res
+
+
 @blueprint.route('/<int:party_id>/guests', methods=['GET'])
 @permission_required('can_view_party_by_id', apply_req_args=True,
                      fail_exc=partial(InvalidAPIUsage, status_code=403,
                                       payload={'error':
                                                locales.Error.CANT_SEE_GUESTS}))
 def get_guest_list(party_id):
-    if 'is_male' in request.args:
-        is_male = request.args.get('is_male', 'true').lower()
-        if is_male == 'true':
-            guests = g.party.male_guests
-        else:
-            guests = g.party.female_guests
-    else:
-        guests = g.party.guests
-    return jsonify(guests=[gu.json_dict for gu in guests])
+    return guest_list_response(g.party, is_male_arg())
+
+
+@blueprint.route('/<int:party_id>/guests/changes', methods=['GET'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_SEE_GUESTS}))
+def get_guest_list_changes(party_id):
+    """The guests that were added or changed and the IDs of the guests that
+    were deleted since the `since` cursor. Without a cursor, every guest is
+    sent. Either way, the response has the cursor to ask with next time.
+
+    The cursor is the party's guests_version. It's read (when the party is
+    loaded) before the guests are, so a change that commits in between is
+    left for the next request instead of being skipped.
+    """
+    return jsonify(**guest_list_changes(party_id,
+                                        request.args.get('since', None, int),
+                                        g.party.guests_version,
+                                        is_male_arg()))
+
+
+@blueprint.route('/<int:party_id>/guests/stream', methods=['GET'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_SEE_GUESTS}))
+def stream_guest_list_changes(party_id):
+    """Push the changes to the guest list, of both genders, as Server-Sent
+    Events.
+
+    Each `changes` event has the same data as /guests/changes, and its ID is
+    the cursor, so a reconnecting EventSource picks up where it left off (via
+    the Last-Event-ID header). Otherwise it starts from the `since` cursor, or
+    with the whole list if there isn't one.
+
+    The stream waits for `guest_events` to say the list changed, and checks
+    anyway every GUEST_STREAM_KEEPALIVE seconds, since changes made by other
+    processes aren't announced. It ends after GUEST_STREAM_TIMEOUT seconds so
+    that a worker thread isn't held forever; the client just reconnects.
+
+    A stream holds a worker thread the whole time, so once GUEST_STREAM_MAX
+    streams are open in this process, the rest get a 503 and poll
+    /guests/changes instead.
+    """
+    since = request.headers.get('Last-Event-ID', None, int)
+    if since is None:
+        since = request.args.get('since', None, int)
+    keepalive = current_app.config['GUEST_STREAM_KEEPALIVE']
+    deadline = time.time() + current_app.config['GUEST_STREAM_TIMEOUT']
+
+    def stream(since):
+        subscription = guest_events.subscribe(party_id)
+        try:
+            while True:
+                cursor = db.session.query(Party.guests_version)\
+                    .filter(Party.id == party_id).scalar()
+                if cursor is None:
+                    # the party was deleted
+                    break
+                if since is None or cursor > since:
+                    changes = guest_list_changes(party_id, since, cursor)
+                    since = cursor
+                    yield 'id: {}\nevent: changes\ndata: {}\n\n'.format(
+                        cursor, json.dumps(changes))
+                else:
+                    yield ': keepalive\n\n'
+                # end the transaction so the connection goes back to the pool
+                # while we wait
+                db.session.commit()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                subscription.wait(min(keepalive, remaining))
+        finally:
+            subscription.close()
+
+    if not guest_streams.acquire(current_app.config['GUEST_STREAM_MAX']):
+        raise InvalidAPIUsage(status_code=503,
+                              payload={'error':
+                                       locales.Error.TOO_MANY_STREAMS})
+    res = Response(stream_with_context(stream(since)),
+                   mimetype='text/event-stream')
+    # the slot is given back however the response ends, even if the stream
+    # never started
+    res.call_on_close(guest_streams.release)
+    res.cache_control.no_cache = True
+    res.headers['X-Accel-Buffering'] = 'no'
+    return res
+
+
+@blueprint.route('/<int:party_id>/guests/search', methods=['GET'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_SEE_GUESTS}))
+def search_guest_list(party_id):
+    """Find the guests whose name starts with `q`, ignoring case.
+
+    Takes an optional `is_male` and a `limit`, which is capped at
+    GUEST_SEARCH_MAX_RESULTS (and is that by default).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise InvalidAPIUsage(payload={'error':
+                                       locales.Error.SEARCH_QUERY_REQUIRED})
+    max_results = current_app.config['GUEST_SEARCH_MAX_RESULTS']
+    limit = min(max(request.args.get('limit', max_results, int), 1),
+                max_results)
+    guests = Guest.search(party_id, query, is_male_arg()).limit(limit)
+    return jsonify(guests=[guest.json_dict for guest in guests])
+
+
+@blueprint.route('/<int:party_id>/guests/fuzzy-search', methods=['GET'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_SEE_GUESTS}))
+def fuzzy_search_guest_list(party_id):
+    """Find the guests whose names are most like `q`, for names that are
+    spelled differently at the door than on the list.
+
+    The guests are scored with a trigram index of the party's guest list (see
+    `ifc.party.search`), which is kept in `guest_cache` along with the list,
+    and come back best match first with their `score`. Takes an optional
+    `is_male` and a `limit`, like /guests/search.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise InvalidAPIUsage(payload={'error':
+                                       locales.Error.SEARCH_QUERY_REQUIRED})
+    max_results = current_app.config['GUEST_SEARCH_MAX_RESULTS']
+    limit = min(max(request.args.get('limit', max_results, int), 1),
+                max_results)
+    party_guests = guest_cache.get(g.party)
+    results = []
+    for guest_id, score in party_guests.name_index.search(query, limit,
+                                                          is_male_arg()):
+        result = party_guests.get(guest_id).json_dict
+        result['score'] = round(score, 3)
+        results.append(result)
+    return jsonify(guests=results)
 
 
 @blueprint.route('/<int:party_id>/guests/males', methods=['GET'])
@@ -126,7 +328,7 @@ def get_guest_list(party_id):
                                       payload={'error':
                                                locales.Error.CANT_SEE_GUESTS}))
 def get_men_guest_list(party_id):
-    return jsonify(guests=[gu.json_dict for gu in g.party.male_guests])
+    return guest_list_response(g.party, is_male=True)
 
 
 @blueprint.route('/<int:party_id>/guests/females', methods=['GET'])
@@ -135,7 +337,7 @@ def get_men_guest_list(party_id):
                                       payload={'error':
                                                locales.Error.CANT_SEE_GUESTS}))
 def get_women_guest_list(party_id):
-    return jsonify(guests=[gu.json_dict for gu in g.party.female_guests])
+    return guest_list_response(g.party, is_male=False)
 
 
 @blueprint.route('/<int:party_id>/guests/<int:guest_id>', methods=['DELETE'])
@@ -154,6 +356,20 @@ def delete_guest_from_list(party_id, guest_id):
     return res
 
 
+def capacity_error(capacity, is_male, guest_count):
+    """The error for a host who can't add another guy (or girl) to the party,
+    because they already added `guest_count` of them, or None if they can."""
+    if is_male and capacity.male_max is not None and \
+            guest_count >= capacity.male_max:
+        return 'You can only add {} guys to the party'.format(
+            capacity.male_max)
+    elif not is_male and capacity.female_max is not None and \
+            guest_count >= capacity.female_max:
+        return 'You can only add {} girls to the party'.format(
+            capacity.female_max)
+    return None
+
+
 @blueprint.route('/<int:party_id>/guests', methods=['POST'])
 @permission_required('can_view_party_by_id', apply_req_args=True,
                      fail_exc=partial(InvalidAPIUsage, status_code=403,
@@ -172,18 +388,9 @@ def add_guest(party_id):
                 host=current_user,
                 party=g.party,
                 is_male=is_male).count()
-            if is_male and capacity.male_max is not None and \
-                    guest_count >= capacity.male_max:
-                raise InvalidAPIUsage(
-                    payload={'error':
-                             'You can only add {} guys to the party'.format(
-                                 capacity.male_max)})
-            elif not is_male and capacity.female_max is not None and \
-                    guest_count >= capacity.female_max:
-                raise InvalidAPIUsage(
-                    payload={'error':
-                             'You can only add {} girls to the party'.format(
-                                 capacity.female_max)})
+            error = capacity_error(capacity, is_male, guest_count)
+            if error is not None:
+                raise InvalidAPIUsage(payload={'error': error})
         guest = Guest.create(name=request.json['name'].lower(),
                              host=current_user,
                              party=g.party,
@@ -199,6 +406,76 @@ def add_guest(party_id):
                                        locales.Error.GUEST_ALREADY_ON_LIST})
 
 
+@blueprint.route('/<int:party_id>/guests/bulk', methods=['POST'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_EDIT_GUESTS}))
+def add_guests(party_id):
+    """Add a batch of guests to the party.
+
+    The body is a list of `guests`, each with a `name` and `is_male`. Guests
+    that are already on the list (or twice in the batch) or that go over the
+    host's capacity are rejected, and the rest are added with one INSERT. The
+    response has the added guests, and the rejected names with the reason.
+    """
+    if g.party.ended:
+        raise InvalidAPIUsage(status_code=409,
+                              payload={'error':
+                                       locales.Error.PARTY_ENDED_ADD_GUEST})
+    guests = (request.get_json(silent=True) or {}).get('guests')
+    if not isinstance(guests, list):
+        raise InvalidAPIUsage(payload={'error':
+                                       locales.Error.GUEST_REQUIRED_FIELDS})
+
+    rejected = []
+    valid = []
+    for guest in guests:
+        name = guest.get('name') if isinstance(guest, dict) else None
+        is_male = guest.get('is_male') if isinstance(guest, dict) else None
+        if not isinstance(name, basestring) or not isinstance(is_male, bool):
+            rejected.append({'name': name,
+                             'error': locales.Error.GUEST_REQUIRED_FIELDS})
+        elif len(name) < 3:
+            rejected.append({'name': name,
+                             'error': locales.Error.GUEST_NAME_SHORT})
+        else:
+            valid.append((name, name.lower(), is_male))
+
+    taken = Guest.names_on_list(party_id, list({n for _, n, _ in valid}))
+    capacity = current_user.party_capacity
+    counts = Guest.count_by_gender(party_id, current_user.id) \
+        if capacity is not None else None
+    accepted = []
+    for name, lower_name, is_male in valid:
+        error = None
+        if lower_name in taken:
+            error = locales.Error.GUEST_ALREADY_ON_LIST
+        elif capacity is not None:
+            error = capacity_error(capacity, is_male, counts[is_male])
+        if error is not None:
+            rejected.append({'name': name, 'error': error})
+            continue
+        taken.add(lower_name)
+        if counts is not None:
+            counts[is_male] += 1
+        accepted.append((lower_name, is_male))
+
+    try:
+        ids = Guest.insert_many(party_id, current_user.id, accepted)
+    except IntegrityError:
+        # someone added one of the guests since we checked
+        db.session.rollback()
+        raise InvalidAPIUsage(payload={'error':
+                                       locales.Error.GUEST_ALREADY_ON_LIST})
+    added = Guest.for_party(party_id).filter(Guest.id.in_(ids)).all() \
+        if ids else []
+    res = jsonify(guests=[guest.json_dict for guest in added],
+                  rejected=rejected)
+    res.status_code = 201
+    return res
+
+
 @blueprint.route('/<int:party_id>/guests/<int:guest_id>',
                  methods=['PUT', 'PATCH'])
 @permission_required('can_view_party_by_id', apply_req_args=True,
@@ -211,10 +488,15 @@ def switch_guest_occupancy(party_id, guest_id):
                               payload={'error':
                                        locales.Error.PARTY_ENDED_CHECKIN_GUEST})
     guest = Guest.find_or_404(guest_id)
-    if guest.is_at_party:
-        guest.leave_party()
-    else:
-        guest.enter_party()
+    try:
+        if guest.is_at_party:
+            guest.leave_party()
+        else:
+            guest.enter_party()
+    except InvalidAPIUsage:
+        # the party is full, so forget about checking the guest in
+        db.session.rollback()
+        raise
     if guest.is_at_party:
         message = locales.Success.GUEST_CHECKED_IN
     else:
@@ -222,3 +504,99 @@ def switch_guest_occupancy(party_id, guest_id):
     res = jsonify(message=message)
     res.status_code = 202
     return res
+
+
+#: What each action of a batched check in/out does to a guest at the party
+GUEST_ACTIONS = {'check_in': lambda is_at_party: True,
+                 'check_out': lambda is_at_party: False,
+                 'toggle': lambda is_at_party: not is_at_party}
+
+
+@blueprint.route('/<int:party_id>/guests', methods=['PATCH'])
+@permission_required('can_view_party_by_id', apply_req_args=True,
+                     fail_exc=partial(InvalidAPIUsage, status_code=403,
+                                      payload={'error':
+                                               locales.Error.CANT_EDIT_GUESTS}))
+def switch_guest_occupancies(party_id):
+    """Check a batch of guests in or out of the party.
+
+    The body is a list of `operations`, each with a `guest_id` and an `action`
+    (check_in, check_out or toggle). The guests are loaded with one query and
+    saved with one commit, and the response has a result for every operation,
+    in order. An operation that fails (an unknown guest, say) doesn't stop the
+    others from being applied.
+
+    The check outs are applied first, so the spots they free can go to the
+    guests checking in. Then the rest are applied in order, and once the party
+    is at capacity each guest that would check in gets a 409 of their own.
+    The party is locked while this happens (see `Party.lock_spots_left`), so
+    no spot is given out twice.
+    """
+    if g.party.ended:
+        raise InvalidAPIUsage(status_code=409,
+                              payload={'error':
+                                       locales.Error.PARTY_ENDED_CHECKIN_GUEST})
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if not isinstance(operations, list) or \
+            not all(isinstance(op, dict) for op in operations):
+        raise InvalidAPIUsage(payload={'error':
+                                       locales.Error.GUEST_OPERATIONS_REQUIRED})
+
+    # the party is locked before the guests are loaded, so they can't be
+    # checked in or out by anyone else until this commits
+    spots = Party.lock_spots_left(party_id)
+    guest_ids = [op.get('guest_id') for op in operations
+                 if isinstance(op.get('guest_id'), int)]
+    guests = {}
+    if guest_ids:
+        guests = {guest.id: guest for guest in
+                  Guest.for_party(party_id).filter(Guest.id.in_(guest_ids))}
+
+    def applied(guest_id, guest):
+        # serialize the guest now, since the commit expires it and reloading
+        # each one afterwards would cost a query per guest
+        return {'guest_id': guest_id, 'status': 200,
+                'message': locales.Success.GUEST_CHECKED_IN
+                if guest.is_at_party
+                else locales.Success.GUEST_CHECKED_OUT,
+                'guest': guest.json_dict}
+
+    results = [None] * len(operations)
+    changed = {}
+    rest = []
+    for index, op in enumerate(operations):
+        guest_id = op.get('guest_id')
+        guest = guests.get(guest_id) if guest_id in guest_ids else None
+        action = op.get('action')
+        action = GUEST_ACTIONS.get(action) \
+            if isinstance(action, basestring) else None
+        if guest is None:
+            results[index] = {'guest_id': guest_id, 'status': 404,
+                              'error': locales.Error.GUEST_NOT_ON_LIST}
+        elif action is None:
+            results[index] = {'guest_id': guest_id, 'status': 422,
+                              'error': locales.Error.UNKNOWN_GUEST_ACTION}
+        elif guest.is_at_party and not action(guest.is_at_party):
+            guest.leave_party(save=False)
+            spots += 1
+            changed[guest.id] = guest
+            results[index] = applied(guest_id, guest)
+        else:
+            rest.append((index, guest_id, guest, action))
+
+    for index, guest_id, guest, action in rest:
+        if action(guest.is_at_party) != guest.is_at_party:
+            if guest.is_at_party:
+                guest.leave_party(save=False)
+                spots += 1
+            elif spots < 1:
+                results[index] = {'guest_id': guest_id, 'status': 409,
+                                  'error': locales.Error.PARTY_FULL}
+                continue
+            else:
+                guest.enter_party(save=False)
+                spots -= 1
+            changed[guest.id] = guest
+        results[index] = applied(guest_id, guest)
+    Guest.save_all(party_id, list(changed.values()))
+    return jsonify(results=results)
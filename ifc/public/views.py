@@ -10,6 +10,7 @@ from ifc.extensions import login_manager
 from ifc.public.forms import LoginForm
 from ifc.user.forms import RegisterForm
 from ifc.user.models import User
+from ifc.party.cache import guest_cache
 from ifc.party.models import Fraternity
 from ifc.utils import flash_errors, permission_required
 
@@ -95,9 +96,11 @@ def about():
 
 @blueprint.route('/status')
 def status():
-    """App status info."""
+    """App status info, including how well this process's guest list cache
+    is doing."""
     return jsonify({
-        'version': __version__
+        'version': __version__,
+        'guest_cache': guest_cache.stats()
     })
 
 
@@ -19,6 +19,20 @@ class Config(object):
     UPLOAD_FOLDER = os.path.join(APP_DIR, 'uploads')
     WTF_CSRF_ENABLED = False  # Allows form testing
     COFFEE_BIN = './node_modules/.bin/coffee'
+    GUEST_STREAM_KEEPALIVE = 15  # Seconds between checks for guest changes
+    GUEST_STREAM_TIMEOUT = 300  # Seconds before a guest stream is closed
+    GUEST_STREAM_MAX = 4  # Most guest streams open at once in a process
+    GUEST_SEARCH_MAX_RESULTS = 50  # Most guests a guest search returns
+    GUEST_CACHE_SIZE = 16  # Most parties whose guests are kept in memory
+    LOOKUP_CACHE_TIMEOUT = 300  # Seconds to keep roles and frats in memory
+    REPORT_CACHE_TIMEOUT = 600  # Seconds to cache the report of a party
+    ANALYTICS_MAX_PER_PAGE = 100  # Most rows on a page of analytics
+    INGEST_CHUNK_SIZE = 500  # Roster rows inserted at a time
+    INGEST_PREVIEW_MAX_PER_PAGE = 500  # Most rows on a page of a preview
+    INGEST_PREVIEW_TIMEOUT = 3600  # Seconds a roster preview is kept
+    JOB_POLL_INTERVAL = 1  # Seconds a worker waits when no jobs are queued
+    JOB_TIMEOUT = 300  # Seconds without progress before a job is rerun
+    JOB_MAX_ATTEMPTS = 3  # Most times a job is run before it's failed
 
 
 class ProdConfig(Config):
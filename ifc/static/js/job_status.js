@@ -0,0 +1,34 @@
+(function() {
+  'use strict';
+
+  // follow the background job on the page, if there is one, until it's done
+  var $job = $('#job');
+  if(!$job.length)
+    return;
+
+  var $status = $('#job-status');
+  var $progress = $('#job-progress');
+
+  function showProgress(percent) {
+    $progress.css('width', percent + '%').text(percent + '%');
+  }
+
+  function poll() {
+    $.getJSON($job.data('url')).done(function(res) {
+      var job = res.job;
+      if(job.status === 'done') {
+        showProgress(100);
+        $status.text($job.data('done'));
+      } else if(job.status === 'failed') {
+        $progress.addClass('progress-bar-danger');
+        $status.text($job.data('failed') + ' (' + job.error + ')');
+      } else {
+        showProgress(job.total ? Math.floor(100 * job.progress / job.total) : 0);
+        $status.text(job.status);
+        setTimeout(poll, 1000);
+      }
+    });
+  }
+
+  poll();
+})();
@@ -12,8 +12,15 @@
       return this.is_male ? base_url + '/guests/males' : base_url + '/guests/females';
     },
 
-    parse: function(res) {
-      return res.guests;
+    mergeChanges: function(res, full) {
+      // the changes are to the whole list, so only keep the guests of our
+      // gender (and drop any whose gender was changed away from it)
+      var mine = _.groupBy(res.guests, function(guest) {
+        return guest.is_male === this.is_male;
+      }, this);
+      this.set(mine['true'] || [], { remove: full });
+      this.remove(_.pluck(mine['false'] || [], 'id'));
+      this.remove(res.deleted);
     },
 
     checkedInCount: function() {
@@ -75,6 +75,9 @@ $(function() {
     collection: femaleCollection
   });
 
+  // the watcher loads the whole list first, and then only what changed
+  var watcher = new GuestList.GuestWatcher([maleCollection, femaleCollection]);
+
   // let's only run this if the party hasn't ended
   if(!window.partyEnded) {
     var maleAddView = new GuestList.Views.AddGuestView({
@@ -89,8 +92,10 @@ $(function() {
       collection: femaleCollection
     });
 
-    // this is an anti-pattern, but don't worry about it for now
-    setInterval(maleCollection.fetch.bind(maleCollection), 5000);
-    setInterval(femaleCollection.fetch.bind(femaleCollection), 5000);
+    // one stream for the whole list, rather than one for each gender
+    watcher.watch();
+  } else {
+    // the list can't change any more, so it's only loaded once
+    watcher.fetchChanges();
   }
 });
@@ -6,7 +6,6 @@
 
     initialize: function(options) {
       this.collection = options.collection;
-      this.collection.fetch();
       this.listenTo(this.collection, 'add', this.addNew);
       this.collection.bind('change', this.updateCount.bind(this));
       this.listenTo(this.collection, 'remove', this.updateCount);
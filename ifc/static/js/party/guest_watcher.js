@@ -0,0 +1,61 @@
+(function() {
+  'use strict';
+
+  // keeps the male and female guest collections of the page up to date with
+  // a single stream of the changes to the whole list
+  GuestList.GuestWatcher = function(collections) {
+    this.collections = collections;
+    this.cursor = null;
+  };
+
+  _.extend(GuestList.GuestWatcher.prototype, {
+    fetchChanges: function() {
+      // only ask for the guests that were added, changed or deleted since the
+      // last time we asked (or for all of them, the first time)
+      var data = {};
+      if(this.cursor !== null)
+        data.since = this.cursor;
+      return $.getJSON(base_url + '/guests/changes', data).done(this.mergeChanges.bind(this));
+    },
+
+    watch: function() {
+      // have the changes pushed to us, and poll for them whenever the stream
+      // isn't open (the browser reopens it by itself after it drops, but not
+      // when the server turns it away because too many streams are open)
+      if(!window.EventSource)
+        return this.poll();
+
+      var params = {};
+      if(this.cursor !== null)
+        params.since = this.cursor;
+      this.stream = new EventSource(base_url + '/guests/stream?' + $.param(params));
+      this.stream.addEventListener('changes', function(e) {
+        this.mergeChanges(JSON.parse(e.data));
+      }.bind(this));
+      this.stream.onopen = this.stopPolling.bind(this);
+      this.stream.onerror = this.poll.bind(this);
+    },
+
+    poll: function() {
+      // don't keep the page waiting for its first poll to see any guests
+      if(this.cursor === null)
+        this.fetchChanges();
+      if(!this.pollId)
+        this.pollId = setInterval(this.fetchChanges.bind(this), 5000);
+    },
+
+    stopPolling: function() {
+      clearInterval(this.pollId);
+      this.pollId = null;
+    },
+
+    mergeChanges: function(res) {
+      // a full list replaces what we have, but changes are merged in to it
+      var full = this.cursor === null;
+      this.collections.forEach(function(collection) {
+        collection.mergeChanges(res, full);
+      });
+      this.cursor = res.cursor;
+    }
+  });
+})();
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""An in-memory cache of the roles and fraternities users register with."""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from ifc.database import db
+
+
+class LookupCache(object):
+    """Keeps rows that hardly ever change, like roles and fraternities, in
+    memory, since every user who registers looks them up.
+
+    Only the columns of a row are kept, not the instance, and each lookup
+    merges a fresh copy in to the session without a query, so the copies
+    never outlive their sessions. Rows are forgotten when they're changed
+    through the admin views (see `ifc.models.ClearsLookupCacheMixin`), and
+    after LOOKUP_CACHE_TIMEOUT seconds, so changes made by other processes
+    are picked up too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        """Get a row by its key, loading it if it isn't kept yet.
+
+        example usage:
+            >>> lookup_cache.get(('role', 'normal'),
+            ...                  Role.query.filter_by(title='normal').first)
+
+        :param key: tuple -- what the row is looked up by
+        :param load: callable -- loads the row (or None) on a miss
+        :return Model: the row, in the current session, or None if there's
+            no such row (which isn't kept)
+        """
+        now = time.time()
+        with self._lock:
+            kept = self._rows.get(key)
+            if kept is not None and kept[0] > now:
+                self.hits += 1
+                cls, columns = kept[1:]
+                return self._merge(cls, columns)
+            self.misses += 1
+
+        instance = load()
+        if instance is None:
+            return None
+        columns = dict((column.key, getattr(instance, column.key))
+                       for column in inspect(instance).mapper.column_attrs)
+        timeout = current_app.config['LOOKUP_CACHE_TIMEOUT']
+        with self._lock:
+            self._rows[key] = (now + timeout, type(instance), columns)
+        return instance
+
+    @staticmethod
+    def _merge(cls, columns):
+        """Put a copy of a kept row in to the session, as though it had just
+        been loaded."""
+        instance = inspect(cls).class_manager.new_instance()
+        for key, value in columns.items():
+            setattr(instance, key, value)
+        make_transient_to_detached(instance)
+        return db.session.merge(instance, load=False)
+
+    def clear(self):
+        """Forget every row and reset the metrics."""
+        with self._lock:
+            self._rows.clear()
+            self.hits = self.misses = 0
+
+
+lookup_cache = LookupCache()
@@ -10,7 +10,10 @@ from ifc.database import Column, Model, SurrogatePK, db, reference_col, \
     relationship
 from ifc.extensions import bcrypt
 from ifc.admin.models import Preuser
+from ifc.jobs.models import Job
 from ifc.party.models import Fraternity, Party, Guest
+from ifc.school.models import School
+from ifc.user.cache import lookup_cache
 
 
 class Role(SurrogatePK, Model):
@@ -95,18 +98,24 @@ class User(UserMixin, SurrogatePK, Model):
         return bcrypt.check_password_hash(self.password, value)
 
     def resolve_role_from_preuser(self, pre):
-        """Figures out what the role is from the preregistered-user model."""
+        """Figures out what the role is from the preregistered-user model,
+        through `lookup_cache`."""
         if pre.ifc_admin:
-            return Role.query.filter(Role.title == 'ifc_admin').first()
+            title = 'ifc_admin'
         elif pre.chapter_admin:
-            return Role.query.filter(Role.title == 'chapter_admin').first()
+            title = 'chapter_admin'
         else:
-            return Role.query.filter(Role.title == 'normal').first()
+            title = 'normal'
+        return lookup_cache.get(
+            ('role', title), Role.query.filter(Role.title == title).first)
 
     def resolve_frat_from_preuser(self, pre):
-        """Finds the fraternity from the preregistered-user model."""
-        return Fraternity.query.filter_by(title=pre.fraternity_name)\
-            .join(Fraternity.school).filter_by(title=pre.school_title).first()
+        """Finds the fraternity from the preregistered-user model, through
+        `lookup_cache`."""
+        return lookup_cache.get(
+            ('fraternity', pre.school_title, pre.fraternity_name),
+            Fraternity.query.filter_by(title=pre.fraternity_name)
+            .join(Fraternity.school).filter_by(title=pre.school_title).first)
 
     @property
     def full_name(self):
@@ -182,6 +191,32 @@ class User(UserMixin, SurrogatePK, Model):
         """True if the user can view the guest list of a party"""
         return self.is_site_admin or party.fraternity == self.fraternity
 
+    def can_view_fraternity_analytics_by_id(self, fraternity_id):
+        """True if the user can see the trends across the fraternity's
+        parties."""
+        fraternity = Fraternity.find_or_404(fraternity_id)
+        flask.g.fraternity = fraternity
+        return self.is_admin or \
+            (self.is_site_admin and
+             self.fraternity.school_id == fraternity.school_id) or \
+            (self.is_chapter_admin and self.fraternity_id == fraternity.id)
+
+    def can_view_school_analytics_by_id(self, school_id):
+        """True if the user can see the trends across the parties of every
+        fraternity at the school."""
+        school = School.find_or_404(school_id)
+        flask.g.school = school
+        return self.is_admin or \
+            (self.is_site_admin and self.fraternity.school_id == school.id)
+
+    def can_view_job_by_id(self, job_id):
+        """True if the user can follow the background job, which is one of
+        their school's."""
+        job = Job.find_or_404(job_id)
+        flask.g.job = job
+        return self.is_admin or \
+            (self.is_site_admin and self.fraternity.school_id == job.school_id)
+
     def can_edit_guest_by_id(self, guest_id, party_id=None):
         """True if the user can edit the guest."""
         guest = Guest.find_or_404(guest_id)
@@ -14,6 +14,8 @@ from flask_script.commands import Clean, ShowUrls
 import ifc.models as models
 from ifc.app import create_app
 from ifc.database import db
+from ifc.jobs.worker import work
+from ifc.party.report import backfill_summaries
 from ifc.settings import DevConfig, ProdConfig, TestConfig
 from seeds import FRATERNITIES, ROLES
 
@@ -96,6 +98,21 @@ def seed_db():
             print "Fraternity: " + frat['title'] + " already exists"
 
 
+@manager.command
+def backfill_reports(rebuild=False):
+    """Store the reports of the parties that ended before reports were
+    stored."""
+    for party in backfill_summaries(rebuild=rebuild):
+        print "Party: " + party.name + " report stored"
+
+
+@manager.option('--once', action='store_true', default=False,
+                help="Stop once there aren't any jobs queued")
+def worker(once):
+    """Run the background jobs (like roster uploads) as they're queued."""
+    work(app.config['JOB_POLL_INTERVAL'], once=once)
+
+
 @manager.command
 def setup_db():
     """Set up the local and test databases."""
@@ -6,6 +6,8 @@ from webtest import TestApp
 
 from ifc.app import create_app
 from ifc.database import db as _db
+from ifc.party.cache import guest_cache
+from ifc.user.cache import lookup_cache
 from ifc.settings import TestConfig
 
 from .factories import UserFactory, PreuserFactory, RoleFactory, FratFactory, \
@@ -42,6 +44,9 @@ def db(app):
     # Explicitly close DB connection
     _db.session.close()
     _db.drop_all()
+    # the IDs start over with the next test's tables
+    guest_cache.clear()
+    lookup_cache.clear()
 
 
 @pytest.fixture
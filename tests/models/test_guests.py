@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 """Model unit tests."""
+import threading
+
 import pytest
 from sqlalchemy.exc import IntegrityError
 
-from ifc.models import Guest
+from ifc.models import Guest, DeletedGuest
 from ifc.utils import InvalidAPIUsage
 
 
@@ -19,3 +21,148 @@ class TestGuest:
     def test_name_cannot_be_too_short(self, guest_name, user, party):
         with pytest.raises(InvalidAPIUsage):
             Guest.create(name=guest_name, host=user, party=party)
+
+    def test_changes_bump_party_version(self, db, party, user):
+        version = party.guests_version
+        guest = Guest.create(name='Foster Lee', host=user, party=party,
+                             is_male=True)
+        assert party.guests_version == version + 1
+        guest.enter_party()
+        assert party.guests_version == version + 2
+        guest.leave_party()
+        assert party.guests_version == version + 3
+        guest.delete()
+        assert party.guests_version == version + 4
+
+    def test_save_all_bumps_party_version_once(self, party, user, guest):
+        other = Guest(name='Foster Lee', host=user, party=party, is_male=True)
+        version = party.guests_version
+        guest.enter_party(save=False)
+        Guest.save_all(party.id, [guest, other])
+        assert party.guests_version == version + 1
+        assert guest.version == other.version == version + 1
+        assert Guest.query.get(other.id) is not None
+
+    def test_search_by_prefix(self, party, other_party, user):
+        for name in ['Sam Adams', 'sally ride', 'Tom Sams']:
+            Guest.create(name=name, host=user, party=party, is_male=True)
+        Guest.create(name='Sam Houston', host=user, party=other_party,
+                     is_male=True)
+        assert [gu.name for gu in Guest.search(party.id, 'SA')] == \
+            ['sally ride', 'sam adams']
+        assert [gu.name for gu in Guest.search(party.id, 'sam ')] == \
+            ['sam adams']
+        assert Guest.search(party.id, 'sa', is_male=False).all() == []
+
+    @pytest.mark.parametrize('prefix', ['%', '_am', '\\'])
+    def test_search_escapes_wildcards(self, prefix, party, user):
+        Guest.create(name='Sam Adams', host=user, party=party, is_male=True)
+        assert Guest.search(party.id, prefix).all() == []
+
+    def test_other_party_version_untouched(self, party, other_party, guest):
+        version = other_party.guests_version
+        guest.enter_party()
+        assert other_party.guests_version == version
+
+    def test_save_records_version(self, party, guest):
+        guest.enter_party()
+        assert guest.version == party.guests_version
+
+    def test_delete_leaves_tombstone(self, party, guest):
+        guest_id = guest.id
+        guest.delete()
+        assert DeletedGuest.ids_between(party.id, 0,
+                                        party.guests_version) == [guest_id]
+
+    def test_party_delete_removes_tombstones(self, party, guest):
+        guest.delete()
+        party.delete()
+        assert DeletedGuest.query.count() == 0
+
+    def test_entering_and_leaving_count_occupancy(self, db, party, user):
+        guy = Guest.create(name='Foster Lee', host=user, party=party,
+                           is_male=True)
+        girl = Guest.create(name='Ada Lovelace', host=user, party=party,
+                            is_male=False)
+        guy.enter_party()
+        girl.enter_party()
+        assert party.occupancy['male'] == 1
+        assert party.occupancy['female'] == 1
+        assert party.occupancy['total'] == 2
+        # checking in someone who's already in doesn't count them twice
+        db.session.expire_all()
+        girl.enter_party()
+        assert party.females_at_party == 1
+        guy.leave_party()
+        assert (party.males_at_party, party.females_at_party) == (0, 1)
+        girl.delete()
+        assert party.females_at_party == 0
+
+    def test_save_all_counts_occupancy(self, party, user, guest):
+        other = Guest(name='Foster Lee', host=user, party=party, is_male=True,
+                      is_at_party=True)
+        guest.enter_party(save=False)
+        Guest.save_all(party.id, [guest, other])
+        males = 1 + int(guest.is_male)
+        assert (party.males_at_party, party.females_at_party) == \
+            (males, 2 - males)
+        guest.leave_party(save=False)
+        Guest.save_all(party.id, [guest])
+        assert party.occupancy['total'] == 1
+
+    def test_occupancy_includes_capacity(self, party):
+        assert party.occupancy == {'male': 0, 'female': 0, 'total': 0,
+                                   'capacity': party.fraternity.capacity}
+
+    def test_check_in_refused_at_capacity(self, db, party, user):
+        party.fraternity.update(capacity=1)
+        guy = Guest.create(name='Foster Lee', host=user, party=party,
+                           is_male=True)
+        girl = Guest.create(name='Ada Lovelace', host=user, party=party,
+                            is_male=False)
+        guy.enter_party()
+        with pytest.raises(InvalidAPIUsage) as error:
+            girl.enter_party()
+        assert error.value.status_code == 409
+        db.session.rollback()
+        assert party.occupancy['total'] == 1
+        assert not Guest.query.get(girl.id).is_at_party
+        # once someone leaves, there's room again
+        guy.leave_party()
+        girl.enter_party()
+        assert party.occupancy['total'] == 1
+
+    def test_parallel_check_ins_stay_within_capacity(self, app, db, party,
+                                                     user):
+        party.fraternity.update(capacity=5)
+        guest_ids = [Guest.create(name='guest {}'.format(i), host=user,
+                                  party=party, is_male=i % 2 == 0).id
+                     for i in range(12)]
+        start = threading.Event()
+        refused = []
+
+        def check_in(guest_id):
+            # each thread has its own app context, so its own session and
+            # connection, like a separate worker
+            with app.app_context():
+                start.wait()
+                try:
+                    Guest.query.get(guest_id).enter_party()
+                except InvalidAPIUsage as error:
+                    db.session.rollback()
+                    refused.append(error.status_code)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=check_in, args=(guest_id,))
+                   for guest_id in guest_ids]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        db.session.expire_all()
+        assert refused == [409] * 7
+        assert Guest.query.filter_by(party_id=party.id,
+                                     is_at_party=True).count() == 5
+        assert party.occupancy['total'] == 5
@@ -7,6 +7,8 @@ import pytest
 from ifc.models import Party
 from ifc.utils import InvalidAPIUsage
 
+from tests.factories import GuestFactory
+
 
 @pytest.mark.usefixtures('db')
 class TestParty:
@@ -24,6 +26,10 @@ class TestParty:
         """Test party.is_on_guest_list with somebody who is not on the list."""
         assert not party.is_on_guest_list(other_guest.name)
 
+    def test_guest_on_list_ignores_case(self, party, guest):
+        """Test party.is_on_guest_list with a differently cased name."""
+        assert party.is_on_guest_list(guest.name.upper())
+
     def test_male_guests(self, party, other_party, guest, other_guest):
         """Test the party.male_guest property."""
         assert party.male_guests == [guest]
@@ -54,3 +60,12 @@ class TestParty:
         assert not party.ended
         party.end()
         assert party.ended
+
+    def test_gendered_guests_filtered_in_query(self, db, party, guest):
+        """Test that the gendered guest lists don't load every guest."""
+        female = GuestFactory.create(host=guest.host, party=party,
+                                     is_male=False)
+        db.session.expire(party)
+        assert party.male_guests == [guest]
+        assert party.female_guests == [female]
+        assert 'guests' not in party.__dict__
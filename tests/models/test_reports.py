@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""Report unit tests."""
+import random
+from datetime import datetime as dt, timedelta as td
+
+import pytest
+from flask import json
+
+from ifc.models import Party, PartyReport, PartyHostReport
+from ifc.party.report import Report, backfill_summaries
+
+from tests.factories import GuestFactory
+from tests.utils import assert_max_queries
+
+
+PARTY_START = dt(2016, 12, 20, 22, 3, 17)
+
+
+def naive_population_buckets(guests, interval=10):
+    """The original guest-by-bucket population count, used as a reference."""
+    enter_times = [g.entered_party_at for g in guests
+                   if g.entered_party_at is not None]
+    left_times = [g.left_party_at for g in guests
+                  if g.left_party_at is not None]
+    if not enter_times or not left_times:
+        return []
+
+    def round_down(time):
+        return time - td(minutes=time.minute % interval, seconds=time.second,
+                         microseconds=time.microsecond)
+
+    bucket = round_down(min(enter_times))
+    last_bucket = round_down(max(left_times))
+    buckets = []
+    while bucket <= last_bucket:
+        bucket_end = bucket + td(minutes=interval)
+        population = len([g for g in guests
+                          if g.entered_party_at is not None and
+                          g.entered_party_at <= bucket_end and
+                          (g.left_party_at is None or
+                           g.left_party_at > bucket)])
+        buckets.append({'time': bucket.isoformat() + 'Z',
+                        'population': population})
+        bucket += td(minutes=interval)
+    return buckets
+
+
+def make_guests(user, party, count, seed=0):
+    """Create guests that arrive and leave at random times."""
+    rand = random.Random(seed)
+    guests = []
+    for i in range(count):
+        entered = left = None
+        if rand.random() < 0.8:
+            entered = PARTY_START + td(seconds=rand.randint(0, 3 * 3600))
+            if rand.random() < 0.7:
+                left = entered + td(seconds=rand.randint(0, 2 * 3600))
+        guests.append(GuestFactory.create(host=user, party=party,
+                                          is_male=rand.random() < 0.5,
+                                          entered_party_at=entered,
+                                          left_party_at=left))
+    return guests
+
+
+@pytest.mark.usefixtures('db')
+class TestReport:
+    """Report tests."""
+
+    def test_requires_party(self):
+        with pytest.raises(TypeError):
+            Report('not a party')
+
+    def test_population_buckets_no_guests(self, party):
+        assert Report(party).population_buckets == []
+
+    def test_population_buckets_nobody_left(self, user, party):
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=PARTY_START)
+        assert Report(party).population_buckets == []
+
+    def test_population_buckets_on_edges(self, user, party):
+        """Entering at the end of a bucket or leaving at its start counts."""
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=dt(2016, 12, 20, 22, 10),
+                            left_party_at=dt(2016, 12, 20, 22, 30))
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=dt(2016, 12, 20, 22, 0),
+                            left_party_at=dt(2016, 12, 20, 22, 0, 1))
+        assert Report(party).population_buckets == [
+            {'time': '2016-12-20T22:00:00Z', 'population': 2},
+            {'time': '2016-12-20T22:10:00Z', 'population': 1},
+            {'time': '2016-12-20T22:20:00Z', 'population': 1},
+            {'time': '2016-12-20T22:30:00Z', 'population': 0},
+        ]
+
+    def test_population_buckets_match_naive(self, user, party):
+        guests = make_guests(user, party, 150)
+        assert Report(party).population_buckets == \
+            naive_population_buckets(guests)
+
+    def test_gendered_population_buckets_match_naive(self, user, party):
+        guests = make_guests(user, party, 150, seed=1)
+        buckets = Report(party).gendered_population_buckets
+        assert buckets['male'] == naive_population_buckets(
+            [g for g in guests if g.is_male])
+        assert buckets['female'] == naive_population_buckets(
+            [g for g in guests if not g.is_male])
+
+    @pytest.mark.parametrize('interval', [1, 15, 60])
+    def test_population_buckets_interval(self, interval, user, party):
+        guests = make_guests(user, party, 100, seed=3)
+        report = Report(party, minute_bucket_interval=interval)
+        assert report.population_buckets == \
+            naive_population_buckets(guests, interval)
+
+    def test_unknown_interval(self, party):
+        with pytest.raises(ValueError):
+            Report(party, minute_bucket_interval=7)
+
+    def test_gendered_population_buckets_one_gender(self, user, party):
+        GuestFactory.create(host=user, party=party, is_male=True,
+                            entered_party_at=PARTY_START,
+                            left_party_at=PARTY_START + td(minutes=5))
+        buckets = Report(party).gendered_population_buckets
+        assert len(buckets['male']) == 1
+        assert buckets['female'] == []
+
+    def test_attendance_figures(self, user, party):
+        guests = make_guests(user, party, 60, seed=2)
+        showed = [g for g in guests if g.entered_party_at is not None]
+        men = len([g for g in showed if g.is_male])
+        women = len(showed) - men
+        report = Report(party)
+        assert report.total_guests == 60
+        assert report.attendance == float(len(showed)) / 60
+        assert report.attendance_raw == {
+            'guys_who_showed': men,
+            'girls_who_showed': women,
+            'guys_who_didnt_show': len([g for g in guests if g.is_male]) - men,
+            'girls_who_didnt_show':
+                len([g for g in guests if not g.is_male]) - women,
+        }
+        assert report.attendance_ratio == {'men': 1.0,
+                                           'women': float(women) / men}
+
+    def test_host_attendance(self, user, party):
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=PARTY_START)
+        GuestFactory.create(host=user, party=party)
+        report = Report(party)
+        assert report.host_attendance_raw == [(user.full_name, 1, user.id)]
+        assert report.host_attendance_normalized == [
+            (user.full_name, 0.5, user.id)]
+
+    @pytest.mark.parametrize('in_database', [False, True])
+    def test_host_attendance_by_id(self, user, president, party, in_database):
+        """Brothers who share a name are kept apart, in order of ID."""
+        president.update(first_name=user.first_name, last_name=user.last_name)
+        GuestFactory.create(host=president, party=party,
+                            entered_party_at=PARTY_START)
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=PARTY_START)
+        GuestFactory.create(host=user, party=party)
+        report = Report(party, in_database=in_database)
+
+        def by_id(figures):
+            return sorted(figures, key=lambda f: f[2])
+
+        assert report.host_attendance_raw == by_id([
+            (user.full_name, 1, user.id),
+            (user.full_name, 1, president.id)])
+        assert report.host_attendance_normalized == by_id([
+            (user.full_name, 0.5, user.id),
+            (user.full_name, 1.0, president.id)])
+
+    @pytest.mark.parametrize('seed', [4, 5])
+    def test_database_aggregation_matches_python(self, user, president,
+                                                 party, seed):
+        make_guests(user, party, 120, seed=seed)
+        make_guests(president, party, 40, seed=seed + 10)
+        # someone right on a bucket's edge
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=dt(2016, 12, 20, 23, 0),
+                            left_party_at=dt(2016, 12, 20, 23, 30))
+        in_python = Report(party, in_database=False)
+        in_database = Report(party, in_database=True)
+        for figure in ['total_guests', 'attendance', 'attendance_raw',
+                       'attendance_ratio', 'population_buckets',
+                       'gendered_population_buckets', 'host_attendance_raw',
+                       'host_attendance_normalized']:
+            assert getattr(in_python, figure) == getattr(in_database, figure)
+
+    def test_database_aggregation_no_guests(self, party):
+        report = Report(party, in_database=True)
+        assert report.total_guests == 0
+        assert report.population_buckets == []
+        assert report.gendered_population_buckets == []
+
+
+@pytest.mark.usefixtures('db')
+class TestSummarize:
+    """Tests the reports stored for parties that ended."""
+
+    def end(self, party):
+        party.start()
+        party.end()
+
+    def test_ending_stores_report(self, db, user, president, party):
+        make_guests(user, party, 30)
+        make_guests(president, party, 10, seed=1)
+        expected = Report(party)
+        self.end(party)
+        summary = PartyReport.query.filter_by(party_id=party.id).one()
+        assert summary.total_guests == 40
+        assert summary.guys_who_showed == \
+            expected.attendance_raw['guys_who_showed']
+        assert summary.girls_who_didnt_show == \
+            expected.attendance_raw['girls_who_didnt_show']
+        assert summary.peak_population == \
+            max(b['population'] for b in expected.population_buckets)
+        hosts = {h.host_id: (h.listed, h.showed)
+                 for h in PartyHostReport.query.filter_by(party_id=party.id)}
+        assert hosts[user.id][0] == 30
+        assert hosts[president.id][0] == 10
+        assert sum(showed for _, showed in hosts.values()) == \
+            expected.stats.total_showed
+
+    def test_report_reads_summary(self, db, user, party):
+        make_guests(user, party, 20)
+        expected = Report(party).data
+        self.end(party)
+        party_id = party.id
+        db.session.expunge_all()
+        party = Party.query.get(party_id)
+        report = Report(party)
+        with assert_max_queries(db, 1):
+            data = report.data
+            assert report.attendance == expected['attendance']
+        # JSON has lists where the report has tuples
+        assert json.loads(json.dumps(data)) == \
+            json.loads(json.dumps(expected))
+
+    def test_other_interval_reads_summary_but_population(self, db, user,
+                                                         party):
+        guests = make_guests(user, party, 20)
+        self.end(party)
+        report = Report(party, minute_bucket_interval=5)
+        data = report.data
+        assert report.summary is not None
+        assert data['attendance'] == report.summary.data['attendance']
+        assert data['population'] == naive_population_buckets(guests, 5)
+
+    def test_no_summary_before_party_ends(self, party):
+        assert Report(party).summary is None
+
+    def test_no_guests(self, party):
+        self.end(party)
+        summary = Report(party).summary
+        assert summary.total_guests == 0
+        assert summary.peak_population == 0
+
+    def test_backfill(self, user, party, other_party):
+        make_guests(user, party, 5)
+        party.update(started=True, ended=True)
+        self.end(other_party)
+        assert [p.id for p in backfill_summaries()] == [party.id]
+        assert PartyReport.query.filter_by(party_id=party.id).one()\
+            .total_guests == 5
+        assert list(backfill_summaries()) == []
+        assert [p.id for p in backfill_summaries(rebuild=True)] == \
+            sorted([party.id, other_party.id])
+        assert PartyReport.query.count() == 2
+
+    def test_deleting_party_deletes_summary(self, user, party):
+        make_guests(user, party, 5)
+        self.end(party)
+        party.delete()
+        assert PartyReport.query.count() == 0
+        assert PartyHostReport.query.count() == 0
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Guest list and lookup cache tests."""
+import pytest
+
+from ifc.database import db
+from ifc.models import FraternityModelView, Fraternity, Guest, Role, User
+from ifc.party.cache import GuestCache, GuestRecord, guest_cache
+from ifc.user.cache import lookup_cache
+
+from tests.factories import PreuserFactory
+from tests.utils import assert_max_queries
+
+
+@pytest.mark.usefixtures('db')
+class TestGuestCache:
+    """GuestCache tests."""
+    def test_records_match_guests(self, party, guest):
+        guests = GuestCache().get(party)
+        assert guests.version == party.guests_version
+        assert [gu.json_dict for gu in guests.guests] == [guest.json_dict]
+        assert guests.get(guest.id) == GuestRecord.from_guest(guest)
+        assert guests.get(guest.id + 1) is None
+
+    def test_filter_by_gender(self, party, guest, user):
+        female = Guest.create(name='Jane Doe', host=user, party=party,
+                              is_male=False)
+        guests = GuestCache().get(party)
+        assert [gu.id for gu in guests.filter(True)] == [guest.id]
+        assert [gu.id for gu in guests.filter(False)] == [female.id]
+        assert len(guests.filter()) == 2
+
+    def test_keeps_parties_in_progress(self, party, guest):
+        party.start()
+        cache = GuestCache()
+        assert cache.get(party) is cache.get(party)
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+        assert cache.stats()['hit_rate'] == 0.5
+
+    @pytest.mark.parametrize('ended', [False, True])
+    def test_doesnt_keep_other_parties(self, ended, party, guest):
+        if ended:
+            party.start()
+            party.end()
+        cache = GuestCache()
+        assert cache.get(party) is not cache.get(party)
+        assert cache.stats()['parties'] == 0
+
+    def test_reloads_newer_version(self, party, guest):
+        party.start()
+        cache = GuestCache()
+        guests = cache.get(party)
+        # as if another process changed the list
+        party.guests_version += 1
+        assert cache.get(party) is not guests
+        assert cache.get(party).version == party.guests_version
+
+    def test_guest_changes_invalidate(self, party, guest, user):
+        party.start()
+        guest_cache.get(party)
+        guest.enter_party()
+        assert guest_cache.stats()['parties'] == 0
+        assert guest_cache.stats()['invalidations'] == 1
+        assert guest_cache.get(party).get(guest.id).is_at_party
+        Guest.create(name='Foster Lee', host=user, party=party, is_male=True)
+        assert len(guest_cache.get(party).guests) == 2
+        guest.delete()
+        assert len(guest_cache.get(party).guests) == 1
+        assert guest_cache.stats()['invalidations'] == 3
+
+    def test_evicts_least_recently_used(self, app, party, other_party):
+        app.config['GUEST_CACHE_SIZE'] = 1
+        party.start()
+        other_party.start()
+        cache = GuestCache()
+        cache.get(party)
+        cache.get(other_party)
+        assert cache.stats()['parties'] == 1
+        assert cache.stats()['evictions'] == 1
+        cache.get(other_party)
+        assert cache.stats()['hits'] == 1
+
+    def test_name_index(self, party, guest):
+        party.start()
+        guests = GuestCache().get(party)
+        assert guests.name_index is guests.name_index
+        assert guests.name_index.search(guest.name) == [(guest.id, 1.0)]
+
+
+@pytest.mark.usefixtures('db')
+class TestLookupCache:
+    """LookupCache tests."""
+    def register(self):
+        return User(email=PreuserFactory.create().email)
+
+    def test_registering_looks_up_once(self, frat, role):
+        first = self.register()
+        assert lookup_cache.misses == 2
+        with assert_max_queries(db, 2) as statements:
+            # the preuser is inserted, and looked up again
+            user = self.register()
+        assert len([s for s in statements if s.startswith('SELECT')]) == 1
+        assert lookup_cache.hits == 2
+        assert user.role is first.role is role
+        assert user.fraternity is frat
+        user.save()
+        assert User.query.get(user.id).fraternity_id == frat.id
+
+    def test_kept_copies_are_loaded(self, frat, role):
+        self.register()
+        db.session.expunge_all()
+        user = self.register()
+        assert user.role.title == 'normal'
+        assert user.fraternity.title == frat.title
+        assert user.fraternity.school.title == frat.school.title
+        assert not db.session.dirty
+
+    def test_missing_rows_not_kept(self, frat):
+        assert self.register().role is None
+        assert lookup_cache.get(('role', 'normal'),
+                                Role.query.filter_by(title='normal').first) \
+            is None
+        assert lookup_cache.misses == 3
+
+    def test_expires(self, app, frat, role):
+        app.config['LOOKUP_CACHE_TIMEOUT'] = 0
+        self.register()
+        self.register()
+        assert (lookup_cache.hits, lookup_cache.misses) == (0, 4)
+
+    def test_admin_changes_clear(self, frat, role):
+        self.register()
+        frat.update(capacity=5)
+        FraternityModelView(Fraternity, db.session)\
+            .after_model_change(None, frat, False)
+        db.session.expunge_all()
+        assert self.register().fraternity.capacity == 5
+        assert lookup_cache.hits == 0
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Guest list change notification tests."""
+import threading
+
+from ifc.party.events import LocalGuestEvents
+
+
+class TestLocalGuestEvents:
+    """LocalGuestEvents tests."""
+    def test_publish_wakes_subscriber(self):
+        events = LocalGuestEvents()
+        subscription = events.subscribe(1)
+        threading.Timer(0.01, events.publish, [1]).start()
+        assert subscription.wait(5)
+
+    def test_wait_times_out(self):
+        events = LocalGuestEvents()
+        subscription = events.subscribe(1)
+        assert not subscription.wait(0.01)
+
+    def test_other_party_not_notified(self):
+        events = LocalGuestEvents()
+        subscription = events.subscribe(1)
+        events.publish(2)
+        assert not subscription.wait(0)
+
+    def test_change_before_wait_is_kept(self):
+        events = LocalGuestEvents()
+        subscription = events.subscribe(1)
+        events.publish(1)
+        assert subscription.wait(0)
+        assert not subscription.wait(0)
+
+    def test_closed_subscription_not_notified(self):
+        events = LocalGuestEvents()
+        subscription = events.subscribe(1)
+        subscription.close()
+        events.publish(1)
+        assert not subscription.wait(0)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Background job tests."""
+import threading
+from datetime import datetime as dt, timedelta as td
+
+import pytest
+
+from ifc.jobs import worker
+from ifc.jobs.worker import job_handler, run_next_job, work
+from ifc.models import Job
+
+
+@pytest.yield_fixture
+def handlers():
+    """Lets a test register job handlers, and forgets them afterwards."""
+    registered = dict(worker.handlers)
+    yield worker.handlers
+    worker.handlers.clear()
+    worker.handlers.update(registered)
+
+
+@pytest.mark.usefixtures('db', 'handlers')
+class TestJobs:
+    """Job and worker tests."""
+    def test_claims_oldest_queued_job(self):
+        first = Job.enqueue('test', {})
+        Job.enqueue('test', {})
+        job = Job.claim_next()
+        assert job.id == first.id
+        assert job.status == Job.RUNNING
+        assert job.started_at is not None
+        assert Job.claim_next().id == first.id + 1
+        assert Job.claim_next() is None
+
+    def test_runs_job(self):
+        @job_handler('add')
+        def add(job):
+            return {'sum': job.args['a'] + job.args['b']}
+
+        queued = Job.enqueue('add', {'a': 1, 'b': 2})
+        job = run_next_job()
+        assert job.id == queued.id
+        assert job.status == Job.DONE
+        assert job.result == {'sum': 3}
+        assert job.finished and job.finished_at is not None
+        assert run_next_job() is None
+
+    def test_failed_job(self, db):
+        @job_handler('explode')
+        def explode(job):
+            db.session.add(Job(kind='never', args={}))
+            raise ValueError('kaboom')
+
+        Job.enqueue('explode', {})
+        job = run_next_job()
+        assert job.status == Job.FAILED
+        assert job.error == 'kaboom'
+        # whatever the job didn't commit is rolled back
+        assert Job.query.filter_by(kind='never').count() == 0
+
+    def test_unknown_kind(self):
+        Job.enqueue('mystery', {})
+        job = run_next_job()
+        assert job.status == Job.FAILED
+        assert 'mystery' in job.error
+
+    def test_report_progress(self, db):
+        job = Job.enqueue('test', {})
+        Job.report_progress(job.id, 0, 10)
+        Job.report_progress(job.id, 4)
+        db.session.refresh(job)
+        assert (job.progress, job.total) == (4, 10)
+
+    def test_reruns_job_whose_worker_stopped(self, app, db):
+        app.config['JOB_TIMEOUT'] = 60
+        ran = []
+        job_handler('test')(lambda job: ran.append(job.id))
+        job = Job.enqueue('test', {})
+        assert Job.claim_next().attempts == 1
+        # its worker is still going
+        assert run_next_job() is None
+        # its worker went away a while ago
+        job.update(heartbeat_at=dt.utcnow() - td(seconds=61))
+        assert run_next_job().status == Job.DONE
+        assert ran == [job.id]
+        assert job.attempts == 2
+
+    def test_progress_keeps_job_running(self, app, db):
+        app.config['JOB_TIMEOUT'] = 60
+        job = Job.enqueue('test', {})
+        Job.claim_next()
+        job.update(heartbeat_at=dt.utcnow() - td(seconds=61))
+        Job.report_progress(job.id, 1)
+        assert Job.claim_next() is None
+        db.session.refresh(job)
+        assert job.status == Job.RUNNING
+
+    def test_heartbeat_keeps_job_running(self, app, db):
+        app.config['JOB_TIMEOUT'] = 60
+        job = Job.enqueue('test', {})
+        Job.claim_next()
+        job.update(heartbeat_at=dt.utcnow() - td(seconds=61))
+        Job.heartbeat(job.id)
+        assert Job.claim_next() is None
+        db.session.refresh(job)
+        assert (job.status, job.progress) == (Job.RUNNING, 0)
+
+    def test_stopped_worker_cant_overwrite_rerun(self, app, db):
+        app.config['JOB_TIMEOUT'] = 60
+        job_id = Job.enqueue('test', {}).id
+        stopped = Job.claim_next()
+        db.session.expunge(stopped)
+        # the worker went quiet for too long, so the job was claimed again
+        Job.query.filter_by(id=job_id)\
+            .update({'heartbeat_at': dt.utcnow() - td(seconds=61)})
+        db.session.commit()
+        rerun = Job.claim_next()
+        assert (rerun.id, rerun.claimed_attempt) == (job_id, 2)
+        # the first worker was still at it after all
+        assert not stopped.finish({'run': 1})
+        db.session.refresh(rerun)
+        assert rerun.status == Job.RUNNING
+        assert rerun.finish({'run': 2})
+        assert not stopped.fail('too late')
+        db.session.refresh(rerun)
+        assert (rerun.status, rerun.result, rerun.error) == \
+            (Job.DONE, {'run': 2}, None)
+
+    def test_fails_job_that_keeps_stopping_workers(self, app, db):
+        app.config['JOB_MAX_ATTEMPTS'] = 2
+        job = Job.enqueue('test', {})
+        for _ in range(2):
+            assert Job.claim_next().id == job.id
+            job.update(heartbeat_at=dt.utcnow() - td(days=1))
+        assert Job.claim_next() is None
+        db.session.refresh(job)
+        assert job.status == Job.FAILED
+        assert 'stopped 2 times' in job.error
+        assert job.finished_at is not None
+
+    def test_work_once(self):
+        ran = []
+        job_handler('test')(lambda job: ran.append(job.id))
+        jobs = [Job.enqueue('test', {}) for _ in range(3)]
+        work(0, once=True)
+        assert ran == [job.id for job in jobs]
+
+    def test_parallel_workers_run_each_job_once(self, app, db):
+        ran = []
+        job_handler('test')(lambda job: ran.append(job.id))
+        jobs = [Job.enqueue('test', {}) for _ in range(20)]
+        start = threading.Event()
+
+        def run_worker():
+            # a worker of its own, with its own session and connection
+            with app.app_context():
+                start.wait()
+                try:
+                    work(0, once=True)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=run_worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        assert sorted(ran) == [job.id for job in jobs]
+        assert Job.query.filter_by(status=Job.DONE).count() == 20
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Roster ingestion tests."""
+from StringIO import StringIO
+
+import mock
+import pytest
+
+from ifc.ingest.roster import check_roster, chunked, ingest_roster, \
+    parse_roster, preview_roster
+from ifc.jobs.worker import run_next_job
+from ifc.models import Guest, Job, Party, PartyHostReport, Preuser, User
+
+from tests.factories import PartyFactory, PreuserFactory, UserFactory
+from tests.utils import assert_max_queries
+
+SCHOOL = 'Worcester Polytechnic Institute'
+HEADER = 'fraternity_name,first_name,last_name,email,chapter_admin,ifc_admin\n'
+
+
+def roster(*rows):
+    """A roster CSV with the given rows."""
+    return StringIO(HEADER + ''.join(row + '\n' for row in rows))
+
+
+def brothers(count, start=0):
+    """Roster rows for `count` brothers of Sigma Pi."""
+    return ['Sigma Pi,Brother,Number {0},b{0}@wpi.edu,False,'.format(i)
+            for i in range(start, start + count)]
+
+
+class TestParseRoster:
+    """parse_roster tests."""
+    def test_rows(self):
+        rows = list(parse_roster(roster(
+            'Sigma Pi,Ryan Michael,Baker,rbaker@wpi.edu,True,',
+            'Zeta Psi,Jane,Doe,jdoe@wpi.edu,,TRUE'), SCHOOL))
+        assert rows == [
+            {'fraternity_name': 'Sigma Pi', 'first_name': 'Ryan',
+             'last_name': 'Baker', 'email': 'rbaker@wpi.edu',
+             'chapter_admin': True, 'ifc_admin': False,
+             'school_title': SCHOOL},
+            {'fraternity_name': 'Zeta Psi', 'first_name': 'Jane',
+             'last_name': 'Doe', 'email': 'jdoe@wpi.edu',
+             'chapter_admin': False, 'ifc_admin': True,
+             'school_title': SCHOOL}]
+
+    def test_skips_other_emails(self):
+        assert list(parse_roster(roster('Sigma Pi,A,B,ab@gmail.com,,'),
+                                 SCHOOL)) == []
+
+    def test_long_names_cut_down(self):
+        row, = parse_roster(roster('Sigma Pi,{0},{0},x@wpi.edu,,'
+                                   .format('a' * 40)), SCHOOL)
+        assert len(row['first_name']) == len(row['last_name']) == 30
+
+    def test_admin_columns_optional(self):
+        infile = StringIO('fraternity_name,first_name,last_name,email\n'
+                          'Sigma Pi,A,B,ab@wpi.edu\n')
+        row, = parse_roster(infile, SCHOOL)
+        assert not row['chapter_admin'] and not row['ifc_admin']
+
+    def test_missing_columns(self):
+        with pytest.raises(ValueError) as error:
+            list(parse_roster(StringIO('first_name,email\n'), SCHOOL))
+        assert 'fraternity_name, last_name' in str(error.value)
+
+
+class TestCheckRoster:
+    """check_roster tests."""
+    def test_problems(self):
+        rows = [(line, brother is not None, problems)
+                for line, _, brother, problems in check_roster(roster(
+                    'Sigma Pi,A,B,ab@wpi.edu,,',
+                    'Sigma Pi,A,B,ab@gmail.com,,',
+                    'Sigma Pi,{0},{0},long@wpi.edu,,'.format('a' * 40)),
+                    SCHOOL)]
+        assert rows == [
+            (2, True, []), (3, False, ['not_wpi_email']),
+            (4, True, ['first_name_truncated', 'last_name_truncated'])]
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+@pytest.mark.usefixtures('db')
+class TestIngestRoster:
+    """ingest_roster tests."""
+    @pytest.mark.parametrize('replace', [False, True])
+    def test_replaces_school_preusers(self, replace, frat, school,
+                                      other_school_pre):
+        PreuserFactory.create(email='old@wpi.edu')
+        result = ingest_roster(roster(*brothers(3)), school, replace=replace)
+        assert result == {'added': 3, 'updated': 0, 'unchanged': 0,
+                          'deleted': 1, 'deleted_users': 0,
+                          'deactivated_users': 0}
+        assert sorted(p.email for p in Preuser.query
+                      .filter_by(school_title=school.title)) == \
+            ['b0@wpi.edu', 'b1@wpi.edu', 'b2@wpi.edu']
+        # other schools are left alone
+        assert Preuser.query.get(other_school_pre.id) is not None
+
+    def test_deletes_users_not_on_roster(self, school, user, role,
+                                         other_school_user):
+        PreuserFactory.create(email='b1@wpi.edu')
+        kept = UserFactory.create(email='b1@wpi.edu')
+        PartyFactory.create(creator=user, fraternity=user.fraternity)
+        result = ingest_roster(roster(*brothers(2)), school)
+        assert result['deleted_users'] == 1
+        assert [u.email for u in User.query.order_by(User.id)] == \
+            [other_school_user.email, kept.email]
+        # their parties go with them
+        assert Party.query.count() == 0
+
+    def test_deactivates_users_who_hosted_elsewhere(self, db, school, user,
+                                                    role):
+        PreuserFactory.create(email='b0@wpi.edu')
+        PreuserFactory.create(email='b1@wpi.edu')
+        # b0 graduated, after putting a guest on b1's party
+        host = UserFactory.create(email='b0@wpi.edu')
+        creator = UserFactory.create(email='b1@wpi.edu')
+        party = PartyFactory.create(creator=creator,
+                                    fraternity=creator.fraternity)
+        PartyFactory.create(creator=host, fraternity=host.fraternity)
+        Guest.create(name='Jane Doe', host=host, party=party, is_male=False)
+        party.start()
+        party.end()
+        host_id, party_id = host.id, party.id
+        assert PartyHostReport.query.filter_by(host_id=host_id).count() == 1
+
+        preview = preview_roster(roster(*brothers(1, start=1)), school)
+        assert [u['email'] for u in preview.deactivated_users] == \
+            ['b0@wpi.edu']
+        assert [u['email'] for u in preview.deleted_users] == [user.email]
+
+        result = ingest_roster(roster(*brothers(1, start=1)), school)
+        assert (result['deleted_users'], result['deactivated_users']) == \
+            (1, 1)
+        db.session.expire_all()
+        assert User.query.get(host_id).active is False
+        # b1's party keeps its guest list and reports
+        assert Guest.query.filter_by(party_id=party_id).count() == 1
+        assert PartyHostReport.query.filter_by(host_id=host_id).count() == 1
+        # b0 is only deactivated once
+        result = ingest_roster(roster(*brothers(1, start=1)), school)
+        assert (result['deleted_users'], result['deactivated_users']) == \
+            (0, 0)
+
+    def test_only_changes_are_applied(self, app, frat, school):
+        app.config['INGEST_CHUNK_SIZE'] = 2
+        ingest_roster(roster(*brothers(4)), school)
+        ids = dict((p.email, p.id) for p in Preuser.query)
+        changed = brothers(4)
+        changed[0] = changed[0].replace('Brother', 'Bro')
+        result = ingest_roster(roster(
+            changed[0], changed[1], changed[3], changed[1],
+            *brothers(1, start=4)), school)
+        assert result == {'added': 1, 'updated': 1, 'unchanged': 2,
+                          'deleted': 1, 'deleted_users': 0,
+                          'deactivated_users': 0}
+        preusers = dict((p.email, p) for p in Preuser.query)
+        assert sorted(preusers) == ['b0@wpi.edu', 'b1@wpi.edu', 'b3@wpi.edu',
+                                    'b4@wpi.edu']
+        assert preusers['b0@wpi.edu'].first_name == 'Bro'
+        # the rows that were already there are kept, not recreated
+        assert all(preusers[email].id == ids[email]
+                   for email in ['b0@wpi.edu', 'b1@wpi.edu', 'b3@wpi.edu'])
+
+    def test_same_roster_twice_touches_nothing(self, db, frat, school):
+        ingest_roster(roster(*brothers(10)), school)
+        with assert_max_queries(db, 10) as statements:
+            result = ingest_roster(roster(*brothers(10)), school)
+        assert result['unchanged'] == 10
+        assert not [statement for statement in statements
+                    if statement.split()[0] in ('INSERT', 'UPDATE',
+                                                'DELETE')]
+
+    def test_duplicate_preusers_deleted(self, frat, school):
+        PreuserFactory.create(email='b0@wpi.edu')
+        PreuserFactory.create(email='b0@wpi.edu')
+        result = ingest_roster(roster(*brothers(1)), school)
+        assert result['deleted'] == 1
+        assert Preuser.query.count() == 1
+
+    def test_chunked_inserts(self, app, db, frat, school):
+        app.config['INGEST_CHUNK_SIZE'] = 100
+        with assert_max_queries(db, 10) as statements:
+            ingest_roster(roster(*brothers(450)), school)
+        inserts = [s for s in statements if s.startswith('INSERT')]
+        assert len(inserts) == 5
+        assert Preuser.query.count() == 450
+
+    def test_failure_changes_nothing(self, app, db, school, user):
+        app.config['INGEST_CHUNK_SIZE'] = 2
+        db.session.commit()
+        before = [p.email for p in Preuser.query]
+        with mock.patch('ifc.ingest.roster.relic_users',
+                        side_effect=RuntimeError):
+            with pytest.raises(RuntimeError):
+                ingest_roster(roster(*brothers(5)), school)
+        assert [p.email for p in Preuser.query] == before
+        assert User.query.get(user.id) is not None
+
+    def test_heartbeat_between_chunks(self, app, frat, school, role):
+        app.config['INGEST_CHUNK_SIZE'] = 2
+        for i in range(3):
+            PreuserFactory.create(email='gone{}@wpi.edu'.format(i))
+            UserFactory.create(email='gone{}@wpi.edu'.format(i))
+        heartbeat = mock.Mock()
+        result = ingest_roster(roster(*brothers(1)), school,
+                               heartbeat=heartbeat)
+        assert (result['deleted'], result['deleted_users']) == (3, 3)
+        # once the preusers are loaded, then after each chunk of preusers
+        # and of users that are deleted
+        assert heartbeat.call_count == 1 + 2 + 2
+
+    def test_ingest_job(self, frat, school):
+        Job.enqueue('ingest_roster', {'school_id': school.id},
+                    payload=roster(*brothers(5)).getvalue())
+        job = run_next_job()
+        assert job.status == Job.DONE
+        assert job.result == {'added': 5, 'updated': 0, 'unchanged': 0,
+                              'deleted': 0, 'deleted_users': 0,
+                              'deactivated_users': 0}
+        assert (job.progress, job.total) == (5, 5)
+        assert Preuser.query.count() == 5
+        # the roster is dropped once it's ingested
+        assert job.payload is None
+
+    def test_ingest_job_heartbeats(self, app, frat, school):
+        app.config['INGEST_CHUNK_SIZE'] = 2
+        job_id = Job.enqueue('ingest_roster', {'school_id': school.id},
+                             payload=roster(*brothers(5)).getvalue()).id
+        with mock.patch.object(Job, 'heartbeat',
+                               wraps=Job.heartbeat) as heartbeat:
+            assert run_next_job().status == Job.DONE
+        # after each chunk that's counted, and once the preusers are loaded
+        assert heartbeat.call_args_list == [mock.call(job_id)] * 4
+
+
+@pytest.mark.usefixtures('db')
+class TestPreviewRoster:
+    """preview_roster tests."""
+    def test_matches_ingest(self, frat, school, role):
+        ingest_roster(roster(*brothers(4)), school)
+        PreuserFactory.create(email='b3@wpi.edu')
+        UserFactory.create(email='b1@wpi.edu')
+        UserFactory.create(email='b2@wpi.edu')
+        changed = brothers(4)
+        changed[0] = changed[0].replace('Brother', 'Bro')
+        rows = [changed[0], changed[1], changed[3], changed[1],
+                'Sigma Pi,A,B,ab@gmail.com,,',
+                'Zeta Psi,New,Guy,new@wpi.edu,,']
+        before = [(p.id, p.first_name) for p in Preuser.query]
+        preview = preview_roster(roster(*rows), school)
+        # nothing's written
+        assert [(p.id, p.first_name) for p in Preuser.query] == before
+        assert preview.summary == {'rows': 6, 'problems': 3, 'added': 1,
+                                   'updated': 1, 'unchanged': 2,
+                                   'deleted': 2, 'deleted_users': 1,
+                                   'deactivated_users': 0}
+        assert [(p['line'], p['email'], p['problems'])
+                for p in preview.problems] == [
+            (5, 'b1@wpi.edu', ['duplicate_email']),
+            (6, 'ab@gmail.com', ['not_wpi_email']),
+            (7, 'new@wpi.edu', ['unknown_fraternity'])]
+        assert [p['email'] for p in preview.added] == ['new@wpi.edu']
+        assert preview.updated == [{'email': 'b0@wpi.edu',
+                                    'changes': {'first_name':
+                                                ['Brother', 'Bro']}}]
+        assert [p['email'] for p in preview.deleted] == ['b2@wpi.edu',
+                                                         'b3@wpi.edu']
+        assert [u['email'] for u in preview.deleted_users] == ['b2@wpi.edu']
+
+        result = ingest_roster(roster(*rows), school)
+        assert dict((key, preview.summary[key]) for key in result) == result
+
+    def test_replace(self, frat, school):
+        ingest_roster(roster(*brothers(2)), school)
+        preview = preview_roster(roster(*brothers(2)), school, replace=True)
+        assert (preview.summary['added'], preview.summary['deleted'],
+                preview.summary['unchanged']) == (2, 2, 0)
+
+    def test_queries_dont_grow_with_roster(self, db, frat, school):
+        ingest_roster(roster(*brothers(500)), school)
+        with assert_max_queries(db, 4):
+            preview = preview_roster(roster(*brothers(1000)), school)
+        assert preview.summary['added'] == 500
+        assert preview.summary['unchanged'] == 500
+
+    def test_missing_columns(self, school):
+        with pytest.raises(ValueError):
+            preview_roster(StringIO('first_name,email\n'), school)
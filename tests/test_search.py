@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Fuzzy guest name search tests."""
+from ifc.party.search import TrigramIndex, trigrams
+
+
+class TestTrigrams:
+    """trigrams tests."""
+    def test_pads_words(self):
+        assert trigrams('Jon') == {'  j', ' jo', 'jon', 'on '}
+
+    def test_splits_words(self):
+        assert trigrams('a-b') == {'  a', ' a ', '  b', ' b '}
+
+    def test_empty(self):
+        assert trigrams(' ') == set()
+
+
+class TestTrigramIndex:
+    """TrigramIndex tests."""
+    guests = [(1, 'john smith', True), (2, 'jane smith', False),
+              (3, 'jon smithe', True), (4, 'bob jones', True)]
+
+    def test_best_match_first(self):
+        index = TrigramIndex(self.guests)
+        results = index.search('jon smith')
+        assert [gid for gid, _ in results] == [3, 1, 2]
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+        assert all(0.3 <= score <= 1 for score in scores)
+
+    def test_exact_match_scores_one(self):
+        index = TrigramIndex(self.guests)
+        assert index.search('Bob Jones', limit=1) == [(4, 1.0)]
+
+    def test_limit_and_gender(self):
+        index = TrigramIndex(self.guests)
+        assert [gid for gid, _ in index.search('smith', limit=1)] == [1]
+        assert [gid for gid, _ in index.search('smith', is_male=False)] == \
+            [2]
+
+    def test_no_match(self):
+        index = TrigramIndex(self.guests)
+        assert index.search('xyz') == []
+        assert index.search('') == []
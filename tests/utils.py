@@ -1,3 +1,32 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def assert_max_queries(db, max_queries):
+    """Assert that no more than `max_queries` SQL statements are run inside
+    the block.
+
+    example usage:
+        >>> with assert_max_queries(db, 5):
+        ...     testapp.get('/parties/1/guests')
+    """
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+    assert len(statements) <= max_queries, \
+        '{} statements were run:\n{}'.format(len(statements),
+                                             '\n'.join(statements))
+
+
 class BaseViewTest:
     def login(self, user, testapp):
         res = testapp.get('/')
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Tests for the analytics views."""
+from datetime import date, datetime as dt, timedelta as td
+
+import pytest
+
+from tests.factories import GuestFactory, PartyFactory
+from tests.utils import BaseViewTest
+
+
+def ended_party(frat, creator, days, guests):
+    """A party that ended, `days` from today, with (host, showed) guests."""
+    party = PartyFactory.create(name='Party in {} days'.format(days),
+                                date=date.today() + td(days=days),
+                                fraternity=frat, creator=creator)
+    for i, (host, showed) in enumerate(guests):
+        entered = left = None
+        if showed:
+            entered = dt(2017, 1, 1, 22, 0) + td(minutes=i)
+            left = entered + td(hours=1)
+        GuestFactory.create(host=host, party=party,
+                            is_at_party=False, entered_party_at=entered,
+                            left_party_at=left)
+    party.start()
+    party.end()
+    return party
+
+
+@pytest.fixture
+def parties(user, president, frat, other_pres, other_frat):
+    return [ended_party(frat, president, 2, [(user, True), (user, False)]),
+            ended_party(frat, president, 10, [(user, True), (president, True),
+                                              (president, True),
+                                              (president, False)]),
+            ended_party(other_frat, other_pres, 5, [(other_pres, True)])]
+
+
+class TestFraternityPartiesView(BaseViewTest):
+    """Tests the /analytics/fraternities/id/parties endpoint."""
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/analytics/fraternities/1/parties', status=401)
+        assert res.status_code == 401
+
+    def test_frat_404(self, admin, testapp):
+        self.login(admin, testapp)
+        res = testapp.get('/analytics/fraternities/100/parties', status=404)
+        assert res.status_code == 404
+
+    @pytest.mark.parametrize('who', ['user', 'other_pres'])
+    def test_cannot_view(self, who, request, frat, other_frat, testapp):
+        self.login(request.getfuncargvalue(who), testapp)
+        res = testapp.get('/analytics/fraternities/{}/parties'
+                          .format(frat.id), status=403)
+        assert res.json['error'] == "You can't see the trends of these parties"
+
+    @pytest.mark.parametrize('who', ['president', 'admin', 'site_admin'])
+    def test_can_view(self, who, request, frat, testapp):
+        self.login(request.getfuncargvalue(who), testapp)
+        res = testapp.get('/analytics/fraternities/{}/parties'
+                          .format(frat.id))
+        assert res.status_code == 200
+
+    def test_trends(self, president, frat, parties, testapp):
+        self.login(president, testapp)
+        res = testapp.get('/analytics/fraternities/{}/parties'
+                          .format(frat.id))
+        assert res.json['totals'] == {'parties': 2, 'total_guests': 6,
+                                      'guests_who_showed': 4,
+                                      'attendance': 4.0 / 6,
+                                      'average_peak_population': 2.0,
+                                      'max_peak_population': 3}
+        page = res.json['parties']
+        assert [p['id'] for p in page['items']] == \
+            [parties[0].id, parties[1].id]
+        assert page['items'][0]['attendance'] == 0.5
+        assert page['items'][1]['peak_population'] == 3
+        assert (page['page'], page['pages'], page['total']) == (1, 1, 2)
+
+    def test_date_range(self, president, frat, parties, testapp):
+        self.login(president, testapp)
+        res = testapp.get('/analytics/fraternities/{}/parties'
+                          .format(frat.id),
+                          {'start': (date.today() + td(days=3)).isoformat(),
+                           'end': (date.today() + td(days=30)).isoformat()})
+        assert res.json['totals']['parties'] == 1
+        assert [p['id'] for p in res.json['parties']['items']] == \
+            [parties[1].id]
+
+    def test_bad_date(self, president, frat, testapp):
+        self.login(president, testapp)
+        res = testapp.get('/analytics/fraternities/{}/parties'
+                          .format(frat.id), {'start': 'yesterday'},
+                          status=400)
+        assert res.json['error'] == 'Dates must look like 2017-01-31.'
+
+    def test_pagination(self, president, frat, parties, testapp):
+        self.login(president, testapp)
+        url = '/analytics/fraternities/{}/parties'.format(frat.id)
+        page = testapp.get(url, {'per_page': 1, 'page': 2}).json['parties']
+        assert [p['id'] for p in page['items']] == [parties[1].id]
+        assert (page['page'], page['per_page'], page['pages'],
+                page['total']) == (2, 1, 2, 2)
+        page = testapp.get(url, {'per_page': 1, 'page': 3}).json['parties']
+        assert page['items'] == []
+
+    def test_no_parties(self, president, frat, testapp):
+        self.login(president, testapp)
+        res = testapp.get('/analytics/fraternities/{}/parties'
+                          .format(frat.id))
+        assert res.json['totals']['parties'] == 0
+        assert res.json['totals']['attendance'] == 0.0
+        assert res.json['parties']['items'] == []
+
+
+class TestFraternityHostsView(BaseViewTest):
+    """Tests the /analytics/fraternities/id/hosts endpoint."""
+    def test_cannot_view(self, user, frat, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/analytics/fraternities/{}/hosts'.format(frat.id),
+                          status=403)
+        assert res.status_code == 403
+
+    def test_turnout(self, user, president, frat, parties, testapp):
+        self.login(president, testapp)
+        res = testapp.get('/analytics/fraternities/{}/hosts'.format(frat.id))
+        hosts = res.json['hosts']['items']
+        # a tie on guests who showed, so by ID
+        assert hosts == [{'id': user.id, 'name': user.full_name,
+                          'parties': 2, 'guests_listed': 3,
+                          'guests_who_showed': 2, 'turnout': 2.0 / 3},
+                         {'id': president.id, 'name': president.full_name,
+                          'parties': 1, 'guests_listed': 3,
+                          'guests_who_showed': 2, 'turnout': 2.0 / 3}]
+
+
+class TestSchoolViews(BaseViewTest):
+    """Tests the /analytics/schools/id endpoints."""
+    @pytest.mark.parametrize('endpoint', ['parties', 'hosts'])
+    def test_president_cannot_view(self, endpoint, president, school,
+                                   testapp):
+        self.login(president, testapp)
+        res = testapp.get('/analytics/schools/{}/{}'
+                          .format(school.id, endpoint), status=403)
+        assert res.status_code == 403
+
+    def test_other_school_admin_cannot_view(self, admin, other_school,
+                                            testapp):
+        self.login(admin, testapp)
+        res = testapp.get('/analytics/schools/{}/parties'
+                          .format(other_school.id), status=403)
+        assert res.status_code == 403
+
+    def test_trends(self, admin, school, parties, other_school_party,
+                    testapp):
+        self.login(admin, testapp)
+        res = testapp.get('/analytics/schools/{}/parties'.format(school.id))
+        assert res.json['totals']['parties'] == 3
+        assert [p['id'] for p in res.json['parties']['items']] == \
+            [parties[0].id, parties[2].id, parties[1].id]
+        res = testapp.get('/analytics/schools/{}/hosts'.format(school.id))
+        assert len(res.json['hosts']['items']) == 3
@@ -3,6 +3,16 @@
 
 See: http://webtest.readthedocs.org/
 """
+import os
+import time
+
+import mock
+
+from ifc import locales, models as m
+from ifc.database import db
+from ifc.ingest.roster import preview_roster
+from ifc.jobs.worker import run_next_job
+
 from tests.utils import BaseViewTest
 
 
@@ -46,3 +56,168 @@ class TestIngestViews(BaseViewTest):
         self.login(admin, testapp)
         res = testapp.post('/ingest/')
         assert res.status_code == 200
+
+    def upload(self, testapp, content):
+        return testapp.post('/ingest/',
+                            upload_files=[('file', 'roster.csv', content)])
+
+    def test_upload_queues_job(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        res = self.upload(testapp,
+                          'fraternity_name,first_name,last_name,email\n'
+                          'Sigma Pi,Jane,Doe,jdoe@wpi.edu\n')
+        job = m.Job.query.one()
+        assert res.status_code == 302
+        assert res.location.endswith('/ingest/?job={}'.format(job.id))
+        assert job.status == m.Job.QUEUED
+        assert job.school_id == admin.fraternity.school_id
+        assert job.args['replace'] is False
+        # the roster is kept with the job, not on this process's disk
+        assert tmpdir.listdir() == []
+        # nothing is ingested until a worker runs the job
+        assert m.Preuser.query.filter_by(email='jdoe@wpi.edu').count() == 0
+        assert run_next_job().status == m.Job.DONE
+        assert [p.email for p in m.Preuser.query] == ['jdoe@wpi.edu']
+
+    def test_upload_to_replace(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        testapp.post('/ingest/', {'replace': 'on'},
+                     upload_files=[('file', 'roster.csv', 'email\n')])
+        assert m.Job.query.one().args['replace'] is True
+
+    def test_job_page(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        res = self.upload(testapp, 'first_name,email\n').follow()
+        assert 'id="job"' in res
+        assert '/jobs/{}'.format(m.Job.query.one().id) in res
+
+    def test_bad_roster_fails_job(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        db.session.commit()
+        before = m.Preuser.query.count()
+        self.upload(testapp, 'first_name,email\nJane,jdoe@wpi.edu\n')
+        job = run_next_job()
+        assert job.status == m.Job.FAILED
+        assert 'missing the columns' in job.error
+        assert m.Preuser.query.count() == before
+
+    def test_job_runs_on_another_disk(self, app, admin, tmpdir, testapp):
+        """The worker runs on another dyno, which can't see the upload
+        folder of the web dyno."""
+        app.config['UPLOAD_FOLDER'] = str(tmpdir.mkdir('web'))
+        self.login(admin, testapp)
+        self.upload(testapp,
+                    'fraternity_name,first_name,last_name,email\n'
+                    'Sigma Pi,Jane,Doe,jdoe@wpi.edu\n')
+        tmpdir.join('web').remove()
+        app.config['UPLOAD_FOLDER'] = str(tmpdir.mkdir('worker'))
+        assert run_next_job().status == m.Job.DONE
+        assert [p.email for p in m.Preuser.query] == ['jdoe@wpi.edu']
+
+    def preview(self, testapp, content, **kwargs):
+        return testapp.post('/ingest/preview',
+                            upload_files=[('file', 'roster.csv', content)],
+                            **kwargs)
+
+    def test_preview(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        db.session.commit()
+        before = m.Preuser.query.count()
+        content = 'fraternity_name,first_name,last_name,email\n' + \
+            ''.join('Sigma Pi,B,N{0},b{0}@wpi.edu\n'.format(i)
+                    for i in range(3)) + 'Sigma Pi,A,B,ab@gmail.com\n'
+        res = self.preview(testapp, content)
+        assert res.json['summary']['added'] == 3
+        assert res.json['summary']['problems'] == 1
+        assert res.json['section'] == 'problems'
+        assert res.json['problems']['items'][0]['email'] == 'ab@gmail.com'
+        # nothing is ingested or queued
+        assert m.Preuser.query.count() == before
+        assert m.Job.query.count() == 0
+
+        url = '/ingest/preview/{}'.format(res.json['upload'])
+        page = testapp.get(url, {'section': 'added', 'per_page': 2,
+                                 'page': 2})
+        assert page.json['added']['total'] == 3
+        assert page.json['added']['pages'] == 2
+        assert [b['email'] for b in page.json['added']['items']] == \
+            ['b2@wpi.edu']
+
+    def test_preview_then_ingest(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        res = self.preview(testapp,
+                           'fraternity_name,first_name,last_name,email\n'
+                           'Sigma Pi,Jane,Doe,jdoe@wpi.edu\n')
+        testapp.post('/ingest/', {'upload': res.json['upload']})
+        # the previewed upload went in to the job
+        assert tmpdir.listdir() == []
+        testapp.get('/ingest/preview/{}'.format(res.json['upload']),
+                    status=404)
+        assert run_next_job().status == m.Job.DONE
+        assert [p.email for p in m.Preuser.query] == ['jdoe@wpi.edu']
+
+    def test_preview_pages_not_recomputed(self, app, admin, tmpdir,
+                                          testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        with mock.patch('ifc.ingest.views.preview_roster',
+                        wraps=preview_roster) as previewed:
+            res = self.preview(testapp, 'fraternity_name,first_name,'
+                                        'last_name,email\n')
+            url = '/ingest/preview/{}'.format(res.json['upload'])
+            testapp.get(url, {'section': 'added'})
+            testapp.get(url, {'section': 'deleted', 'page': 2})
+            assert previewed.call_count == 1
+            # replacing every preuser is another preview
+            testapp.get(url, {'replace': 'true'})
+            assert previewed.call_count == 2
+
+    def test_stale_previews_removed(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        header = 'fraternity_name,first_name,last_name,email\n'
+        old = self.preview(testapp, header).json['upload']
+        recent = self.preview(testapp, header).json['upload']
+        other = tmpdir.join('{}-roster.csv'.format('b' * 32))
+        other.write('email\n')
+        an_hour_ago = time.time() - 3601
+        for path in [tmpdir.join('{}.csv'.format(old)), other]:
+            os.utime(str(path), (an_hour_ago, an_hour_ago))
+        self.preview(testapp, header)
+        assert not tmpdir.join('{}.csv'.format(old)).exists()
+        assert tmpdir.join('{}.csv'.format(recent)).exists()
+        # other files in the upload folder are left alone
+        assert other.exists()
+        testapp.get('/ingest/preview/{}'.format(old), status=404)
+
+    def test_preview_bad_roster(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        res = self.preview(testapp, 'first_name,email\n', status=400)
+        assert 'missing the columns' in res.json['error']
+
+    def test_preview_unknown_section(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        res = testapp.get('/ingest/preview/{}'.format('a' * 32),
+                          {'section': 'nope'}, status=400)
+        assert res.json['error'] == \
+            locales.Error.UNKNOWN_PREVIEW_SECTION
+
+    def test_preview_not_found(self, app, admin, tmpdir, testapp):
+        app.config['UPLOAD_FOLDER'] = str(tmpdir)
+        self.login(admin, testapp)
+        testapp.get('/ingest/preview/{}'.format('a' * 32), status=404)
+        testapp.get('/ingest/preview/..', status=404)
+        testapp.post('/ingest/', {'upload': '../../etc/passwd'}, status=404)
+
+    def test_preview_inaccessible_to_pres(self, president, testapp):
+        self.login(president, testapp)
+        testapp.post('/ingest/preview', status=403)
+        testapp.get('/ingest/preview/{}'.format('a' * 32), status=403)
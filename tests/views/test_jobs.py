@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Functional tests using WebTest.
+
+See: http://webtest.readthedocs.org/
+"""
+import pytest
+
+from ifc import locales
+from ifc.models import Job
+
+from tests.utils import BaseViewTest
+
+
+@pytest.fixture
+def job(db, school):
+    """A queued job for the school of the tests."""
+    return Job.enqueue('ingest_roster', {}, school_id=school.id)
+
+
+class TestJobStatusView(BaseViewTest):
+    """Tests the /jobs/id endpoint."""
+    def test_no_login(self, job, testapp):
+        res = testapp.get('/jobs/{}'.format(job.id), status=401)
+        assert res.status_code == 401
+
+    def test_not_found(self, admin, testapp):
+        self.login(admin, testapp)
+        res = testapp.get('/jobs/1', status=404)
+        assert res.status_code == 404
+
+    @pytest.mark.parametrize('who', ['user', 'president',
+                                     'other_school_pres'])
+    def test_cant_see(self, who, job, testapp, request):
+        self.login(request.getfuncargvalue(who), testapp)
+        res = testapp.get('/jobs/{}'.format(job.id), status=403)
+        assert res.json['error'] == locales.Error.CANT_SEE_JOB
+
+    def test_site_admin_sees_progress(self, db, admin, job, testapp):
+        self.login(admin, testapp)
+        Job.report_progress(job.id, 3, 10)
+        db.session.expire_all()
+        res = testapp.get('/jobs/{}'.format(job.id))
+        assert res.json['job']['status'] == 'queued'
+        assert res.json['job']['progress'] == 3
+        assert res.json['job']['total'] == 10
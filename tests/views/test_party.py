@@ -3,14 +3,18 @@
 
 See: http://webtest.readthedocs.org/
 """
-from datetime import date, timedelta as td
+from datetime import date, datetime as dt, timedelta as td
 
 import mock
 import pytest
 
-from ifc import models as m
+from ifc import locales, models as m
+from ifc.database import db
+from ifc.party.cache import guest_cache
+from ifc.party.events import guest_streams
 
-from tests.utils import BaseViewTest
+from tests.factories import GuestFactory
+from tests.utils import BaseViewTest, assert_max_queries
 
 
 class TestPartyListView(BaseViewTest):
@@ -224,6 +228,100 @@ class TestReportView(BaseViewTest):
         assert res.status_code == 404
 
 
+class TestReportDataView(BaseViewTest):
+    """Tests the /parties/id/report/data endpoint."""
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/parties/4/report/data', status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cannot_view(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = testapp.get('/parties/{}/report/data'.format(party.id),
+                          status=403)
+        assert res.status_code == 403
+
+    def test_report_data(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/report/data'.format(party.id))
+        assert res.content_type == 'application/json'
+        assert sorted(res.json.keys()) == \
+            ['attendance', 'attendance_ratio', 'attendance_raw',
+             'gender_population', 'host_attendance_normalized',
+             'host_attendance_raw', 'population', 'total_guests']
+        assert res.json['total_guests'] == 1
+
+    def test_interval(self, user, party, testapp):
+        GuestFactory.create(host=user, party=party,
+                            entered_party_at=dt(2016, 12, 20, 22, 0),
+                            left_party_at=dt(2016, 12, 20, 22, 2, 30))
+        self.login(user, testapp)
+        url = '/parties/{}/report/data'.format(party.id)
+        assert len(testapp.get(url).json['population']) == 1
+        res = testapp.get(url, {'interval': 1})
+        assert [b['time'] for b in res.json['population']] == \
+            ['2016-12-20T22:00:00Z', '2016-12-20T22:01:00Z',
+             '2016-12-20T22:02:00Z']
+
+    @pytest.mark.parametrize('interval', ['7', '0', '-10', 'abc', ''])
+    def test_bad_interval(self, interval, user, party, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/report/data'.format(party.id),
+                          {'interval': interval}, status=400)
+        assert res.json['error'] == locales.Error.INVALID_INTERVAL
+
+    def test_cached_until_guests_change(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        url = '/parties/{}/report/data'.format(party.id)
+        first = testapp.get(url).json
+        db.session.expunge_all()
+        # user, party, role and fraternity, but no guests
+        with assert_max_queries(db, 4):
+            assert testapp.get(url).json == first
+        testapp.put('/parties/{}/guests/{}'.format(party.id, guest.id))
+        assert testapp.get(url).json['attendance'] == 1.0
+
+    @pytest.mark.parametrize('ended', [False, True])
+    def test_ended_party_cached_for_good(self, ended, app, user, guest, party,
+                                         testapp):
+        self.login(user, testapp)
+        party.start()
+        if ended:
+            party.end()
+        with mock.patch('ifc.party.report.cache') as cache_mock:
+            cache_mock.get.return_value = None
+            testapp.get('/parties/{}/report/data'.format(party.id))
+        timeout = cache_mock.set.call_args[1]['timeout']
+        assert timeout == (0 if ended else app.config['REPORT_CACHE_TIMEOUT'])
+
+
+class TestOccupancyView(BaseViewTest):
+    """Tests the /parties/id/occupancy endpoint."""
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/parties/4/occupancy', status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cannot_view(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = testapp.get('/parties/{}/occupancy'.format(party.id),
+                          status=403)
+        assert res.json['error'] == locales.Error.CANT_SEE_GUESTS
+
+    def test_counts_guests_inside(self, user, party, testapp):
+        guy = GuestFactory.create(host=user, party=party, is_male=True)
+        girl = GuestFactory.create(host=user, party=party, is_male=False)
+        self.login(user, testapp)
+        for guest in [guy, girl, guy, guy]:
+            testapp.put('/parties/{}/guests/{}'.format(party.id, guest.id))
+        url = '/parties/{}/occupancy'.format(party.id)
+        capacity = user.fraternity.capacity
+        db.session.expunge_all()
+        # user, party, role and fraternity, but no guests
+        with assert_max_queries(db, 4):
+            res = testapp.get(url)
+        assert res.json == {'male': 1, 'female': 1, 'total': 2,
+                            'capacity': capacity}
+
+
 class TestPartyEndStartView(BaseViewTest):
     """Tests the /parties/id/start endpoint."""
     endpoints = ['/parties/{}/start', '/parties/{}/end']
@@ -449,6 +547,31 @@ class TestMenGuestListView(BaseViewTest):
         assert res.json['guests'] == map(lambda x: x.json_dict,
                                          party.male_guests)
 
+    @pytest.mark.parametrize('ended', [False, True])
+    def test_filters_in_sql_when_not_cached(self, ended, db, user, guest,
+                                            party, testapp):
+        if ended:
+            party.start()
+            party.end()
+        GuestFactory.create(host=user, party=party, is_male=False)
+        self.login(user, testapp)
+        url = '/parties/{}/guests/males'.format(party.id)
+        with assert_max_queries(db, 10) as statements:
+            res = testapp.get(url)
+        assert [gu['id'] for gu in res.json['guests']] == [guest.id]
+        assert [s for s in statements if 'FROM guests' in s and
+                'guests.is_male = ' in s]
+        assert guest_cache.stats()['misses'] == 0
+
+    def test_uses_cache_during_party(self, user, guest, party, testapp):
+        party.start()
+        self.login(user, testapp)
+        url = '/parties/{}/guests/males'.format(party.id)
+        testapp.get(url)
+        res = testapp.get(url, headers={'If-None-Match': 'stale'})
+        assert [gu['id'] for gu in res.json['guests']] == [guest.id]
+        assert guest_cache.stats()['hits'] == 1
+
 
 class TestWomenGuestListView(BaseViewTest):
     """Tests the /parties/id/guests/females endpoint."""
@@ -504,6 +627,314 @@ class TestWomenGuestListView(BaseViewTest):
                                          party.female_guests)
 
 
+class TestGuestListQueries(BaseViewTest):
+    """Tests the number of queries the guest list endpoints make."""
+    @pytest.mark.parametrize('endpoint,count', [('guests', 6),
+                                                ('guests?is_male=false', 3),
+                                                ('guests/males', 3),
+                                                ('guests/females', 3)])
+    def test_hosts_loaded_with_guests(self, endpoint, count, user, president,
+                                      other_user, party, testapp):
+        self.login(user, testapp)
+        for host in [user, president, other_user]:
+            GuestFactory.create(host=host, party=party, is_male=True)
+            GuestFactory.create(host=host, party=party, is_male=False)
+        db.session.expunge_all()
+        # the user, their role and fraternity, the party and then the guests
+        with assert_max_queries(db, 5):
+            res = testapp.get('/parties/{}/{}'.format(party.id, endpoint))
+        assert len(res.json['guests']) == count
+
+
+class TestGuestListCache(BaseViewTest):
+    """Tests that the guest list of a party in progress is kept in memory."""
+    def test_served_from_memory(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        party.start()
+        url = '/parties/{}/guests'.format(party.id)
+        first = testapp.get(url).json
+        db.session.expunge_all()
+        # user, party, role and fraternity, but no guests
+        with assert_max_queries(db, 4):
+            assert testapp.get(url).json == first
+
+    def test_sees_changes(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        party.start()
+        url = '/parties/{}/guests'.format(party.id)
+        testapp.get(url)
+        testapp.put('/parties/{}/guests/{}'.format(party.id, guest.id))
+        assert testapp.get(url).json['guests'][0]['is_at_party']
+
+
+class TestGuestListConditionalGet(BaseViewTest):
+    """Tests the ETags on the guest list endpoints."""
+    endpoints = ['guests', 'guests?is_male=true', 'guests/males',
+                 'guests/females']
+
+    @pytest.mark.parametrize('endpoint', endpoints)
+    def test_unchanged_list_not_modified(self, endpoint, user, guest, party,
+                                         testapp):
+        self.login(user, testapp)
+        url = '/parties/{}/{}'.format(party.id, endpoint)
+        etag = testapp.get(url).headers['ETag']
+        db.session.expunge_all()
+        # the user, their role and fraternity and the party, but no guests
+        with assert_max_queries(db, 4):
+            res = testapp.get(url, headers={'If-None-Match': etag},
+                              status=304)
+        assert res.status_code == 304
+        assert res.headers['ETag'] == etag
+        assert not res.body
+
+    @pytest.mark.parametrize('endpoint', endpoints)
+    def test_changed_list_sent_again(self, endpoint, user, guest, party,
+                                     testapp):
+        self.login(user, testapp)
+        url = '/parties/{}/{}'.format(party.id, endpoint)
+        etag = testapp.get(url).headers['ETag']
+        testapp.put('/parties/{}/guests/{}'.format(party.id, guest.id))
+        res = testapp.get(url, headers={'If-None-Match': etag})
+        assert res.status_code == 200
+        assert res.headers['ETag'] != etag
+
+    def test_lists_have_different_etags(self, user, party, testapp):
+        self.login(user, testapp)
+        etags = set(testapp.get('/parties/{}/{}'.format(party.id, endpoint))
+                    .headers['ETag']
+                    for endpoint in ['guests', 'guests/males',
+                                     'guests/females'])
+        assert len(etags) == 3
+
+
+class TestGuestListChangesView(BaseViewTest):
+    """Tests the /parties/id/guests/changes endpoint."""
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/parties/1/guests/changes', status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cannot_access(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = testapp.get('/parties/{}/guests/changes'.format(party.id),
+                          status=403)
+        assert res.json['error'] == "You can't see the guests of this party"
+
+    def test_without_cursor_sends_everything(self, user, guest, party,
+                                             testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/guests/changes'.format(party.id))
+        assert res.json['guests'] == [guest.json_dict]
+        assert res.json['deleted'] == []
+        assert res.json['cursor'] == party.guests_version
+
+    def test_nothing_changed(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        url = '/parties/{}/guests/changes'.format(party.id)
+        cursor = testapp.get(url).json['cursor']
+        res = testapp.get(url, {'since': cursor})
+        assert res.json == {'cursor': cursor, 'guests': [], 'deleted': []}
+
+    def test_changes_since_cursor(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        other = GuestFactory.create(host=user, party=party, is_male=False)
+        url = '/parties/{}/guests/changes'.format(party.id)
+        cursor = testapp.get(url).json['cursor']
+        testapp.put('/parties/{}/guests/{}'.format(party.id, guest.id))
+        testapp.delete('/parties/{}/guests/{}'.format(party.id, other.id))
+        res = testapp.get(url, {'since': cursor})
+        assert [gu['id'] for gu in res.json['guests']] == [guest.id]
+        assert res.json['guests'][0]['is_at_party']
+        assert res.json['deleted'] == [other.id]
+        assert res.json['cursor'] == cursor + 2
+
+    def test_changes_by_gender(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        guest.save()
+        url = '/parties/{}/guests/changes'.format(party.id)
+        res = testapp.get(url, {'is_male': 'false'})
+        assert res.json['guests'] == []
+        res = testapp.get(url, {'is_male': 'true', 'since': 0})
+        assert res.json['guests'] == [guest.json_dict]
+
+
+class TestGuestListStreamView(BaseViewTest):
+    """Tests the /parties/id/guests/stream endpoint."""
+    @pytest.fixture(autouse=True)
+    def short_streams(self, app):
+        app.config['GUEST_STREAM_TIMEOUT'] = 0.05
+
+    def events(self, url, *args, **kwargs):
+        res = self.testapp.get(url, *args, **kwargs)
+        return [e for e in res.text.split('\n\n') if e.startswith('id: ')]
+
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/parties/1/guests/stream', status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cannot_access(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = testapp.get('/parties/{}/guests/stream'.format(party.id),
+                          status=403)
+        assert res.json['error'] == "You can't see the guests of this party"
+
+    def test_is_event_stream(self, user, party, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/guests/stream'.format(party.id))
+        assert res.content_type == 'text/event-stream'
+        assert res.headers['Cache-Control'] == 'no-cache'
+
+    def test_starts_with_everything(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        self.testapp = testapp
+        events = self.events('/parties/{}/guests/stream'.format(party.id))
+        assert len(events) == 1
+        assert events[0].startswith('id: {}\nevent: changes\ndata: '
+                                    .format(party.guests_version))
+        assert '"id": {}'.format(guest.id) in events[0]
+
+    def test_nothing_changed(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        self.testapp = testapp
+        url = '/parties/{}/guests/stream'.format(party.id)
+        cursor = party.guests_version
+        assert self.events(url, {'since': cursor}) == []
+        assert self.events(url, headers={'Last-Event-ID': str(cursor)}) == []
+
+    def test_pushes_changes(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        self.testapp = testapp
+        cursor = party.guests_version
+        entered = []
+
+        def wait(timeout):
+            # a guest checks in while the stream waits for the first time
+            if not entered:
+                entered.append(guest.enter_party())
+            return True
+
+        stub = mock.Mock()
+        stub.subscribe.return_value.wait.side_effect = wait
+        with mock.patch('ifc.party.views.guest_events', stub):
+            events = self.events('/parties/{}/guests/stream'
+                                 .format(party.id), {'since': cursor})
+        assert events[0].startswith('id: {}\nevent: changes\n'
+                                    .format(cursor + 1))
+        assert '"is_at_party": true' in events[0]
+        stub.subscribe.assert_called_with(party.id)
+        assert stub.subscribe.return_value.close.called
+
+    def test_sends_both_genders(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        self.testapp = testapp
+        female = GuestFactory.create(name='jane doe', host=user, party=party,
+                                     is_male=False)
+        events = self.events('/parties/{}/guests/stream'.format(party.id),
+                             {'is_male': 'true'})
+        assert '"id": {}'.format(guest.id) in events[0]
+        assert '"id": {}'.format(female.id) in events[0]
+
+    def test_too_many_streams(self, app, user, party, testapp):
+        app.config['GUEST_STREAM_MAX'] = 1
+        self.login(user, testapp)
+        url = '/parties/{}/guests/stream'.format(party.id)
+        assert guest_streams.acquire(1)
+        try:
+            res = testapp.get(url, status=503)
+            assert res.json['error'] == locales.Error.TOO_MANY_STREAMS
+        finally:
+            guest_streams.release()
+        # streams give their slot back when they close
+        testapp.get(url)
+        testapp.get(url)
+        assert guest_streams.open == 0
+
+
+class TestGuestSearchView(BaseViewTest):
+    """Tests the /parties/id/guests/search endpoint."""
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/parties/1/guests/search?q=a', status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cannot_access(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = testapp.get('/parties/{}/guests/search'.format(party.id),
+                          {'q': 'a'}, status=403)
+        assert res.json['error'] == "You can't see the guests of this party"
+
+    @pytest.mark.parametrize('query', ['', '  '])
+    def test_query_required(self, query, user, party, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/guests/search'.format(party.id),
+                          {'q': query}, status=400)
+        assert res.json['error'] == 'q is a required parameter.'
+
+    def test_finds_by_prefix(self, user, party, testapp):
+        self.login(user, testapp)
+        for name in ['Sam Adams', 'Sally Ride', 'Tom Sams']:
+            GuestFactory.create(name=name.lower(), host=user, party=party,
+                                is_male=name != 'Sally Ride')
+        url = '/parties/{}/guests/search'.format(party.id)
+        res = testapp.get(url, {'q': 'Sa'})
+        assert [gu['name'] for gu in res.json['guests']] == \
+            ['Sally Ride', 'Sam Adams']
+        res = testapp.get(url, {'q': 'sa', 'is_male': 'true'})
+        assert [gu['name'] for gu in res.json['guests']] == ['Sam Adams']
+
+    def test_limit(self, app, user, party, testapp):
+        self.login(user, testapp)
+        app.config['GUEST_SEARCH_MAX_RESULTS'] = 2
+        for i in range(3):
+            GuestFactory.create(name='guest {}'.format(i), host=user,
+                                party=party)
+        url = '/parties/{}/guests/search'.format(party.id)
+        assert len(testapp.get(url, {'q': 'guest'}).json['guests']) == 2
+        assert len(testapp.get(url, {'q': 'guest', 'limit': 1})
+                   .json['guests']) == 1
+        assert len(testapp.get(url, {'q': 'guest', 'limit': 10})
+                   .json['guests']) == 2
+
+
+class TestGuestFuzzySearchView(BaseViewTest):
+    """Tests the /parties/id/guests/fuzzy-search endpoint."""
+    def test_no_login(self, frat, testapp):
+        res = testapp.get('/parties/1/guests/fuzzy-search?q=a', status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cannot_access(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = testapp.get('/parties/{}/guests/fuzzy-search'.format(party.id),
+                          {'q': 'a'}, status=403)
+        assert res.json['error'] == "You can't see the guests of this party"
+
+    def test_query_required(self, user, party, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/guests/fuzzy-search'.format(party.id),
+                          status=400)
+        assert res.json['error'] == 'q is a required parameter.'
+
+    def test_finds_misspelled_names(self, user, party, testapp):
+        self.login(user, testapp)
+        for name in ['john smith', 'jane smith', 'bob jones']:
+            GuestFactory.create(name=name, host=user, party=party,
+                                is_male=name != 'jane smith')
+        url = '/parties/{}/guests/fuzzy-search'.format(party.id)
+        res = testapp.get(url, {'q': 'Jon Smith'})
+        assert [gu['name'] for gu in res.json['guests']] == \
+            ['John Smith', 'Jane Smith']
+        assert res.json['guests'][0]['host'] == user.full_name
+        assert res.json['guests'][0]['score'] > \
+            res.json['guests'][1]['score']
+        res = testapp.get(url, {'q': 'Jon Smith', 'is_male': 'false',
+                                'limit': 1})
+        assert [gu['name'] for gu in res.json['guests']] == ['Jane Smith']
+
+    def test_no_matches(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        res = testapp.get('/parties/{}/guests/fuzzy-search'.format(party.id),
+                          {'q': 'zzz'})
+        assert res.json['guests'] == []
+
+
 class TestDeleteGuestView(BaseViewTest):
     """Tests the [DELETE] /parties/id/guests/guest_id endpoint."""
     def test_no_login(self, frat, testapp):
@@ -667,6 +1098,110 @@ class TestGuestCreateView(BaseViewTest):
         assert old_len == len(m.Guest.query.all())
 
 
+class TestGuestBulkCreateView(BaseViewTest):
+    """Tests the [POST] /parties/id/guests/bulk endpoint."""
+    def add(self, testapp, party, guests, **kwargs):
+        return testapp.post_json('/parties/{}/guests/bulk'.format(party.id),
+                                 {'guests': guests}, **kwargs)
+
+    def test_no_login(self, frat, testapp):
+        res = testapp.post_json('/parties/1/guests/bulk', {'guests': []},
+                                status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cant_access(self, other_user, party, testapp):
+        self.login(other_user, testapp)
+        res = self.add(testapp, party, [{'name': 'Foster Lee',
+                                         'is_male': True}], status=403)
+        assert res.json['error'] == "You can't edit the guests of this party"
+
+    def test_no_guest_list(self, user, party, testapp):
+        self.login(user, testapp)
+        res = testapp.post_json('/parties/{}/guests/bulk'.format(party.id),
+                                {}, status=400)
+        assert res.json['error'] == "name and is_male are required fields."
+
+    def test_cannot_add_after_party_ended(self, user, party, testapp):
+        self.login(user, testapp)
+        party.started = True
+        party.ended = True
+        party.save()
+        self.add(testapp, party, [{'name': 'Foster Lee', 'is_male': True}],
+                 status=409)
+        assert m.Guest.query.count() == 0
+
+    def test_adds_guests(self, user, party, testapp):
+        self.login(user, testapp)
+        version = party.guests_version
+        res = self.add(testapp, party, [{'name': 'Foster Lee',
+                                         'is_male': True},
+                                        {'name': 'Jane Doe',
+                                         'is_male': False}])
+        assert res.status_code == 201
+        assert [gu['name'] for gu in res.json['guests']] == \
+            ['Foster Lee', 'Jane Doe']
+        assert res.json['guests'][0]['host'] == user.full_name
+        assert res.json['rejected'] == []
+        guests = m.Guest.query.order_by(m.Guest.id).all()
+        assert [gu.name for gu in guests] == ['foster lee', 'jane doe']
+        assert [gu.is_male for gu in guests] == [True, False]
+        assert party.guests_version == version + 1
+        assert all(gu.version == version + 1 for gu in guests)
+
+    def test_rejects_duplicates_and_bad_guests(self, user, guest, party,
+                                               testapp):
+        self.login(user, testapp)
+        res = self.add(testapp, party, [{'name': guest.name.upper(),
+                                         'is_male': True},
+                                        {'name': 'Foster Lee',
+                                         'is_male': True},
+                                        {'name': 'foster lee',
+                                         'is_male': True},
+                                        {'name': 'Al', 'is_male': True},
+                                        {'name': 'Jane Doe'}])
+        assert [gu['name'] for gu in res.json['guests']] == ['Foster Lee']
+        assert res.json['rejected'] == [
+            {'name': 'Al', 'error': 'That guest needs a real name.'},
+            {'name': 'Jane Doe',
+             'error': 'name and is_male are required fields.'},
+            {'name': guest.name.upper(),
+             'error': 'That guest is already on this party list'},
+            {'name': 'foster lee',
+             'error': 'That guest is already on this party list'}]
+
+    def test_capacity(self, user, party, capacity, testapp):
+        user.party_capacity = capacity
+        user.save()
+        self.login(user, testapp)
+        res = self.add(testapp, party, [{'name': 'Foster Lee',
+                                         'is_male': True},
+                                        {'name': 'John Smith',
+                                         'is_male': True},
+                                        {'name': 'Jane Doe',
+                                         'is_male': False}])
+        assert [gu['name'] for gu in res.json['guests']] == \
+            ['Foster Lee', 'Jane Doe']
+        assert res.json['rejected'] == [
+            {'name': 'John Smith',
+             'error': 'You can only add 1 guys to the party'}]
+        res = self.add(testapp, party, [{'name': 'Mary Sue',
+                                         'is_male': False}])
+        assert res.json['guests'] == []
+        assert res.json['rejected'][0]['error'] == \
+            'You can only add 1 girls to the party'
+
+    def test_query_count(self, user, party, testapp):
+        self.login(user, testapp)
+        guests = [{'name': 'Guest {}'.format(i), 'is_male': i % 2 == 0}
+                  for i in range(30)]
+        db.session.expunge_all()
+        # user, party, role and fraternity, names taken, version bump and
+        # read, INSERT and reload; however many guests there are
+        with assert_max_queries(db, 9):
+            res = self.add(testapp, party, guests)
+        assert len(res.json['guests']) == 30
+
+
 class TestGuestCheckinView(BaseViewTest):
     """Tests the [PUT, PATCH] /parties/id/guests/guest_id endpoint."""
     methods = ['put', 'patch']
@@ -787,3 +1322,163 @@ class TestGuestCheckinView(BaseViewTest):
         assert not guest.is_at_party
         assert guest.entered_party_at is None
         assert guest.left_party_at is None
+
+    @pytest.mark.parametrize('method_name', methods)
+    def test_cannot_checkin_at_capacity(self, method_name, user, guest,
+                                        party, testapp):
+        self.login(user, testapp)
+        party.fraternity.update(capacity=1)
+        other = GuestFactory.create(host=user, party=party)
+        other.enter_party()
+        res = getattr(testapp, method_name)('/parties/{}/guests/{}'
+                                            .format(party.id, guest.id),
+                                            status=409)
+        assert res.json['error'] == locales.Error.PARTY_FULL
+        assert not guest.is_at_party
+        assert guest.entered_party_at is None
+        # checking out is never refused, and makes room
+        getattr(testapp, method_name)('/parties/{}/guests/{}'
+                                      .format(party.id, other.id))
+        getattr(testapp, method_name)('/parties/{}/guests/{}'
+                                      .format(party.id, guest.id))
+        assert guest.is_at_party
+
+
+class TestGuestBatchCheckinView(BaseViewTest):
+    """Tests the [PATCH] /parties/id/guests endpoint."""
+    def checkin(self, testapp, party, operations, **kwargs):
+        return testapp.patch_json('/parties/{}/guests'.format(party.id),
+                                  {'operations': operations}, **kwargs)
+
+    def test_no_login(self, frat, testapp):
+        res = testapp.patch_json('/parties/1/guests', {'operations': []},
+                                 status=401)
+        assert res.status_code == 401
+
+    def test_other_user_cant_access(self, other_user, party, guest, testapp):
+        self.login(other_user, testapp)
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'check_in'}],
+                           status=403)
+        assert res.json['error'] == "You can't edit the guests of this party"
+        assert not guest.is_at_party
+
+    @pytest.mark.parametrize('body', [{}, {'operations': 'all'},
+                                      {'operations': [1]}])
+    def test_bad_body(self, body, user, party, testapp):
+        self.login(user, testapp)
+        res = testapp.patch_json('/parties/{}/guests'.format(party.id), body,
+                                 status=400)
+        assert res.json['error'] == \
+            'operations must be a list of guest_id and action pairs.'
+
+    def test_cannot_checkin_after_party_ended(self, user, guest, party,
+                                              testapp):
+        self.login(user, testapp)
+        party.started = True
+        party.ended = True
+        party.save()
+        self.checkin(testapp, party,
+                     [{'guest_id': guest.id, 'action': 'check_in'}],
+                     status=409)
+        assert not guest.is_at_party
+
+    def test_checks_guests_in_and_out(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        other = GuestFactory.create(host=user, party=party, is_male=False)
+        other.enter_party()
+        version = party.guests_version
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'check_in'},
+                            {'guest_id': other.id, 'action': 'check_out'}])
+        assert [r['status'] for r in res.json['results']] == [200, 200]
+        assert res.json['results'][0]['guest']['is_at_party']
+        assert not res.json['results'][1]['guest']['is_at_party']
+        assert guest.is_at_party and guest.entered_party_at is not None
+        assert not other.is_at_party and other.left_party_at is not None
+        # both changes are saved under one version of the guest list
+        assert party.guests_version == version + 1
+        assert guest.version == other.version == version + 1
+
+    def test_toggle(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'toggle'}])
+        assert res.json['results'][0]['message'] == \
+            'Successfully checked in guest'
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'toggle'}])
+        assert res.json['results'][0]['message'] == \
+            'Successfully checked out guest'
+        assert not guest.is_at_party
+
+    def test_unchanged_guests_not_saved(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        version = party.guests_version
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'check_out'}])
+        assert res.json['results'][0]['status'] == 200
+        assert party.guests_version == version
+
+    def test_bad_operations_dont_stop_the_rest(self, user, guest, party,
+                                               other_guest, testapp):
+        self.login(user, testapp)
+        res = self.checkin(testapp, party,
+                           [{'guest_id': other_guest.id, 'action': 'toggle'},
+                            {'guest_id': 'x', 'action': 'toggle'},
+                            {'guest_id': guest.id, 'action': 'dance'},
+                            {'guest_id': guest.id, 'action': 'check_in'}])
+        results = res.json['results']
+        assert [r['status'] for r in results] == [404, 404, 422, 200]
+        assert results[0]['error'] == 'That guest is not on this party list'
+        assert results[2]['error'] == \
+            'action must be one of check_in, check_out, toggle'
+        assert guest.is_at_party
+        assert not other_guest.is_at_party
+
+    def test_admits_up_to_capacity(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        party.fraternity.update(capacity=2)
+        inside = GuestFactory.create(host=user, party=party)
+        inside.enter_party()
+        others = [GuestFactory.create(host=user, party=party)
+                  for _ in range(2)]
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'check_in'},
+                            {'guest_id': others[0].id, 'action': 'toggle'},
+                            {'guest_id': others[1].id, 'action': 'check_in'},
+                            {'guest_id': inside.id, 'action': 'check_out'}])
+        results = res.json['results']
+        # the check out goes first, and makes room for a second guest
+        assert [r['status'] for r in results] == [200, 200, 409, 200]
+        assert results[2]['error'] == locales.Error.PARTY_FULL
+        assert guest.is_at_party and others[0].is_at_party
+        assert not others[1].is_at_party and not inside.is_at_party
+        assert party.occupancy['total'] == 2
+
+    def test_full_party_still_checks_out(self, user, guest, party, testapp):
+        self.login(user, testapp)
+        party.fraternity.update(capacity=1)
+        inside = GuestFactory.create(host=user, party=party)
+        inside.enter_party()
+        res = self.checkin(testapp, party,
+                           [{'guest_id': guest.id, 'action': 'check_in'},
+                            {'guest_id': guest.id, 'action': 'check_in'}])
+        assert [r['status'] for r in res.json['results']] == [409, 409]
+        res = self.checkin(testapp, party,
+                           [{'guest_id': inside.id, 'action': 'toggle'},
+                            {'guest_id': guest.id, 'action': 'check_in'}])
+        assert [r['status'] for r in res.json['results']] == [200, 200]
+        assert guest.is_at_party and not inside.is_at_party
+
+    def test_query_count(self, user, party, testapp):
+        self.login(user, testapp)
+        guests = [GuestFactory.create(host=user, party=party)
+                  for _ in range(10)]
+        operations = [{'guest_id': gu.id, 'action': 'check_in'}
+                      for gu in guests]
+        db.session.expunge_all()
+        # user, party, lock, guests, version bump and read, one UPDATE per
+        # guest
+        with assert_max_queries(db, 6 + len(guests)):
+            self.checkin(testapp, party, operations)
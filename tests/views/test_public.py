@@ -296,7 +296,10 @@ class TestStatus:
 
     def test_has_correct_keys(self, testapp):
         res = testapp.get('/status')
-        assert sorted(res.json.keys()) == ['version']
+        assert sorted(res.json.keys()) == ['guest_cache', 'version']
+        assert sorted(res.json['guest_cache'].keys()) == \
+            ['evictions', 'hit_rate', 'hits', 'invalidations', 'misses',
+             'parties']
 
     def test_has_expected_values(self, testapp):
         res = testapp.get('/status')